@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import User, Song
+from .models import AudioBlob, User, Song
+from .counters import reconcile_users
 
 @admin.register(User)
 class UserAdmin(DjangoUserAdmin):
@@ -12,11 +14,11 @@ class UserAdmin(DjangoUserAdmin):
     ordering = ("username",)
 
     # Make follower_count read-only (maintained by signals)
-    readonly_fields = ("follower_count",)
+    readonly_fields = ("follower_count", "following_count")
 
     # Show profile picture + following in the form
     fieldsets = DjangoUserAdmin.fieldsets + (
-        ("Profile", {"fields": ("role", "profile_picture", "follower_count")}),
+        ("Profile", {"fields": ("role", "profile_picture", "follower_count", "following_count")}),
         ("Social", {"fields": ("following",)}),
     )
 
@@ -31,7 +33,11 @@ class UserAdmin(DjangoUserAdmin):
     # Thumbnail preview in list page
     def avatar_thumb(self, obj):
         if obj.profile_picture:
-            return format_html('<img src="{}" style="height:32px;width:32px;border-radius:50%;object-fit:cover;" />', obj.profile_picture.url)
+            # smallest variant when there is one; the original can be megabytes
+            variants = obj.profile_picture_variants or {}
+            small = min(variants.items(), key=lambda item: int(item[0]), default=None)
+            url = obj.profile_picture.storage.url(small[1]) if small else obj.profile_picture.url
+            return format_html('<img src="{}" style="height:32px;width:32px;border-radius:50%;object-fit:cover;" />', url)
         return "—"
     avatar_thumb.short_description = "Avatar"
 
@@ -39,20 +45,39 @@ class UserAdmin(DjangoUserAdmin):
     actions = ["recalculate_follower_counts"]
 
     def recalculate_follower_counts(self, request, queryset):
-        count = 0
-        for user in queryset:
-            # `followers` is the reverse accessor of `following`
-            fc = user.followers.count()
-            if user.follower_count != fc:
-                user.follower_count = fc
-                user.save(update_fields=["follower_count"])
-                count += 1
-        self.message_user(request, f"Recalculated follower_count for {count} user(s).")
+        # one UPDATE with count subqueries; `manage.py reconcile_counts` does the whole table
+        count = reconcile_users(queryset)
+        self.message_user(request, f"Recalculated follower/following counts for {count} user(s).")
     recalculate_follower_counts.short_description = "Recalculate follower counts for selected users"
 
 
 @admin.register(Song)
 class SongAdmin(admin.ModelAdmin):
-    list_display = ("title", "owner", "is_public", "plays", "created_at")
+    list_display = ("title", "owner", "is_public", "plays", "likes_count", "processing_status", "created_at")
     search_fields = ("title", "owner__username")
-    list_filter = ("is_public", "created_at")
\ No newline at end of file
+    list_filter = ("is_public", "processing_status", "created_at")
+    # maintained by SongViewSet.like/unlike and signals; blob by SongSerializer
+    readonly_fields = ("likes_count", "blob")
+
+    actions = ["requeue_processing"]
+
+    def requeue_processing(self, request, queryset):
+        # forget the shared results too, or the worker would just copy them back
+        AudioBlob.objects.filter(songs__in=queryset).update(renditions=None)
+        n = queryset.update(
+            processing_status=Song.ProcessingStatus.PENDING,
+            processing_attempts=0,
+            processing_retry_at=None,
+            updated_at=timezone.now(),
+        )
+        self.message_user(request, f"Queued {n} song(s) for processing.")
+    requeue_processing.short_description = "Re-run upload processing for selected songs"
+
+
+@admin.register(AudioBlob)
+class AudioBlobAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "format", "size", "ref_count", "duration_seconds", "created_at")
+    search_fields = ("sha256",)
+    list_filter = ("format",)
+    # blobs are created and released with their songs (api.uploads)
+    readonly_fields = ("sha256", "file", "format", "size", "ref_count", "created_at")
@@ -6,4 +6,4 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        from . import signals
\ No newline at end of file
+        from . import db, signals
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Audio analysis used by upload post-processing.
+
+Kept free of Django imports so it can run inside worker processes
+(see api.processing).
+"""
+
+
+def probe_duration(audio_path):
+    """Track length in whole seconds, or None if mutagen can't read it."""
+    try:
+        from mutagen import File as MutagenFile
+        mf = MutagenFile(audio_path)
+        if mf and mf.info and getattr(mf.info, "length", None):
+            return int(mf.info.length)
+    except Exception:
+        pass
+    return None
+
+
+def generate_waveform(audio_path, num_bars=65):
+    """Bar heights in 0.3..1.0, streamed and reduced block by block (api.waveform)."""
+    from . import waveform
+    if waveform.np is None:
+        import random
+        return [0.5 + random.random() * 0.5 for _ in range(num_bars)]
+    return waveform.generate_waveform(audio_path, num_bars)
+
+
+def analyze(audio_path):
+    """
+    Everything upload processing derives from the audio file.
+    Decode errors propagate so the queue can retry / mark the song failed.
+    """
+    from . import waveform
+    if waveform.np is None:  # placeholder bars, no pyramid
+        return {
+            "duration_seconds": probe_duration(audio_path),
+            "waveform_data": generate_waveform(audio_path),
+        }
+    bars, peaks = waveform.analyze_waveform(audio_path)
+    return {
+        "duration_seconds": probe_duration(audio_path),
+        "waveform_data": bars,
+        "waveform_peaks": peaks,
+    }
+
+
+def process(audio_path, rendition_dir=None, renditions=(), hls=False):
+    """
+    analyze() plus streaming renditions written to rendition_dir (api.transcode).
+    Transcode failures don't fail the job; they come back as "transcode_errors".
+    """
+    result = analyze(audio_path)
+    if rendition_dir and (renditions or hls):
+        from . import transcode
+        result["renditions"], errors = transcode.transcode(audio_path, rendition_dir, renditions, hls)
+        if errors:
+            result["transcode_errors"] = errors
+    else:
+        result["renditions"] = []
+    return result
@@ -0,0 +1,127 @@
+"""
+JWT authentication with fewer database round trips.
+
+CachedJWTAuthentication resolves the token's user from Django's cache for
+AUTH_USER_CACHE_TIMEOUT seconds instead of loading the row on every
+request. api.signals drops the entry whenever the user is saved or deleted,
+so password, is_active and role changes apply at once in that process, and
+in other processes only once their entry expires, unless they share a cache
+backend: a deactivated user or an old password keeps working there for up
+to the timeout (0 turns the user cache off). Columns changed by .update()
+(follower counts) can lag by the timeout as well, so views should not save()
+request.user.
+
+Refresh tokens check the blacklist through the cache too, but only a hit is
+kept (until the token expires). A miss always goes to the database: another
+process may have just rotated the token, and a stale "not blacklisted"
+would let it be refreshed again. Blacklisting writes the hit straight away
+(api.signals).
+
+prune_tokens() deletes expired outstanding/blacklisted token rows in
+batches; the rotation flow adds rows on every refresh.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+User = get_user_model()
+
+
+def _user_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def _blacklist_key(jti):
+    return f"auth:blacklisted:{jti}"
+
+
+def cached_user(user_id):
+    """The active-or-not User for user_id, or None; cached for AUTH_USER_CACHE_TIMEOUT."""
+    key = _user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def forget_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with the user row served from the cache (same checks)."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+def is_blacklisted(jti, expires_at):
+    if cache.get(_blacklist_key(jti)):
+        return True
+    # misses are never cached, see the module docstring
+    hit = BlacklistedToken.objects.filter(token__jti=jti).exists()
+    if hit:
+        remember_blacklisted(jti, expires_at)
+    return hit
+
+
+def remember_blacklisted(jti, expires_at):
+    # nothing to remember once the token has expired anyway
+    timeout = max(int(expires_at - time.time()), 1)
+    cache.set(_blacklist_key(jti), True, timeout)
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM], self.payload["exp"]):
+            raise TokenError(_("Token is blacklisted"))
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """SIMPLE_JWT["TOKEN_REFRESH_SERIALIZER"]: the stock serializer with the cached blacklist check."""
+    token_class = CachedBlacklistRefreshToken
+
+
+def prune_tokens(batch_size=5000):
+    """
+    Delete expired token rows, blacklist entries first, `batch_size` rows per
+    statement so the table lock is held briefly. Returns (blacklisted, outstanding).
+    """
+    now = timezone.now()
+    counts = []
+    for model, field in ((BlacklistedToken, "token__expires_at"), (OutstandingToken, "expires_at")):
+        deleted = 0
+        while True:
+            ids = list(model.objects.filter(**{f"{field}__lte": now}).values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            model.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+        counts.append(deleted)
+    return tuple(counts)
@@ -0,0 +1,197 @@
+"""
+Trending and per-genre charts.
+
+A song's trend score counts its plays and likes (a like weighs
+CHARTS_LIKE_WEIGHT plays), each halving in weight every
+CHARTS_HALF_LIFE_HOURS. SongTrend keeps the score as of the song's last
+change plus the counters seen then, so build() decays the stored score by
+the time since and adds the plays and likes gained in between. Decay is
+multiplicative, so rows whose counters did not move need no write. A song
+without a SongTrend row starts from its whole history as if it had
+happened at upload.
+
+build() scores every song in one pass with vectorized NumPy (plain Python
+when NumPy is missing), then rewrites ChartEntry with the top CHARTS_SIZE
+public songs overall (chart "") and per genre. `manage.py build_charts`
+runs it once or every N seconds.
+
+chart() reads one chart off the (chart, rank) index and keeps it in Django's
+cache for CHARTS_CACHE_TIMEOUT seconds, so /api/charts/ costs the same
+whatever the catalogue size. A build in another process reaches the web
+processes through a shared cache backend, otherwise after the timeout.
+"""
+import time
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChartEntry, Song, SongTrend
+
+try:
+    import numpy as np
+except ImportError:  # optional; the pure-Python paths below give the same results
+    np = None
+
+GLOBAL = ""
+GENERATION = "charts:gen"
+
+
+def normalize_genre(value):
+    """Chart key of a genre tag: "#House" -> "house"."""
+    g = (value or "").strip()
+    if g.startswith("#"):
+        g = g[1:]
+    return g.lower()
+
+
+def decay(scores, elapsed, plays, likes, half_life, like_weight):
+    """
+    scores * 0.5 ** (elapsed / half_life) + plays + like_weight * likes,
+    floored at 0 (unlikes can outweigh what is left). Same units for
+    elapsed and half_life.
+    """
+    if np is not None:
+        out = np.asarray(scores, dtype=np.float64) * np.exp2(-np.asarray(elapsed, dtype=np.float64) / half_life)
+        out += np.asarray(plays, dtype=np.float64)
+        out += like_weight * np.asarray(likes, dtype=np.float64)
+        return np.maximum(out, 0.0)
+    return [
+        max(s * 0.5 ** (e / half_life) + p + like_weight * l, 0.0)
+        for s, e, p, l in zip(scores, elapsed, plays, likes)
+    ]
+
+
+def rank(scores, ids, groups, size):
+    """
+    Positions of the `size` best positive scores, ties going to the higher id:
+    {None: overall, code: within that group, ...}. groups[i] is an int code,
+    -1 for songs that only rank overall.
+    """
+    if np is not None:
+        scores = np.asarray(scores, dtype=np.float64)
+        ids = np.asarray(ids, dtype=np.int64)
+        groups = np.asarray(groups, dtype=np.int64)
+        live = np.flatnonzero(scores > 0)
+        order = live[np.lexsort((-ids[live], -scores[live]))]
+        out = {None: order[:size].tolist()}
+
+        grouped = order[groups[order] >= 0]
+        # stable: keeps the score order inside each group
+        grouped = grouped[np.argsort(groups[grouped], kind="stable")]
+        codes = groups[grouped]
+        starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+        within = np.arange(len(grouped)) - np.repeat(starts, np.diff(np.r_[starts, len(grouped)]))
+        kept = grouped[within < size]
+        bounds = np.r_[0, np.flatnonzero(np.diff(groups[kept])) + 1, len(kept)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            if hi > lo:
+                out[int(groups[kept[lo]])] = kept[lo:hi].tolist()
+        return out
+
+    order = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: (-scores[i], -ids[i]))
+    out = {None: order[:size]}
+    grouped = sorted((i for i in order if groups[i] >= 0), key=lambda i: groups[i])
+    for code, members in groupby(grouped, key=lambda i: groups[i]):
+        out[code] = list(members)[:size]
+    return out
+
+
+def build(now=None):
+    """
+    Rescore every song, store the SongTrend rows that changed and replace the
+    charts. Returns {"songs", "trends_written", "charts", "seconds"}.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    rows = list(Song.objects.order_by().values_list(
+        "pk", "genre", "is_public", "plays", "likes_count", "created_at",
+        "trend__score", "trend__plays_seen", "trend__likes_seen", "trend__computed_at",
+    ))
+
+    ids, prev, elapsed, d_plays, d_likes, groups, changed = [], [], [], [], [], [], []
+    genres = {}
+    for pk, genre, public, plays, likes, created, score, plays_seen, likes_seen, computed in rows:
+        ids.append(pk)
+        if computed is None:  # new: the whole history, dated at upload
+            prev.append(plays + settings.CHARTS_LIKE_WEIGHT * likes)
+            elapsed.append((now - created).total_seconds())
+            d_plays.append(0)
+            d_likes.append(0)
+        else:
+            prev.append(score)
+            elapsed.append((now - computed).total_seconds())
+            d_plays.append(plays - plays_seen)
+            d_likes.append(likes - likes_seen)
+        changed.append(computed is None or plays != plays_seen or likes != likes_seen)
+        genre = normalize_genre(genre)
+        if not public:
+            groups.append(None)
+        elif genre:
+            groups.append(genres.setdefault(genre, len(genres)))
+        else:
+            groups.append(-1)
+
+    scores = decay(
+        prev, elapsed, d_plays, d_likes,
+        half_life=settings.CHARTS_HALF_LIFE_HOURS * 3600, like_weight=settings.CHARTS_LIKE_WEIGHT,
+    )
+    scores = scores.tolist() if np is not None else scores
+
+    # private songs keep their score but never chart
+    public = [i for i, g in enumerate(groups) if g is not None]
+    top = rank(
+        [scores[i] for i in public], [ids[i] for i in public], [groups[i] for i in public],
+        settings.CHARTS_SIZE,
+    )
+    names = {code: genre for genre, code in genres.items()}
+    entries = [
+        ChartEntry(
+            chart=GLOBAL if code is None else names[code], rank=n, song_id=ids[public[i]],
+            score=scores[public[i]], built_at=now,
+        )
+        for code, positions in top.items()
+        for n, i in enumerate(positions, 1)
+    ]
+
+    trends = [
+        SongTrend(song_id=ids[i], score=scores[i], plays_seen=rows[i][3], likes_seen=rows[i][4], computed_at=now)
+        for i in range(len(rows)) if changed[i]
+    ]
+    with transaction.atomic():
+        SongTrend.objects.bulk_create(
+            trends, batch_size=500, update_conflicts=True, unique_fields=["song"],
+            update_fields=["score", "plays_seen", "likes_seen", "computed_at"],
+        )
+        ChartEntry.objects.all().delete()
+        ChartEntry.objects.bulk_create(entries, batch_size=500)
+        transaction.on_commit(_bump_generation)
+
+    return {
+        "songs": len(rows),
+        "trends_written": len(trends),
+        "charts": len(top),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _bump_generation():
+    try:
+        cache.incr(GENERATION)
+    except ValueError:  # not set yet, or evicted: start from a value no old entry can carry
+        cache.set(GENERATION, time.time_ns(), None)
+
+
+def chart(genre=GLOBAL):
+    """(built_at, [(song_id, score), ...]) best first; (None, []) for a chart that was never built."""
+    key = f"charts:{cache.get(GENERATION, 0)}:{genre}"
+    found = cache.get(key)
+    if found is None:
+        rows = list(
+            ChartEntry.objects.filter(chart=genre).order_by("rank").values_list("song_id", "score", "built_at")
+        )
+        found = (rows[0][2] if rows else None, [(pk, score) for pk, score, _ in rows])
+        cache.set(key, found, settings.CHARTS_CACHE_TIMEOUT)
+    return found
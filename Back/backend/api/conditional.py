@@ -0,0 +1,98 @@
+"""
+ETags for API resources, answered with 304 before anything is serialized.
+
+A version token is built from what can change a response:
+- updated_at of the rows (and of the song owners), which every save and
+  processing update bumps;
+- the counters (plays, likes_count, follower/following counts), which move
+  through UPDATEs that skip updated_at;
+- the requester's own likes/follows, for the *_by_me / is_following flags;
+- the request itself: path, query string, user and renderer.
+
+A single song's token costs one narrow query; list tokens are built from
+the page rows the view fetches anyway. Either way a 304 skips serialization.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _request_parts(request):
+    user = request.user.pk if request.user.is_authenticated else None
+    renderer = getattr(request, "accepted_renderer", None)
+    parts = [request.get_full_path(), user, getattr(renderer, "format", None)]
+    if user is not None:
+        # the owner's private songs carry signed audio URLs that roll over per window
+        parts.append(int(time.time()) // settings.AUDIO_SIGNED_URL_TTL)
+    return parts
+
+
+def matches(request, etag):
+    """Weak If-None-Match comparison, as RFC 9110 asks for GET."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    strip = lambda tag: tag[2:] if tag.startswith("W/") else tag
+    return strip(etag) in {strip(tag) for tag in parse_etags(header)}
+
+
+def tag(request, response, etag):
+    """Set ETag and make browsers revalidate instead of guessing freshness."""
+    response["ETag"] = etag
+    patch_vary_headers(response, ["Authorization"])
+    if request.user.is_authenticated:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:  # private=False would be written out literally
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def respond(request, etag, produce):
+    """304 when the client already has `etag`, else produce() tagged with it."""
+    if etag is not None and matches(request, etag):
+        return tag(request, HttpResponseNotModified(), etag)
+    response = produce()
+    if etag is None or response.status_code != 200:
+        return response
+    return tag(request, response, etag)
+
+
+def song_list_etag(request, songs, *extra):
+    """
+    Version of a page of songs from the rows being served (`songs`, already
+    fetched), so it costs no query however large the collection is. `extra`
+    adds what else shapes the response, e.g. the next/previous links.
+    """
+    rows = [
+        (s.pk, s.updated_at, s.owner.updated_at, s.likes_count, s.plays, getattr(s, "liked_by_me", False))
+        for s in songs
+    ]
+    return make_etag("songs", *_request_parts(request), rows, *extra)
+
+
+def song_etag(request, qs, pk):
+    """Version of one song as seen through `qs`; None when it isn't visible."""
+    try:
+        row = qs.filter(pk=pk).values_list(
+            "updated_at", "owner__updated_at", "likes_count", "plays", "liked_by_me"
+        ).first()
+    except ValueError:  # malformed pk: let the view 404
+        return None
+    if row is None:
+        return None
+    return make_etag("song", *_request_parts(request), *row)
+
+
+def user_etag(request, *row):
+    """Version of a user resource from its updated_at, counters and viewer flags."""
+    return make_etag("user", *_request_parts(request), *row)
@@ -0,0 +1,108 @@
+"""
+Denormalized counters: User.follower_count / following_count, Song.likes_count.
+
+They are kept current incrementally (api.signals, SongViewSet.like/unlike).
+The functions here recompute them from the m2m tables in set-based SQL,
+chunked by primary key so long reconciles never hold SQLite's write lock
+for long.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Song, User
+
+Follow = User.following.through
+Like = Song.likes.through
+
+
+def bump(qs, field, delta):
+    """Atomic `field = max(field + delta, 0)` on every row of qs."""
+    return qs.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def add_like(song_id, user_id):
+    """
+    Like + counter bump as INSERT then UPDATE in one short transaction, with no
+    read first, so it never needs to upgrade a shared lock. False if already liked.
+    """
+    try:
+        with transaction.atomic():
+            Like.objects.create(song_id=song_id, user_id=user_id)
+            bump(Song.objects.filter(pk=song_id), "likes_count", 1)
+    except IntegrityError:
+        return False
+    return True
+
+
+def remove_like(song_id, user_id):
+    """DELETE then UPDATE; False if there was no like to remove."""
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(song_id=song_id, user_id=user_id).delete()
+        if deleted:
+            bump(Song.objects.filter(pk=song_id), "likes_count", -deleted)
+    return bool(deleted)
+
+
+def apply_likes(user_id, like_ids=(), unlike_ids=()):
+    """
+    Many likes/unlikes by one user in one transaction: a bulk INSERT, one
+    DELETE and one recount UPDATE for just the songs that changed.
+    Returns the ids of the songs whose like state actually changed.
+    """
+    like_ids, unlike_ids = set(like_ids), set(unlike_ids)
+    with transaction.atomic():
+        # IMMEDIATE transactions (api.db) hold the write lock already, so reading first is safe
+        existing = set(
+            Like.objects.filter(user_id=user_id, song_id__in=like_ids | unlike_ids).values_list("song_id", flat=True)
+        )
+        added = like_ids - existing
+        removed = unlike_ids & existing
+        Like.objects.bulk_create([Like(song_id=pk, user_id=user_id) for pk in added], ignore_conflicts=True)
+        if removed:
+            Like.objects.filter(user_id=user_id, song_id__in=removed).delete()
+        changed = added | removed
+        if changed:
+            reconcile_songs(Song.objects.filter(pk__in=changed))
+    return changed
+
+
+def _count_of(model, column):
+    return Coalesce(Subquery(
+        model.objects.filter(**{column: OuterRef("pk")})
+        .values(column)
+        .annotate(c=Count("pk"))
+        .values("c")
+    ), 0)
+
+
+def reconcile_users(qs):
+    """Recount follower_count / following_count for the users in qs, in one UPDATE."""
+    return qs.update(
+        follower_count=_count_of(Follow, "to_user_id"),
+        following_count=_count_of(Follow, "from_user_id"),
+    )
+
+
+def reconcile_songs(qs):
+    """Recount likes_count for the songs in qs, in one UPDATE."""
+    return qs.update(likes_count=_count_of(Like, "song_id"))
+
+
+def _chunked(model, reconcile, chunk_size):
+    bounds = model.objects.aggregate(lo=Min("pk"), hi=Max("pk"))
+    if bounds["lo"] is None:
+        return 0
+    rows = 0
+    for start in range(bounds["lo"], bounds["hi"] + 1, chunk_size):
+        with transaction.atomic():
+            rows += reconcile(model.objects.filter(pk__gte=start, pk__lt=start + chunk_size))
+    return rows
+
+
+def reconcile_all(chunk_size=5000):
+    """Recount every counter; returns rows touched per model."""
+    return {
+        "users": _chunked(User, reconcile_users, chunk_size),
+        "songs": _chunked(Song, reconcile_songs, chunk_size),
+    }
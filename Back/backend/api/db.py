@@ -0,0 +1,63 @@
+"""
+Database plumbing: SQLite connection tuning and read-replica routing.
+
+Every new SQLite connection gets settings.SQLITE_PRAGMAS (WAL, busy
+timeout, ...). With WAL, readers never block the writer. Together with
+BEGIN IMMEDIATE (the "transaction_mode" option), writers wait up to
+busy_timeout for the lock instead of failing with "database is locked"
+when a read transaction tries to upgrade.
+
+GET/HEAD requests to views using ReplicaReadMixin are read from one of
+settings.DATABASE_REPLICAS, if any are configured. Writes always go to
+"default". A replica may lag behind, so only views whose readers can
+tolerate that use the mixin.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_replica_reads = contextvars.ContextVar("replica_reads", default=False)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if connection.alias in settings.DATABASE_REPLICAS:
+        # read-only handle: the journal mode belongs to the writer
+        pragmas.pop("journal_mode", None)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        # explicit, so instances read from a replica are still saved to the primary
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class ReplicaReadMixin:
+    """Route the ORM reads of safe (GET/HEAD) requests to a replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _replica_reads.set(request.method in ("GET", "HEAD"))
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
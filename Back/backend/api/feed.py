@@ -0,0 +1,162 @@
+"""
+Hybrid "artists you follow" timelines.
+
+Fan-out on write: a new public song from an artist with at most
+FEED_FANOUT_MAX_FOLLOWERS followers is copied into each follower's
+TimelineEntry rows. Following someone backfills their latest
+FEED_BACKFILL_SONGS songs, and unfollowing removes them again.
+
+Merge on read: songs from bigger artists are never fanned out. The feed
+reads the reader's timeline and those artists' newest songs, two
+index-ordered queries bounded by the page size, and merges them by
+(-created_at, id).
+
+An artist crossing the limit keeps a complete feed either way. Going up,
+the songs fanned out so far stay in the timelines and the merge skips the
+duplicates. Going down (api.signals sees the unfollow that did it), every
+follower is backfilled as if they had just followed, since the songs
+uploaded in between only ever reached them through the merge.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Song, TimelineEntry, User
+
+Follow = User.following.through
+
+
+def fanout_limit():
+    return settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def _entries(user_ids, songs):
+    return [
+        TimelineEntry(user_id=u, song_id=s.pk, created_at=s.created_at)
+        for u in user_ids for s in songs
+    ]
+
+
+def fan_out(song_id):
+    """Copy a public song into its followers' timelines (small artists only)."""
+    song = Song.objects.select_related("owner").filter(pk=song_id, is_public=True).first()
+    if song is None or song.owner.follower_count > fanout_limit():
+        return 0
+    followers = Follow.objects.filter(to_user_id=song.owner_id).values_list("from_user_id", flat=True)
+    created, batch = 0, []
+    for follower_id in followers.iterator(chunk_size=1000):
+        batch.append(follower_id)
+        if len(batch) == 1000:
+            created += len(TimelineEntry.objects.bulk_create(_entries(batch, [song]), ignore_conflicts=True))
+            batch = []
+    if batch:
+        created += len(TimelineEntry.objects.bulk_create(_entries(batch, [song]), ignore_conflicts=True))
+    return created
+
+
+def retract(song_id):
+    """Song went private: take it out of every timeline."""
+    return TimelineEntry.objects.filter(song_id=song_id).delete()[0]
+
+
+def on_follow(follower_ids, artist_ids):
+    """Backfill the newest songs of newly followed small artists."""
+    artists = User.objects.filter(pk__in=artist_ids, follower_count__lte=fanout_limit()).values_list("pk", flat=True)
+    for artist_id in artists:
+        songs = list(
+            Song.objects.filter(owner_id=artist_id, is_public=True)
+            .order_by("-created_at")
+            .only("pk", "created_at")[: settings.FEED_BACKFILL_SONGS]
+        )
+        if songs:
+            TimelineEntry.objects.bulk_create(_entries(follower_ids, songs), ignore_conflicts=True, batch_size=1000)
+
+
+def on_shrink(artist_ids):
+    """Artists back at the fan-out limit: backfill their followers, whose feeds stop merging them."""
+    for artist_id in artist_ids:
+        followers = list(Follow.objects.filter(to_user_id=artist_id).values_list("from_user_id", flat=True))
+        for start in range(0, len(followers), 1000):
+            on_follow(followers[start: start + 1000], [artist_id])
+
+
+def on_unfollow(follower_ids, artist_ids=None):
+    """Drop the artists' songs from the followers' timelines (all follows when artist_ids is None)."""
+    rows = TimelineEntry.objects.filter(user_id__in=follower_ids)
+    if artist_ids is not None:
+        rows = rows.filter(song__owner_id__in=artist_ids)
+    return rows.delete()[0]
+
+
+def rebuild(user_ids=None):
+    """Recreate timelines from the follow graph, e.g. for follows made before timelines existed."""
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        follows = follows.filter(from_user_id__in=user_ids)
+        TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+    else:
+        TimelineEntry.objects.all().delete()
+    by_artist = {}
+    for follower_id, artist_id in follows.values_list("from_user_id", "to_user_id").iterator(chunk_size=2000):
+        by_artist.setdefault(artist_id, []).append(follower_id)
+    for artist_id, follower_ids in by_artist.items():
+        on_follow(follower_ids, [artist_id])
+    return TimelineEntry.objects.count()
+
+
+# --- reading -------------------------------------------------------------
+
+def encode_cursor(created_at, pk):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """-> (created_at, id); ValueError if the cursor is malformed."""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+
+
+def _after(created_field, id_field, position):
+    # rows after `position` in (-created_at, id) order
+    if position is None:
+        return Q()
+    created_at, pk = position
+    return Q(**{f"{created_field}__lt": created_at}) | Q(**{created_field: created_at, f"{id_field}__gt": pk})
+
+
+def page_song_ids(user, limit, position=None):
+    """
+    One feed page for `user`: (song ids in feed order, next position or None).
+    Both sources are read in index order and capped at limit + 1 rows.
+    """
+    fanned = (
+        TimelineEntry.objects.filter(user=user, song__is_public=True)
+        .filter(_after("created_at", "song_id", position))
+        .order_by("-created_at", "song_id")
+        .values_list("created_at", "song_id")[: limit + 1]
+    )
+    candidates = {pk: created_at for created_at, pk in fanned}
+
+    big_artists = list(
+        Follow.objects.filter(from_user_id=user.pk, to_user__follower_count__gt=fanout_limit())
+        .values_list("to_user_id", flat=True)
+    )
+    if big_artists:
+        merged = (
+            Song.objects.filter(owner_id__in=big_artists, is_public=True)
+            .filter(_after("created_at", "id", position))
+            .order_by("-created_at", "id")
+            .values_list("created_at", "id")[: limit + 1]
+        )
+        candidates.update({pk: created_at for created_at, pk in merged})
+
+    ordered = sorted(candidates.items(), key=lambda item: (-item[1].timestamp(), item[0]))
+    page = ordered[:limit]
+    next_position = (page[-1][1], page[-1][0]) if len(ordered) > limit else None
+    return [pk for pk, _ in page], next_position
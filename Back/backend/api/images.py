@@ -0,0 +1,68 @@
+"""
+Resized WebP variants of covers and profile pictures.
+
+render_variants() is plain Pillow, so `manage.py build_image_variants` can
+run it in a process pool. Variants are written next to the original as
+<stem>.<hash>.<width>.webp, where <hash> comes from the original's bytes:
+a replaced image always gets new URLs, so they can be cached forever.
+
+Models keep the result as {"<width>": "<storage name>"} (Song.cover_variants,
+User.profile_picture_variants), filled by api.signals on upload.
+"""
+import hashlib
+import os
+
+from PIL import Image, ImageOps
+
+
+def _digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()[:10]
+
+
+def render_variants(path, widths, quality=80):
+    """
+    Write a WebP of the image at `path` for every width in `widths` smaller
+    than the image itself (it is never upscaled), keeping the aspect ratio.
+    Returns {width: file name in the same directory}.
+    """
+    widths = sorted(set(widths), reverse=True)
+    digest = _digest(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    folder = os.path.dirname(path)
+    made = {}
+    with Image.open(path) as img:
+        # JPEG decoders can downscale by 2/4/8 while decoding; ask for just enough pixels
+        img.draft("RGB", (widths[0], widths[0]))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        for width in widths:
+            if width >= img.width:
+                continue
+            # largest first, each one resized from the previous: cheaper than from the full image
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS)
+            name = f"{stem}.{digest}.{width}.webp"
+            img.save(os.path.join(folder, name), "WEBP", quality=quality, method=4)
+            made[width] = name
+    return dict(sorted(made.items()))
+
+
+def build(field_file, widths, quality=80):
+    """Variants for an ImageField value as stored names, {"<width>": name}; {} if there is no file."""
+    if not field_file:
+        return {}
+    made = render_variants(field_file.path, widths, quality)
+    folder = os.path.dirname(field_file.name)
+    return {str(width): f"{folder}/{name}" if folder else name for width, name in made.items()}
+
+
+def srcset(variants, storage, request=None):
+    """{"64w": url, ...} for a stored variants map, smallest first."""
+    out = {}
+    for width, name in sorted((variants or {}).items(), key=lambda item: int(item[0])):
+        url = storage.url(name)
+        out[f"{width}w"] = request.build_absolute_uri(url) if request is not None else url
+    return out
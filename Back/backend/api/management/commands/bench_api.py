@@ -0,0 +1,217 @@
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.management.commands.seed_data import PREFIX, WORDS
+from api.models import Song, User
+
+SCENARIOS = ("songs_list", "songs_list_auth", "song_search", "user_search", "feed", "follow", "like", "audio_range")
+
+
+class InProcess:
+    """Django test client per thread; also counts SQL queries per request."""
+    counts_queries = True
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def request(self, method, path, headers):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = Client()
+        extra = {"HTTP_" + k.upper().replace("-", "_"): v for k, v in headers.items()}
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method.lower())(path, **extra)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            response.close()
+        return response.status_code, len(queries)
+
+
+class Http:
+    """A running server (runserver, gunicorn, ...) at base_url."""
+    counts_queries = False
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, headers):
+        req = urllib.request.Request(self.base_url + path, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as exc:
+            return exc.code, None
+
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the main API endpoints at several concurrency levels against the seed_data "
+        "dataset and print p50/p95/p99 latency, throughput and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma list of: {', '.join(SCENARIOS)}.")
+        parser.add_argument("--concurrency", default="1,4,16", help="Comma list of thread counts.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level.")
+        parser.add_argument("--base-url", help="Benchmark a running server instead of the in-process test client.")
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+        parser.add_argument("--compare", help="A previous report; adds p50/p95/p99 ratios (new / old).")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        scenarios = [s.strip() for s in opts["scenarios"].split(",") if s.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        levels = [int(c) for c in opts["concurrency"].split(",")]
+
+        self.data = self.load_dataset()
+        transport = Http(opts["base_url"]) if opts["base_url"] else InProcess()
+        report = {
+            "transport": opts["base_url"] or "in-process",
+            "dataset": {k: len(v) for k, v in self.data.items() if isinstance(v, list)},
+            "requests_per_run": opts["requests"],
+            "results": {},
+        }
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for name in scenarios:
+                report["results"][name] = {}
+                for level in levels:
+                    result = self.run(transport, name, level, opts["requests"], opts["seed"])
+                    report["results"][name][str(level)] = result
+                    self.stderr.write(f"{name:16} c={level:<3} p50={result['p50_ms']}ms p99={result['p99_ms']}ms "
+                                      f"{result['throughput_rps']} rps")
+
+        if opts["compare"]:
+            with open(opts["compare"]) as f:
+                report["compare"] = self.compare(json.load(f), report)
+        output = json.dumps(report, indent=2)
+        if opts["output"]:
+            with open(opts["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def load_dataset(self):
+        users = list(User.objects.filter(username__startswith=PREFIX).values_list("pk", "username", "role")[:200])
+        if not users:
+            raise CommandError("No seeded users; run `manage.py seed_data` first.")
+        artists = [name for _, name, role in users if role == User.Roles.ARTIST]
+        listeners = [pk for pk, _, role in users if role != User.Roles.ARTIST][:50]
+        songs = list(
+            Song.objects.filter(owner__username__startswith=PREFIX, is_public=True)
+            .values_list("pk", "audio")[:500]
+        )
+        tokens = [str(RefreshToken.for_user(User(pk=pk)).access_token) for pk in listeners]
+        usernames = [name for _, name, _ in users]
+        return {"usernames": usernames, "artists": artists, "listeners": listeners, "songs": songs, "tokens": tokens}
+
+    def make_request(self, name, rng, state):
+        """One request of scenario `name`: (method, path, headers)."""
+        data = self.data
+        token = rng.choice(data["tokens"])
+        auth = {"Authorization": f"Bearer {token}"}
+        if name == "songs_list":
+            return "GET", "/api/songs/?page_size=20", {}
+        if name == "songs_list_auth":
+            return "GET", "/api/songs/?page_size=20", auth
+        if name == "song_search":
+            return "GET", f"/api/songs/?search={rng.choice(WORDS)[:rng.randint(2, 5)]}", {}
+        if name == "user_search":
+            return "GET", f"/api/users/search/?q={rng.choice(data['usernames'])[:rng.randint(2, 8)]}", {}
+        if name == "feed":
+            return "GET", "/api/feed/", auth
+        if name == "follow":
+            # alternate follow / unfollow so the graph stays the same size
+            state["follow"] = not state.get("follow")
+            return ("POST" if state["follow"] else "DELETE"), f"/api/users/{rng.choice(data['artists'])}/follow/", auth
+        if name == "like":
+            state["like"] = not state.get("like")
+            action = "like" if state["like"] else "unlike"
+            return "POST", f"/api/songs/{rng.choice(data['songs'])[0]}/{action}/", auth
+        if name == "audio_range":
+            start = rng.randint(0, 4096)
+            return "GET", f"/media/{rng.choice(data['songs'])[1]}", {"Range": f"bytes={start}-{start + 8191}"}
+        raise ValueError(name)
+
+    def run(self, transport, name, concurrency, total, seed):
+        remaining = [total]
+        lock = threading.Lock()
+        latencies, queries, errors = [], [], [0]
+
+        def worker(i):
+            rng = random.Random(seed * 1000 + i)
+            state = {}
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+                method, path, headers = self.make_request(name, rng, state)
+                started = time.perf_counter()
+                try:
+                    status, n_queries = transport.request(method, path, headers)
+                except Exception as exc:  # e.g. a lock timeout: count it and keep going
+                    self.stderr.write(f"{method} {path}: {exc}")
+                    status, n_queries = 599, None
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    if n_queries is not None:
+                        queries.append(n_queries)
+                    if status >= 400:
+                        errors[0] += 1
+            if transport.counts_queries:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return summarize(latencies, queries, errors[0], time.perf_counter() - started)
+
+    def compare(self, old, new):
+        ratios = {}
+        for name, levels in new["results"].items():
+            for level, result in levels.items():
+                before = old.get("results", {}).get(name, {}).get(level)
+                if not before:
+                    continue
+                ratios.setdefault(name, {})[level] = {
+                    key: round(result[key] / before[key], 2) if before[key] else None
+                    for key in ("p50_ms", "p95_ms", "p99_ms")
+                }
+        return ratios
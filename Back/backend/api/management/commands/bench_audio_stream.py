@@ -0,0 +1,85 @@
+import json
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.utils import serve_audio_with_range
+
+
+def legacy_serve_audio_with_range(request, file_path):
+    """The pre-streaming responder (reads the whole range into memory), kept for comparison."""
+    file_size = os.path.getsize(file_path)
+    range_match = re.match(r"bytes=(\d+)-(\d*)", request.META.get("HTTP_RANGE", "").strip())
+    start = int(range_match.group(1))
+    end = int(range_match.group(2)) if range_match.group(2) else file_size - 1
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start + 1)
+    response = HttpResponse(data, status=206, content_type="audio/mpeg")
+    response["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    return response
+
+
+def run_streams(responder, path, streams, range_header):
+    """
+    Open `streams` responses at once and drain them round-robin, like slow
+    clients sharing one worker. Returns peak traced memory and timing.
+    """
+    factory = RequestFactory()
+    tracemalloc.start()
+    started = time.perf_counter()
+    responses = [responder(factory.get("/", HTTP_RANGE=range_header), path) for _ in range(streams)]
+    iterators = [iter(r) for r in responses]
+    sent = 0
+    while iterators:
+        alive = []
+        for it in iterators:
+            chunk = next(it, None)
+            if chunk is not None:
+                sent += len(chunk)
+                alive.append(it)
+        iterators = alive
+    for r in responses:
+        r.close()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": round(elapsed, 3),
+        "peak_mib": round(peak / 2**20, 2),
+        "peak_kib_per_stream": round(peak / 1024 / streams, 1),
+        "bytes_sent": sent,
+    }
+
+
+class Command(BaseCommand):
+    help = "Measure memory per concurrent audio stream for the range responder vs the legacy in-memory one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=int, default=50, help="Test file size (50 = upload limit).")
+        parser.add_argument("--streams", type=int, nargs="+", default=[1, 8, 32])
+        parser.add_argument("--range", default="bytes=0-", help="Range header each client sends.")
+        parser.add_argument("--skip-legacy", action="store_true")
+
+    def handle(self, *args, **opts):
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "track.mp3")
+            with open(path, "wb") as f:
+                for _ in range(opts["size_mb"]):
+                    f.write(os.urandom(1024 * 1024))
+
+            for streams in opts["streams"]:
+                row = {"streams": streams, "range": opts["range"], "file_mb": opts["size_mb"]}
+                row["streaming"] = run_streams(serve_audio_with_range, path, streams, opts["range"])
+                if not opts["skip_legacy"]:
+                    row["legacy"] = run_streams(legacy_serve_audio_with_range, path, streams, opts["range"])
+                results.append(row)
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,104 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import auth
+from api.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+def measure(fn, repeat):
+    """Per-call latency in microseconds and SQL queries per call."""
+    samples = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        "p50_us": round(statistics.median(samples), 1),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1], 1),
+        "mean_us": round(statistics.fmean(samples), 1),
+        "queries_per_call": round(len(queries) / repeat, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark per-request JWT overhead: stock JWTAuthentication vs api.auth's cached user "
+        "lookup, the refresh blacklist check, and prune_tokens on N token rows. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--tokens", type=int, default=100_000, help="Outstanding token rows to create, half expired.")
+
+    def handle(self, *args, **opts):
+        n = opts["requests"]
+        result = {"requests": n, "tokens": opts["tokens"]}
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(f"bench_auth_{uuid4().hex[:8]}", password="x", role=User.Roles.LISTENER)
+                self.make_tokens(user, opts["tokens"])
+
+                refresh = RefreshToken.for_user(user)
+                header = f"Bearer {refresh.access_token}"
+                request = RequestFactory().get("/api/me/", HTTP_AUTHORIZATION=header)
+
+                stock, cached = JWTAuthentication(), auth.CachedJWTAuthentication()
+                auth.forget_user(user.pk)
+                result["authenticate"] = {
+                    "stock": measure(lambda: stock.authenticate(request), n),
+                    "cached": measure(lambda: cached.authenticate(request), n),
+                }
+                result["refresh_blacklist_check"] = {
+                    "stock": measure(lambda: RefreshToken(str(refresh), verify=False).check_blacklist(), n),
+                    "cached": measure(
+                        lambda: auth.CachedBlacklistRefreshToken(str(refresh), verify=False).check_blacklist(), n
+                    ),
+                }
+
+                started = time.perf_counter()
+                blacklisted, outstanding = auth.prune_tokens()
+                result["prune_tokens"] = {
+                    "deleted_outstanding": outstanding,
+                    "deleted_blacklisted": blacklisted,
+                    "seconds": round(time.perf_counter() - started, 3),
+                }
+                auth.forget_user(user.pk)
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(result, indent=2))
+
+    def make_tokens(self, user, count):
+        """Rotation leftovers: half expired, each of those blacklisted."""
+        now = timezone.now()
+        rows = [
+            OutstandingToken(
+                user=user, jti=uuid4().hex, token="x", created_at=now,
+                expires_at=now + timedelta(days=-1 if i % 2 else 30),
+            )
+            for i in range(count)
+        ]
+        OutstandingToken.objects.bulk_create(rows, batch_size=5000)
+        expired = OutstandingToken.objects.filter(user=user, expires_at__lte=now)
+        BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(token_id=pk) for pk in expired.values_list("pk", flat=True)], batch_size=5000
+        )
@@ -0,0 +1,110 @@
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+from django.test import RequestFactory
+from django.utils import timezone
+
+from api import charts
+from api.models import Song, User
+from api.views import ChartsView
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_chart(genre=None):
+    """Scoring at read time: every public song joined to its likes, sorted."""
+    qs = Song.objects.filter(is_public=True)
+    if genre:
+        qs = qs.filter(genre=genre)
+    qs = qs.annotate(n_likes=Count("likes")).annotate(
+        engagement=F("plays") + settings.CHARTS_LIKE_WEIGHT * F("n_likes")
+    )
+    return list(qs.order_by("-engagement", "-pk").values_list("pk", flat=True)[:settings.CHARTS_SIZE])
+
+
+def timings(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1], 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark trending charts on N synthetic songs: ORDER BY over songs joined to likes "
+        "vs api.charts.build() plus GET /api/charts/. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--songs", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--likes", type=int, default=200_000)
+        parser.add_argument("--genres", type=int, default=40)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(42)
+        genres = [f"genre{i}" for i in range(opts["genres"])]
+        result = {k: opts[k] for k in ("songs", "users", "likes", "genres")}
+        try:
+            with transaction.atomic():
+                tag = uuid4().hex[:8]
+                users = User.objects.bulk_create(
+                    [User(username=f"bench_charts_{tag}_{i}", role=User.Roles.LISTENER) for i in range(opts["users"])],
+                    batch_size=1000,
+                )
+                now = timezone.now()
+                songs = Song.objects.bulk_create(
+                    [
+                        Song(
+                            owner=rng.choice(users), title=f"song {i}", audio=f"audio/bench_{tag}_{i}.mp3",
+                            genre=rng.choice(genres), is_public=rng.random() < 0.9,
+                            plays=int(rng.paretovariate(1.2)) - 1,
+                            created_at=now - timedelta(hours=rng.random() * 24 * 90),
+                        )
+                        for i in range(opts["songs"])
+                    ],
+                    batch_size=1000,
+                )
+                Like = Song.likes.through
+                pairs = {(rng.choice(songs).pk, rng.choice(users).pk) for _ in range(opts["likes"])}
+                Like.objects.bulk_create([Like(song_id=s, user_id=u) for s, u in pairs], batch_size=5000)
+                result["likes"] = len(pairs)
+
+                genre = genres[0]
+                result["legacy_order_by"] = {
+                    "global": timings(legacy_chart, opts["repeat"]),
+                    "genre": timings(lambda: legacy_chart(genre), opts["repeat"]),
+                }
+
+                result["build"] = {"first": charts.build()}
+                Song.objects.filter(pk__in=[s.pk for s in rng.sample(songs, len(songs) // 100)]).update(plays=F("plays") + 1)
+                result["build"]["after_1pct_played"] = charts.build()
+
+                factory, view = RequestFactory(), ChartsView.as_view()
+                result["charts_view"] = {
+                    "global": timings(lambda: view(factory.get("/api/charts/")), opts["repeat"]),
+                    "genre": timings(lambda: view(factory.get("/api/charts/", {"genre": genre})), opts["repeat"]),
+                }
+                result["numpy"] = charts.np is not None
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(result, indent=2))
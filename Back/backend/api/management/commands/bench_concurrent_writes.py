@@ -0,0 +1,174 @@
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.test.utils import override_settings
+
+from api import counters
+from api.models import Song, User
+
+LEGACY_PRAGMAS = {"journal_mode": "DELETE"}
+
+
+def legacy_like(song_id, user_id):
+    """The pre-tuning like: read-then-write in a deferred transaction."""
+    Like = Song.likes.through
+    with transaction.atomic():
+        _, created = Like.objects.get_or_create(song_id=song_id, user_id=user_id)
+        if created:
+            Song.objects.filter(pk=song_id).update(likes_count=F("likes_count") + 1)
+
+
+def legacy_unlike(song_id, user_id):
+    Like = Song.likes.through
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(song_id=song_id, user_id=user_id).delete()
+        if deleted:
+            Song.objects.filter(pk=song_id).update(likes_count=F("likes_count") - deleted)
+
+
+def percentile(samples, p):
+    return round(samples[min(len(samples) - 1, int(len(samples) * p))], 2)
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer likes/unlikes/follows from concurrent threads (plus readers) on a "
+        "throwaway SQLite file, with the old connection setup and the tuned one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--ops", type=int, default=300, help="Operations per thread.")
+        parser.add_argument("--read-ratio", type=float, default=0.5)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--songs", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "sqlite":
+            self.stderr.write("This benchmark targets SQLite.")
+            return
+        db_dir = tempfile.mkdtemp()
+        settings_dict = connection.settings_dict
+        settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(db_dir, "bench.sqlite3")
+        original_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            user_ids, song_ids = self.seed(opts["users"], opts["songs"])
+            result = {"threads": opts["threads"], "ops_per_thread": opts["ops"], "read_ratio": opts["read_ratio"]}
+            legacy_options = {k: v for k, v in settings_dict["OPTIONS"].items() if k != "transaction_mode"}
+            result["legacy"] = self.run_mode(
+                opts, user_ids, song_ids, legacy_like, legacy_unlike, legacy_options, LEGACY_PRAGMAS,
+            )
+            result["tuned"] = self.run_mode(
+                opts, user_ids, song_ids, counters.add_like, counters.remove_like, settings_dict["OPTIONS"], None,
+            )
+        finally:
+            connection.creation.destroy_test_db(original_name, verbosity=0)
+        self.stdout.write(json.dumps(result, indent=2))
+
+    def seed(self, n_users, n_songs):
+        User.objects.bulk_create(
+            [User(username=f"bench{i}", username_lower=f"bench{i}", password="!") for i in range(n_users)],
+            batch_size=1000,
+        )
+        user_ids = list(User.objects.values_list("pk", flat=True))
+        rng = random.Random(7)
+        Song.objects.bulk_create(
+            [Song(owner_id=rng.choice(user_ids), title=f"song {i}", audio=f"audio/bench/{i}.mp3",
+                  processing_status=Song.ProcessingStatus.READY) for i in range(n_songs)],
+            batch_size=1000,
+        )
+        return user_ids, list(Song.objects.values_list("pk", flat=True))
+
+    def run_mode(self, opts, user_ids, song_ids, like, unlike, options, pragmas):
+        connection.close()
+        saved_options = connection.settings_dict["OPTIONS"]
+        connection.settings_dict["OPTIONS"] = options
+        overrides = {} if pragmas is None else {"SQLITE_PRAGMAS": pragmas}
+        with override_settings(**overrides):
+            try:
+                return self._run(opts, user_ids, song_ids, like, unlike)
+            finally:
+                connection.close()
+                connection.settings_dict["OPTIONS"] = saved_options
+
+    def _run(self, opts, user_ids, song_ids, like, unlike):
+        # reset state and settle the journal mode with a single connection
+        Song.likes.through.objects.all().delete()
+        User.following.through.objects.all().delete()
+        counters.reconcile_all()
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+        connection.close()
+
+        lock = threading.Lock()
+        writes, reads, errors = [], [], []
+        start = threading.Barrier(opts["threads"])
+
+        def worker(seed):
+            from django.db import connection as conn
+            rng = random.Random(seed)
+            me = rng.choice(user_ids)
+            my_writes, my_reads, my_errors = [], [], []
+            start.wait()
+            for _ in range(opts["ops"]):
+                began = time.perf_counter()
+                try:
+                    if rng.random() < opts["read_ratio"]:
+                        list(Song.objects.select_related("owner").order_by("-created_at")[:20])
+                        my_reads.append((time.perf_counter() - began) * 1000)
+                        continue
+                    kind = rng.random()
+                    song_id = rng.choice(song_ids)
+                    if kind < 0.4:
+                        like(song_id, me)
+                    elif kind < 0.7:
+                        unlike(song_id, me)
+                    else:
+                        other = User.objects.get(pk=rng.choice(user_ids))
+                        if other.pk != me:
+                            me_user = User(pk=me)
+                            (me_user.following.add if kind < 0.85 else me_user.following.remove)(other)
+                    my_writes.append((time.perf_counter() - began) * 1000)
+                except OperationalError as exc:
+                    my_errors.append(str(exc))
+            conn.close()
+            with lock:
+                writes.extend(my_writes)
+                reads.extend(my_reads)
+                errors.extend(my_errors)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(opts["threads"])]
+        began = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - began
+
+        writes.sort()
+        reads.sort()
+        likes_drift = Song.objects.exclude(
+            likes_count=counters._count_of(Song.likes.through, "song_id")
+        ).count()
+        return {
+            "journal_mode": journal_mode,
+            "seconds": round(elapsed, 2),
+            "ops_per_second": round((len(writes) + len(reads)) / elapsed, 1),
+            "writes": len(writes),
+            "write_p50_ms": percentile(writes, 0.5) if writes else None,
+            "write_p95_ms": percentile(writes, 0.95) if writes else None,
+            "write_p99_ms": percentile(writes, 0.99) if writes else None,
+            "read_p50_ms": round(statistics.median(reads), 2) if reads else None,
+            "read_p99_ms": percentile(reads, 0.99) if reads else None,
+            "locked_errors": len(errors),
+            "likes_count_drift": likes_drift,
+        }
@@ -0,0 +1,111 @@
+import json
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from api.models import User
+from api.views import UserSearchView
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_queryset(q, role=None):
+    """The pre-index lookup: substring scan + sort."""
+    qs = User.objects.filter(username__icontains=q)
+    if role:
+        qs = qs.filter(role=role)
+    return qs.order_by("username")[:20]
+
+
+def new_queryset(q, role=None):
+    """UserSearchView's queryset for an anonymous request."""
+    params = {"q": q}
+    if role:
+        params["role"] = role
+    view = UserSearchView()
+    view.request = view.initialize_request(RequestFactory().get("/", params))
+    return view.get_queryset()
+
+
+def timings(fn, queries, repeat):
+    """Latency of fetching the 20 rows; building the (lazy) queryset is not timed."""
+    samples = []
+    for _ in range(repeat):
+        for q, role in queries:
+            qs = fn(q, role)
+            started = time.perf_counter()
+            list(qs)
+            samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark username autocomplete on N synthetic users. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--skip-legacy", action="store_true")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(42)
+        alphabet = string.ascii_lowercase + string.digits
+
+        def make_name(i):
+            stem = "".join(rng.choices(string.ascii_letters, k=rng.randint(3, 9)))
+            return f"{stem}{i}" if rng.random() < 0.5 else f"{stem}_{rng.choice(alphabet)}{i}"
+
+        result = {"users": opts["users"]}
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                batch = []
+                for i in range(opts["users"]):
+                    name = make_name(i)
+                    batch.append(User(
+                        username=name, username_lower=name.lower(), password="!",
+                        role=User.Roles.ARTIST if i % 10 == 0 else User.Roles.LISTENER,
+                    ))
+                    if len(batch) == 10_000:
+                        User.objects.bulk_create(batch)
+                        batch = []
+                User.objects.bulk_create(batch)
+                result["seed_seconds"] = round(time.perf_counter() - started, 1)
+                if connection.vendor == "sqlite":
+                    with connection.cursor() as cursor:
+                        cursor.execute("ANALYZE")
+
+                queries = []
+                for _ in range(opts["queries"]):
+                    prefix = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 4)))
+                    queries.append((prefix, "ARTIST" if rng.random() < 0.3 else None))
+
+                result["prefix_index"] = timings(new_queryset, queries, opts["repeat"])
+                # same lookup without ORM row construction: the index cost alone
+                result["prefix_index_sql_only"] = timings(
+                    lambda q, role: new_queryset(q, role).values_list("id", flat=True), queries, opts["repeat"]
+                )
+                if not opts["skip_legacy"]:
+                    result["legacy_icontains"] = timings(legacy_queryset, queries[:20], 1)
+                result["plan"] = new_queryset("ab").explain()
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(json.dumps(result, indent=2))
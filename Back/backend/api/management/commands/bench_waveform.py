@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api import waveform
+
+
+def legacy_generate_waveform(audio_path, num_bars=65):
+    """The pre-streaming implementation (full pydub decode + per-bar Python loop), kept for comparison."""
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(audio_path)
+    samples = np.array(audio.get_array_of_samples())
+    if audio.channels == 2:
+        samples = samples.reshape((-1, 2))
+        samples = samples.mean(axis=1)
+
+    chunk_size = len(samples) // num_bars
+    waveform_data = []
+    for i in range(num_bars):
+        start = i * chunk_size
+        end = start + chunk_size
+        chunk = samples[start:end] if start < len(samples) else samples[-chunk_size:]
+        rms = np.sqrt(np.mean(chunk**2)) if len(chunk) > 0 else 0
+        waveform_data.append(float(rms))
+
+    max_val = max(waveform_data)
+    if max_val > 0:
+        return [min(0.3 + (val / max_val) * 0.7, 1.0) for val in waveform_data]
+    return [0.5] * num_bars
+
+
+def write_test_wav(path, minutes, rate=44100, channels=2):
+    """Stream a swept sine with a slow amplitude envelope to disk, one second at a time."""
+    rng = np.random.default_rng(0)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        t0 = 0
+        for _ in range(int(minutes * 60)):
+            t = (t0 + np.arange(rate)) / rate
+            env = 0.2 + 0.8 * np.abs(np.sin(t / 20))
+            x = env * np.sin(2 * np.pi * (220 + 20 * np.sin(t)) * t) + 0.02 * rng.standard_normal(rate)
+            pcm = (np.clip(x, -1, 1) * 32000).astype("<i2")
+            w.writeframes(np.repeat(pcm, channels).tobytes())
+            t0 += rate
+
+
+def measure(fn, path):
+    tracemalloc.start()
+    started = time.perf_counter()
+    bars = fn(path)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return bars, {"seconds": round(elapsed, 3), "peak_mib": round(peak / 2**20, 2)}
+
+
+class Command(BaseCommand):
+    help = "Benchmark the streaming waveform engine against the legacy full-decode implementation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 30],
+                            help="Synthetic track lengths to test.")
+        parser.add_argument("--file", action="append", default=[],
+                            help="Benchmark an existing audio file as well (repeatable).")
+        parser.add_argument("--skip-legacy", action="store_true",
+                            help="Only run the streaming engine (legacy needs RAM ~ 10x the file size).")
+
+    def handle(self, *args, **opts):
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = list(opts["file"])
+            for minutes in opts["minutes"]:
+                path = os.path.join(tmp, f"sweep_{minutes:g}min.wav")
+                write_test_wav(path, minutes)
+                paths.append(path)
+
+            for path in paths:
+                row = {"file": os.path.basename(path), "bytes": os.path.getsize(path)}
+                bars, row["streaming"] = measure(waveform.generate_waveform, path)
+                if not opts["skip_legacy"]:
+                    legacy_bars, row["legacy"] = measure(legacy_generate_waveform, path)
+                    row["max_bar_diff"] = round(float(np.max(np.abs(np.subtract(bars, legacy_bars)))), 4)
+                results.append(row)
+
+        self.stdout.write(json.dumps(results, indent=2))
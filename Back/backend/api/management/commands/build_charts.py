@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import charts
+
+
+class Command(BaseCommand):
+    help = "Rescore songs (time-decayed plays and likes) and rewrite the trending and per-genre charts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=None,
+                            help="Rebuild every N seconds instead of once.")
+
+    def handle(self, *args, **opts):
+        while True:
+            result = charts.build()
+            self.stdout.write(
+                f"{result['songs']} song(s) scored, {result['trends_written']} trend row(s) written, "
+                f"{result['charts']} chart(s) in {result['seconds']}s."
+            )
+            if opts["interval"] is None:
+                break
+            time.sleep(opts["interval"])
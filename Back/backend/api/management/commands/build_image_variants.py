@@ -0,0 +1,66 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import images, response_cache
+from api.models import Song, User
+
+# model -> (image field, variants field), as in api.signals.IMAGE_FIELDS
+TARGETS = {
+    "songs": (Song, "cover", "cover_variants"),
+    "users": (User, "profile_picture", "profile_picture_variants"),
+}
+
+
+def render(job):
+    """Pool task: (pk, name, path) -> (pk, {"<width>": name} or None, error)."""
+    pk, name, path = job
+    try:
+        made = images.render_variants(path, settings.IMAGE_VARIANT_WIDTHS, settings.IMAGE_VARIANT_QUALITY)
+    except Exception as exc:
+        return pk, None, f"{type(exc).__name__}: {exc}"
+    folder = os.path.dirname(name)
+    return pk, {str(w): f"{folder}/{f}" if folder else f for w, f in made.items()}, None
+
+
+class Command(BaseCommand):
+    help = "Generate WebP variants (IMAGE_VARIANT_WIDTHS) for existing covers and profile pictures, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Processes resizing at once.")
+        parser.add_argument("--batch-size", type=int, default=200, help="Rows written back per UPDATE.")
+        parser.add_argument("--only", choices=sorted(TARGETS), help="Just songs or just users.")
+        parser.add_argument("--force", action="store_true", help="Rebuild images that already have variants.")
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=opts["workers"]) as pool:
+            for label, (model, field, variants_field) in TARGETS.items():
+                if opts["only"] and opts["only"] != label:
+                    continue
+                qs = model.objects.exclude(**{f"{field}__isnull": True}).exclude(**{field: ""})
+                if not opts["force"]:
+                    qs = qs.filter(**{f"{variants_field}__isnull": True})
+                storage = model._meta.get_field(field).storage
+                jobs = [(pk, name, storage.path(name)) for pk, name in qs.values_list("pk", field).iterator()]
+                done = failed = 0
+                for i in range(0, len(jobs), opts["batch_size"]):
+                    batch = jobs[i:i + opts["batch_size"]]
+                    rows = []
+                    for pk, variants, error in pool.map(render, batch, chunksize=8):
+                        if error:
+                            failed += 1
+                            self.stderr.write(f"{label} {pk}: {error}")
+                            continue
+                        rows.append(model(pk=pk, **{variants_field: variants, "updated_at": timezone.now()}))
+                    # bulk_update skips save(), so the upload signals don't run again
+                    model.objects.bulk_update(rows, [variants_field, "updated_at"])
+                    if model is Song:
+                        response_cache.invalidate_songs([row.pk for row in rows])
+                    done += len(rows)
+                self.stdout.write(f"{label}: {done} built, {failed} failed")
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api.processing import queue_missing_renditions, run_worker
+
+
+class Command(BaseCommand):
+    help = "Run the upload post-processing worker (duration, waveform and streaming renditions for pending songs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=None,
+                            help="Max decodes in flight (default: SONG_PROCESSING_CONCURRENCY).")
+        parser.add_argument("--poll-interval", type=float, default=2.0,
+                            help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit when no song is due instead of polling forever.")
+        parser.add_argument("--backfill-renditions", action="store_true",
+                            help="First queue processed songs that have no renditions yet.")
+
+    def handle(self, *args, **opts):
+        if opts["backfill_renditions"]:
+            self.stdout.write(f"Queued {queue_missing_renditions()} song(s) for transcoding.")
+        handled = run_worker(
+            concurrency=opts["concurrency"],
+            poll_interval=opts["poll_interval"],
+            once=opts["once"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Processed {handled} song(s)."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.auth import prune_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired refresh-token rows (outstanding and blacklisted) in batches. "
+        "Run it from cron; token rotation adds rows on every refresh."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per DELETE.")
+
+    def handle(self, *args, **opts):
+        blacklisted, outstanding = prune_tokens(opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {outstanding} expired outstanding and {blacklisted} blacklisted token(s)."
+        ))
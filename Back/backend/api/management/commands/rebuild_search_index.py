@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the song full-text index (FTS5 on SQLite, tsvector on Postgres) from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **opts):
+        kind = search.backend(opts["database"])
+        if kind is None:
+            self.stdout.write(self.style.WARNING("No full-text index on this database; search uses LIKE."))
+            return
+        n = search.rebuild(opts["database"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {n} song(s) ({kind})."))
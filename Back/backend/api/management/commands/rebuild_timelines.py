@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import feed
+
+
+class Command(BaseCommand):
+    help = "Rebuild the following-feed timelines from the follow graph (e.g. after first deploying the feed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Only this user id (repeatable).")
+
+    def handle(self, *args, **opts):
+        n = feed.rebuild(opts["users"])
+        self.stdout.write(self.style.SUCCESS(f"{n} timeline entr{'y' if n == 1 else 'ies'} stored."))
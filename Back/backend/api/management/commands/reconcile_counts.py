@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import reconcile_all
+
+
+class Command(BaseCommand):
+    help = "Recompute follower/following and like counters from the m2m tables in chunked bulk UPDATEs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per UPDATE/transaction.")
+
+    def handle(self, *args, **opts):
+        rows = reconcile_all(chunk_size=opts["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {rows['users']} user(s) and {rows['songs']} song(s)."))
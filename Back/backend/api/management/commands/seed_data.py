@@ -0,0 +1,149 @@
+import io
+import os
+import random
+import shutil
+import time
+import wave
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api import counters, feed, search
+from api.models import Song, User
+
+PREFIX = "seed_"
+PASSWORD = "seed-password"
+GENRES = ["house", "techno", "hiphop", "jazz", "rock", "ambient", "dnb", "pop", "soul", "lofi"]
+WORDS = ["midnight", "echo", "river", "neon", "dust", "gold", "static", "summer", "ghost", "velvet",
+         "signal", "paper", "ocean", "drift", "ember", "glass", "motion", "violet", "north", "haze"]
+
+
+def zipf_weights(n, alpha):
+    """Popularity by rank: a few items get most of the attention."""
+    return [1.0 / (rank ** alpha) for rank in range(1, n + 1)]
+
+
+def silent_wav(seconds, rate=8000):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(1)
+        w.setframerate(rate)
+        w.writeframes(b"\x80" * int(seconds * rate))
+    return buf.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        f"Seed a synthetic dataset ({PREFIX}* users, artists with songs, power-law follow and "
+        f"like graphs, dummy audio files) for benchmarks. Seed users log in with '{PASSWORD}'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--artist-ratio", type=float, default=0.1)
+        parser.add_argument("--songs-per-artist", type=float, default=5.0, help="Mean; actual counts are Pareto-distributed.")
+        parser.add_argument("--follows-per-user", type=float, default=15.0, help="Mean follows per user.")
+        parser.add_argument("--likes-per-user", type=float, default=25.0, help="Mean likes per user.")
+        parser.add_argument("--alpha", type=float, default=1.1, help="Zipf exponent of artist/song popularity.")
+        parser.add_argument("--audio-seconds", type=float, default=2.0, help="Length of each dummy WAV.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--clear", action="store_true", help=f"Delete existing {PREFIX}* users and their files first.")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        started = time.perf_counter()
+        if opts["clear"]:
+            self.clear()
+        elif User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f"{PREFIX}* users already exist; pass --clear to replace them.")
+
+        n_users = opts["users"]
+        n_artists = max(1, int(n_users * opts["artist_ratio"]))
+        password = make_password(PASSWORD)
+        now = timezone.now()
+
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(
+                    username=f"{PREFIX}{'artist' if i < n_artists else 'user'}{i}",
+                    username_lower=f"{PREFIX}{'artist' if i < n_artists else 'user'}{i}",
+                    password=password,
+                    role=User.Roles.ARTIST if i < n_artists else User.Roles.LISTENER,
+                ) for i in range(n_users)
+            ], batch_size=2000)
+            users = list(User.objects.filter(username__startswith=PREFIX).order_by("pk").values_list("pk", flat=True))
+            artists = users[:n_artists]
+
+            # Pareto song counts: most artists have a few songs, some have many
+            audio = silent_wav(opts["audio_seconds"])
+            songs = []
+            for artist_id in artists:
+                count = max(1, int(rng.paretovariate(2.0) * opts["songs_per_artist"] / 2))
+                folder = os.path.join(settings.MEDIA_ROOT, "audio", str(artist_id))
+                os.makedirs(folder, exist_ok=True)
+                for j in range(count):
+                    name = f"audio/{artist_id}/seed_{j}.wav"
+                    with open(os.path.join(settings.MEDIA_ROOT, name), "wb") as f:
+                        f.write(audio)
+                    songs.append(Song(
+                        owner_id=artist_id,
+                        title=" ".join(rng.sample(WORDS, rng.randint(1, 3))).title(),
+                        genre=rng.choice(GENRES),
+                        audio=name,
+                        is_public=rng.random() < 0.9,
+                        duration_seconds=int(opts["audio_seconds"]),
+                        processing_status=Song.ProcessingStatus.READY,
+                    ))
+            Song.objects.bulk_create(songs, batch_size=2000)
+            # auto_now_add overrode created_at on insert; spread uploads over the last year
+            for song in songs:
+                song.created_at = song.updated_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            Song.objects.bulk_update(songs, ["created_at", "updated_at"], batch_size=1000)
+            song_ids = list(Song.objects.filter(owner_id__in=artists, is_public=True).values_list("pk", flat=True))
+            rng.shuffle(artists)
+            rng.shuffle(song_ids)
+
+            follows = self.graph(rng, users, artists, opts["follows_per_user"], opts["alpha"])
+            User.following.through.objects.bulk_create(
+                [User.following.through(from_user_id=u, to_user_id=a) for u, a in follows],
+                batch_size=5000, ignore_conflicts=True,
+            )
+            likes = self.graph(rng, users, song_ids, opts["likes_per_user"], opts["alpha"])
+            Song.likes.through.objects.bulk_create(
+                [Song.likes.through(user_id=u, song_id=s) for u, s in likes],
+                batch_size=5000, ignore_conflicts=True,
+            )
+
+        # bulk inserts skip signals: rebuild everything derived
+        counters.reconcile_all()
+        search.rebuild()
+        feed.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {n_users} users ({n_artists} artists), {len(songs)} songs, "
+            f"{len(follows)} follows, {len(likes)} likes in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def graph(self, rng, users, targets, mean, alpha):
+        """Edges user -> target: per-user degree is exponential, targets are picked by Zipf popularity."""
+        if not targets:
+            return set()
+        weights = zipf_weights(len(targets), alpha)
+        edges = set()
+        for user_id in users:
+            k = min(len(targets), int(rng.expovariate(1 / mean)))
+            for target in rng.choices(targets, weights=weights, k=k):
+                if target != user_id:  # artists don't follow themselves
+                    edges.add((user_id, target))
+        return edges
+
+    def clear(self):
+        seeded = User.objects.filter(username__startswith=PREFIX)
+        for user_id in seeded.values_list("pk", flat=True):
+            shutil.rmtree(os.path.join(settings.MEDIA_ROOT, "audio", str(user_id)), ignore_errors=True)
+        n, _ = seeded.delete()
+        self.stdout.write(f"Removed {n} seeded row(s).")
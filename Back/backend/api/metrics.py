@@ -0,0 +1,207 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware times every request, and its SQL through a
+connection execute_wrapper. Serializers using TimedSerializerMixin add
+their time to the same record. Responses to staff users get a
+Server-Timing header (db, serialize, app, total); PERF_SERVER_TIMING sends
+it to everyone, which exposes query counts and timings to any visitor.
+Requests slower than PERF_SLOW_REQUEST_MS are logged to "api.metrics"
+with their slowest queries.
+
+Latency, query and serializer figures are aggregated per view into
+in-process histograms, rendered in Prometheus text format at /metrics.
+Each worker process reports its own numbers.
+
+With PERF_INSTRUMENTATION = False the middleware removes itself at startup
+(MiddlewareNotUsed), and the serializer hook costs one ContextVar lookup.
+"""
+import bisect
+import contextvars
+import heapq
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("perf_record", default=None)
+
+# latency histogram bounds, seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+TOP_QUERIES = 5
+
+
+class RequestRecord:
+    __slots__ = ("queries", "db_seconds", "serializer_seconds", "serializing", "slowest")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+        self.slowest = []  # min-heap of (seconds, sql), TOP_QUERIES long
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            item = (elapsed, sql)
+            if len(self.slowest) < TOP_QUERIES:
+                heapq.heappush(self.slowest, item)
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, item)
+
+
+class TimedSerializerMixin:
+    """Adds the serializer's to_representation time to the current request record."""
+
+    def to_representation(self, instance):
+        record = _current.get()
+        if record is None or record.serializing:  # disabled, or nested inside a timed call
+            return super().to_representation(instance)
+        record.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            record.serializer_seconds += time.perf_counter() - started
+            record.serializing = False
+
+
+class Registry:
+    """Per-view histograms and counters, aggregated in process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, method, status, seconds, record):
+        key = (view, method)
+        with self._lock:
+            stats = self._views.get(key)
+            if stats is None:
+                stats = self._views[key] = {
+                    "buckets": [0] * (len(BUCKETS) + 1),
+                    "count": 0,
+                    "seconds": 0.0,
+                    "db_seconds": 0.0,
+                    "queries": 0,
+                    "serializer_seconds": 0.0,
+                    "status": {},
+                }
+            stats["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["db_seconds"] += record.db_seconds
+            stats["queries"] += record.queries
+            stats["serializer_seconds"] += record.serializer_seconds
+            code = f"{status // 100}xx"
+            stats["status"][code] = stats["status"].get(code, 0) + 1
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self._lock:
+            views = {key: {**s, "buckets": list(s["buckets"]), "status": dict(s["status"])} for key, s in self._views.items()}
+        lines = [
+            "# HELP lime_request_duration_seconds Request latency by view.",
+            "# TYPE lime_request_duration_seconds histogram",
+        ]
+        for (view, method), s in sorted(views.items()):
+            labels = f'view="{view}",method="{method}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, s["buckets"]):
+                cumulative += n
+                lines.append(f'lime_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'lime_request_duration_seconds_bucket{{{labels},le="+Inf"}} {s["count"]}')
+            lines.append(f"lime_request_duration_seconds_sum{{{labels}}} {s['seconds']:.6f}")
+            lines.append(f"lime_request_duration_seconds_count{{{labels}}} {s['count']}")
+        for name, field, kind, help_text in (
+            ("lime_db_queries_total", "queries", "counter", "SQL queries run by requests."),
+            ("lime_db_seconds_total", "db_seconds", "counter", "Time spent in SQL."),
+            ("lime_serializer_seconds_total", "serializer_seconds", "counter", "Time spent serializing."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for (view, method), s in sorted(views.items()):
+                value = s[field]
+                value = f"{value:.6f}" if isinstance(value, float) else value
+                lines.append(f'{name}{{view="{view}",method="{method}"}} {value}')
+        lines += ["# HELP lime_requests_total Requests by status class.", "# TYPE lime_requests_total counter"]
+        for (view, method), s in sorted(views.items()):
+            for code, n in sorted(s["status"].items()):
+                lines.append(f'lime_requests_total{{view="{view}",method="{method}",status="{code}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _view_label(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "unmatched"
+
+
+def _is_staff(request):
+    # DRF views copy the token's user onto the Django request once they authenticate it
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        if not settings.PERF_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        record = RequestRecord()
+        token = _current.set(record)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(record))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        view = _view_label(request)
+        registry.observe(view, request.method, response.status_code, total, record)
+        if settings.PERF_SERVER_TIMING or _is_staff(request):
+            app = max(total - record.db_seconds - record.serializer_seconds, 0.0)
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={record.db_seconds * 1000:.1f};desc="{record.queries} queries"',
+                f"serialize;dur={record.serializer_seconds * 1000:.1f}",
+                f"app;dur={app * 1000:.1f}",
+                f"total;dur={total * 1000:.1f}",
+            ])
+
+        if total * 1000 >= settings.PERF_SLOW_REQUEST_MS:
+            slowest = sorted(record.slowest, reverse=True)
+            logger.warning(
+                "Slow request %s %s (%s) %.0fms: %d queries in %.0fms, serializer %.0fms\n%s",
+                request.method, request.get_full_path(), view, total * 1000,
+                record.queries, record.db_seconds * 1000, record.serializer_seconds * 1000,
+                "\n".join(f"  {seconds * 1000:8.1f}ms  {sql[:500]}" for seconds, sql in slowest),
+            )
+        return response
+
+
+def metrics_view(request):
+    """GET /metrics for Prometheus; restricted to METRICS_ALLOWED_IPS (and staff)."""
+    allowed = request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+    if not allowed and not (request.user.is_authenticated and request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_likes_count(apps, schema_editor):
+    Song = apps.get_model("api", "Song")
+    Like = Song.likes.through
+    counts = (
+        Like.objects.filter(song_id=OuterRef("pk"))
+        .values("song_id")
+        .annotate(c=Count("pk"))
+        .values("c")
+    )
+    Song.objects.update(likes_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_song_genre'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_likes_count, migrations.RunPython.noop),
+    ]
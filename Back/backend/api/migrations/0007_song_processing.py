@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:19
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # songs uploaded before the queue existed were processed inline
+    Song = apps.get_model("api", "Song")
+    Song.objects.update(processing_status="ready")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_song_likes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='processing_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='processing_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='processing_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_song_processing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='waveform_peaks',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    "CREATE VIRTUAL TABLE api_song_fts USING fts5("
+                    "title, genre, owner, description, "
+                    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                )
+            except Exception:
+                return  # SQLite built without FTS5: api.search falls back to LIKE
+            cursor.execute(
+                "INSERT INTO api_song_fts (rowid, title, genre, owner, description) "
+                "SELECT s.id, s.title, s.genre, u.username, s.description "
+                "FROM api_song s JOIN api_user u ON u.id = s.owner_id"
+            )
+    elif connection.vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE api_song ADD COLUMN search_vector tsvector")
+        schema_editor.execute("CREATE INDEX api_song_search_vector_gin ON api_song USING GIN (search_vector)")
+        schema_editor.execute(
+            "UPDATE api_song s SET search_vector = "
+            "setweight(to_tsvector('simple', coalesce(s.title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(s.genre, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(u.username, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(s.description, '')), 'C') "
+            "FROM api_user u WHERE u.id = s.owner_id"
+        )
+
+
+def drop_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS api_song_fts")
+    elif connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS api_song_search_vector_gin")
+        schema_editor.execute("ALTER TABLE api_song DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_song_waveform_peaks'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:27
+
+from django.db import migrations, models
+
+
+def backfill_username_lower(apps, schema_editor):
+    # str.lower() in Python, so non-ASCII names match what User.save() stores
+    User = apps.get_model("api", "User")
+    batch = []
+    for user in User.objects.only("pk", "username").iterator(chunk_size=2000):
+        user.username_lower = user.username.lower()
+        batch.append(user)
+        if len(batch) >= 2000:
+            User.objects.bulk_update(batch, ["username_lower"])
+            batch = []
+    User.objects.bulk_update(batch, ["username_lower"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_song_search_index'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='username_lower',
+            field=models.CharField(default='', editable=False, max_length=150),
+        ),
+        migrations.RunPython(backfill_username_lower, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['username_lower'], name='user_username_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'username_lower'], name='user_role_username_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_follow_counts(apps, schema_editor):
+    # also repairs follower_count drift from the old per-user signal
+    User = apps.get_model("api", "User")
+    Follow = User.following.through
+
+    def count_of(column):
+        return Coalesce(Subquery(
+            Follow.objects.filter(**{column: OuterRef("pk")}).values(column).annotate(c=Count("pk")).values("c")
+        ), 0)
+
+    User.objects.update(follower_count=count_of("to_user_id"), following_count=count_of("from_user_id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_user_username_lower'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_follow_counts, migrations.RunPython.noop),
+    ]
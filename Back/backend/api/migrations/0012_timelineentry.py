@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    # existing follows: each follower gets the artist's latest songs, as api.feed.on_follow would
+    User = apps.get_model("api", "User")
+    Song = apps.get_model("api", "Song")
+    TimelineEntry = apps.get_model("api", "TimelineEntry")
+    Follow = User.following.through
+    limit = getattr(settings, "FEED_BACKFILL_SONGS", 50)
+    by_artist = {}
+    for follower_id, artist_id in Follow.objects.values_list("from_user_id", "to_user_id").iterator():
+        by_artist.setdefault(artist_id, []).append(follower_id)
+    for artist_id, follower_ids in by_artist.items():
+        songs = list(
+            Song.objects.filter(owner_id=artist_id, is_public=True)
+            .order_by("-created_at").values_list("pk", "created_at")[:limit]
+        )
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=u, song_id=pk, created_at=created_at) for u in follower_ids for pk, created_at in songs],
+            ignore_conflicts=True, batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_user_following_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='api.song')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', 'song'], name='timeline_user_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'song'), name='timeline_unique_user_song')],
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
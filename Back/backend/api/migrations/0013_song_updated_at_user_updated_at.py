@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    # existing rows: last known change is their creation
+    apps.get_model("api", "Song").objects.update(updated_at=F("created_at"))
+    apps.get_model("api", "User").objects.update(updated_at=F("date_joined"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:42
+
+import django.core.validators
+from django.db import migrations, models
+
+
+# the auto-created likes table only has (song_id, user_id); this serves "songs liked by user"
+LIKES_REVERSE_INDEX = "api_song_likes_user_song_idx"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_song_updated_at_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='song',
+            name='genre',
+            field=models.CharField(blank=True, help_text='Single tag without spaces, e.g. house or #house', max_length=30, validators=[django.core.validators.RegexValidator('^\\S*$', 'Genre cannot contain spaces.')]),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-created_at'], name='song_public_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['owner', '-created_at'], name='song_owner_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['genre', '-created_at'], name='song_genre_recent_idx'),
+        ),
+        migrations.RunSQL(
+            f"CREATE INDEX {LIKES_REVERSE_INDEX} ON api_song_likes (user_id, song_id)",
+            f"DROP INDEX {LIKES_REVERSE_INDEX}",
+        ),
+    ]
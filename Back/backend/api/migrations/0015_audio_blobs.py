@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:50
+
+import api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_song_recent_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(max_length=200, upload_to=api.models.blob_upload_to)),
+                ('format', models.CharField(max_length=10)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('duration_seconds', models.PositiveIntegerField(blank=True, null=True)),
+                ('waveform_data', models.JSONField(blank=True, null=True)),
+                ('waveform_peaks', models.BinaryField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='song',
+            name='audio',
+            field=models.FileField(db_index=True, max_length=200, upload_to=api.models.audio_upload_to),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='songs', to='api.audioblob'),
+        ),
+    ]
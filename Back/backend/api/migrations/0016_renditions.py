@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_audio_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audioblob',
+            name='renditions',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='renditions',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SongTrend',
+            fields=[
+                ('song', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='api.song')),
+                ('score', models.FloatField(default=0)),
+                ('plays_seen', models.PositiveIntegerField(default=0)),
+                ('likes_seen', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChartEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chart', models.CharField(blank=True, max_length=30)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('built_at', models.DateTimeField()),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chart_entries', to='api.song')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('chart', 'rank'), name='chart_entry_unique_rank')],
+            },
+        ),
+    ]
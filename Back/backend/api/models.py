@@ -1,3 +1,5 @@
+import os
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
@@ -13,9 +15,32 @@ class User(AbstractUser):
         choices=Roles.choices
     )
     profile_picture = models.ImageField(upload_to="profiles/", blank=True, null=True)
+    # resized WebP copies, {"<width>": name} (api.images)
+    profile_picture_variants = models.JSONField(blank=True, null=True, editable=False)
     following = models.ManyToManyField("self", symmetrical=False, related_name="followers", blank=True)
     follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # lowercased username for indexed prefix autocomplete (UserSearchView)
+    username_lower = models.CharField(max_length=150, editable=False, default="")
+    # profile version for ETags (api.conditional); counters are tracked separately
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta(AbstractUser.Meta):
+        swappable = "AUTH_USER_MODEL"
+        indexes = [
+            models.Index(fields=["username_lower"], name="user_username_prefix_idx"),
+            models.Index(fields=["role", "username_lower"], name="user_role_username_prefix_idx"),
+        ]
 
+    def save(self, *args, **kwargs):
+        self.username_lower = self.username.lower()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "username" in update_fields:
+            update_fields = kwargs["update_fields"] = {*update_fields, "username_lower"}
+        # a login only touches last_login, which no response shows
+        if update_fields is not None and set(update_fields) - {"last_login"}:
+            kwargs["update_fields"] = {*update_fields, "updated_at"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.username}"
@@ -28,7 +53,42 @@ def cover_upload_to(instance, filename):
     return f"covers/{instance.owner_id}/{filename}"
 
 
+def blob_upload_to(instance, filename):
+    # sharded by hash prefix so no directory grows past a few thousand entries
+    h = instance.sha256
+    return f"audio/blobs/{h[:2]}/{h[2:4]}/{h}{os.path.splitext(filename)[1]}"
+
+
+class AudioBlob(models.Model):
+    """
+    One stored audio file, addressed by the SHA-256 of its bytes (api.uploads).
+    Identical uploads share a blob; ref_count is the number of songs using it.
+    Analysis results are kept so a known upload skips decoding.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=blob_upload_to, max_length=200)
+    format = models.CharField(max_length=10)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+
+    duration_seconds = models.PositiveIntegerField(blank=True, null=True)
+    waveform_data = models.JSONField(blank=True, null=True)
+    waveform_peaks = models.BinaryField(blank=True, null=True)
+    renditions = models.JSONField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]}.{self.format} ({self.ref_count} song(s))"
+
+
 class Song(models.Model):
+    class ProcessingStatus(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROCESSING = "processing", "Processing"
+        READY = "ready", "Ready"
+        FAILED = "failed", "Failed"
+
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -36,14 +96,16 @@ class Song(models.Model):
     )
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    audio = models.FileField(upload_to=audio_upload_to)
+    audio = models.FileField(upload_to=audio_upload_to, max_length=200, db_index=True)  # serve_audio looks songs up by path
+    # new uploads point `audio` at a shared blob; null for pre-dedup files
+    blob = models.ForeignKey(AudioBlob, on_delete=models.PROTECT, related_name="songs", blank=True, null=True)
     cover = models.ImageField(upload_to=cover_upload_to, blank=True, null=True)
+    cover_variants = models.JSONField(blank=True, null=True, editable=False)
     is_public = models.BooleanField(default=True)
 
     genre = models.CharField(
         max_length=30,
         blank=True,
-        db_index=True,
         validators=[RegexValidator(r"^\S*$", "Genre cannot contain spaces.")],
         help_text="Single tag without spaces, e.g. house or #house",
     )
@@ -51,12 +113,107 @@ class Song(models.Model):
     duration_seconds = models.PositiveIntegerField(blank=True, null=True)
     plays = models.PositiveIntegerField(default=0)
     likes = models.ManyToManyField(User, blank=True, related_name="liked_songs")
+    likes_count = models.PositiveIntegerField(default=0)
+    # small bar summary carried by list responses
     waveform_data = models.JSONField(blank=True, null=True)
+    # min/max pyramid (api.waveform.encode_pyramid), served by /api/songs/{id}/waveform/
+    waveform_peaks = models.BinaryField(blank=True, null=True)
+    # compressed streaming copies made by upload processing (api.transcode), each
+    # {"codec", "bitrate", "name", "mime", "size"}; null until transcoded
+    renditions = models.JSONField(blank=True, null=True)
+
+    # upload post-processing queue, drained by `manage.py process_uploads`
+    processing_status = models.CharField(
+        max_length=20,
+        choices=ProcessingStatus.choices,
+        default=ProcessingStatus.PENDING,
+        db_index=True,
+    )
+    processing_attempts = models.PositiveSmallIntegerField(default=0)
+    processing_error = models.TextField(blank=True)
+    processing_started_at = models.DateTimeField(blank=True, null=True)
+    processing_retry_at = models.DateTimeField(blank=True, null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped by every save and by the processing queue's UPDATEs; counters
+    # (plays, likes_count) are versioned separately, see api.conditional
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
+        # list shapes: WHERE <col> = ? ORDER BY created_at DESC, id (id is the
+        # implicit trailing rowid column on SQLite, so no sort step is needed)
+        indexes = [
+            # partial: Django emits `WHERE is_public` (no `= 1`), which only a partial index can serve
+            models.Index(fields=["-created_at"], condition=models.Q(is_public=True), name="song_public_recent_idx"),
+            models.Index(fields=["owner", "-created_at"], name="song_owner_recent_idx"),
+            models.Index(fields=["genre", "-created_at"], name="song_genre_recent_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "updated_at"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.title} by {self.owner}"
+
+
+class TimelineEntry(models.Model):
+    """
+    A song fanned out into a follower's feed on upload (api.feed).
+    Artists above FEED_FANOUT_MAX_FOLLOWERS are merged in at read time instead.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline")
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="timeline_entries")
+    # copy of song.created_at so the feed pages straight off the (user, created_at) index
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "song"], name="timeline_unique_user_song"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-created_at", "song"], name="timeline_user_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.song_id} in {self.user_id}'s feed"
+
+
+class SongTrend(models.Model):
+    """
+    Per-song state of the trending score (api.charts): an exponentially decayed
+    sum of plays and likes, plus the counters seen at the last build so the
+    next build only adds what happened since.
+    """
+    song = models.OneToOneField(Song, on_delete=models.CASCADE, primary_key=True, related_name="trend")
+    score = models.FloatField(default=0)
+    plays_seen = models.PositiveIntegerField(default=0)
+    likes_seen = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.song_id}: {self.score:.2f}"
+
+
+class ChartEntry(models.Model):
+    """
+    One row of a materialized chart: the top CHARTS_SIZE public songs by trend
+    score, globally (chart "") and per genre. Replaced wholesale by api.charts.build().
+    """
+    chart = models.CharField(max_length=30, blank=True)
+    rank = models.PositiveSmallIntegerField()
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="chart_entries")
+    score = models.FloatField()
+    built_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # also the read path: WHERE chart = ? ORDER BY rank
+            models.UniqueConstraint(fields=["chart", "rank"], name="chart_entry_unique_rank"),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} in {self.chart or 'all'}: {self.song_id}"
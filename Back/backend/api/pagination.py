@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class SongCursorPagination(CursorPagination):
+    """
+    Keyset pagination for /api/songs/.
+
+    Pages are addressed by an opaque cursor built from the last row's
+    (created_at, id), so deep pages never OFFSET-scan the table and stay
+    stable while new songs are uploaded.
+
+    ?page_size=N overrides the default, capped at SONG_MAX_PAGE_SIZE.
+    Full-text searches (api.search) page by relevance instead.
+    """
+    ordering = ("-created_at", "id")
+    page_size = getattr(settings, "SONG_PAGE_SIZE", 20)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "SONG_MAX_PAGE_SIZE", 100)
+
+    def get_ordering(self, request, queryset, view):
+        if "search_rank" in queryset.query.annotations:
+            return ("search_rank", "id")
+        return super().get_ordering(request, queryset, view)
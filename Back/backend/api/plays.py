@@ -0,0 +1,139 @@
+"""
+Buffered play counting.
+
+POST /api/songs/{id}/play/ only touches the cache (dedup) and an
+in-process counter. The counter is written to Song.plays in bulk
+`plays = plays + n` UPDATEs, one per distinct n, when PLAY_FLUSH_BATCH_SIZE
+events have piled up or every PLAY_FLUSH_INTERVAL_SECONDS from a
+background thread, so SQLite's write lock is taken once per flush instead
+of once per play.
+
+Each worker process has its own buffer. Deduplication goes through the
+cache, so use a shared backend when running more than one process.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Song
+
+logger = logging.getLogger(__name__)
+
+
+def client_address(request):
+    """
+    REMOTE_ADDR, or with PLAY_TRUSTED_PROXIES reverse proxies in front, the
+    address the outermost of them saw. Entries further left in
+    X-Forwarded-For come from the client and are ignored.
+    """
+    proxies = settings.PLAY_TRUSTED_PROXIES
+    if proxies:
+        hops = [h.strip() for h in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if h.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def listener_key(request):
+    """Who is listening: the user if logged in, else the client address."""
+    if request.user.is_authenticated:
+        return f"u{request.user.pk}"
+    return "a" + client_address(request)
+
+
+class PlayBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._buffered = 0
+        self._flusher = None
+        self.stats = {
+            "accepted": 0,
+            "deduplicated": 0,
+            "flushes": 0,
+            "rows_updated": 0,
+            "last_flush_ms": None,
+            "last_flush_plays": 0,
+        }
+
+    def record(self, song_id, listener):
+        """Count a play unless this listener played the song within the dedup window."""
+        window = settings.PLAY_DEDUP_WINDOW_SECONDS
+        if window and not cache.add(f"play:{song_id}:{listener}", 1, timeout=window):
+            with self._lock:
+                self.stats["deduplicated"] += 1
+            return False
+
+        with self._lock:
+            self._pending[song_id] += 1
+            self._buffered += 1
+            self.stats["accepted"] += 1
+            full = self._buffered >= settings.PLAY_FLUSH_BATCH_SIZE
+            self._ensure_flusher()
+        if full:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Write buffered plays; on failure they go back into the buffer."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._buffered = 0
+        if not pending:
+            return 0
+
+        started = time.perf_counter()
+        by_increment = defaultdict(list)
+        for song_id, n in pending.items():
+            by_increment[n].append(song_id)
+        try:
+            with transaction.atomic():
+                rows = sum(
+                    Song.objects.filter(pk__in=ids).update(plays=F("plays") + n)
+                    for n, ids in by_increment.items()
+                )
+        except Exception:
+            logger.exception("Flushing %s buffered plays failed; keeping them", sum(pending.values()))
+            with self._lock:
+                self._pending.update(pending)
+                self._buffered += sum(pending.values())
+            return 0
+
+        with self._lock:
+            self.stats["flushes"] += 1
+            self.stats["rows_updated"] += rows
+            self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self.stats["last_flush_plays"] = sum(pending.values())
+        return rows
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "buffered": self._buffered,
+                "flush_interval_seconds": settings.PLAY_FLUSH_INTERVAL_SECONDS,
+                "flush_batch_size": settings.PLAY_FLUSH_BATCH_SIZE,
+                "dedup_window_seconds": settings.PLAY_DEDUP_WINDOW_SECONDS,
+            }
+
+    def _ensure_flusher(self):
+        # called with the lock held
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run, name="play-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.PLAY_FLUSH_INTERVAL_SECONDS)
+            self.flush()
+
+
+buffer = PlayBuffer()
+atexit.register(buffer.flush)
@@ -0,0 +1,214 @@
+"""
+DB-backed queue for upload post-processing.
+
+SongViewSet.create stores the file and returns 202 with
+processing_status="pending". `manage.py process_uploads` claims pending
+songs, decodes them in a bounded process pool (api.audio.analyze) and
+writes the results back, retrying failures with a linear backoff.
+The same job encodes the streaming renditions (AUDIO_RENDITIONS,
+api.transcode).
+"""
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import audio, response_cache, transcode, uploads
+from .models import AudioBlob, Song
+
+logger = logging.getLogger(__name__)
+
+Status = Song.ProcessingStatus
+
+
+def _setting(name, default):
+    return getattr(settings, f"SONG_PROCESSING_{name}", default)
+
+
+def requeue_stale():
+    """Put back songs whose worker died mid-job (claimed longer than the lease ago)."""
+    cutoff = timezone.now() - timedelta(seconds=_setting("LEASE_SECONDS", 600))
+    return Song.objects.filter(
+        processing_status=Status.PROCESSING, processing_started_at__lt=cutoff
+    ).update(processing_status=Status.PENDING, processing_retry_at=None, updated_at=timezone.now())
+
+
+def queue_missing_renditions():
+    """Send processed songs without renditions (uploaded before transcoding existed) back through the queue."""
+    return Song.objects.filter(processing_status=Status.READY, renditions__isnull=True).update(
+        processing_status=Status.PENDING, processing_attempts=0, processing_retry_at=None,
+        updated_at=timezone.now(),
+    )
+
+
+def claim_next():
+    """
+    Atomically move one due song from pending to processing and return it.
+    The conditional UPDATE makes concurrent workers safe without row locks.
+    """
+    now = timezone.now()
+    due = (
+        Song.objects.filter(processing_status=Status.PENDING)
+        .filter(Q(processing_retry_at__isnull=True) | Q(processing_retry_at__lte=now))
+        .order_by("created_at")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in due:
+        claimed = Song.objects.filter(pk=pk, processing_status=Status.PENDING).update(
+            processing_status=Status.PROCESSING,
+            processing_attempts=F("processing_attempts") + 1,
+            processing_started_at=now,
+            updated_at=now,
+        )
+        if claimed:
+            return Song.objects.select_related("blob").get(pk=pk)
+    return None
+
+
+def mark_ready(song_id, result, blob_id=None):
+    if blob_id is not None:
+        # remember the analysis on the blob; later uploads of the same bytes skip the queue
+        AudioBlob.objects.filter(pk=blob_id).update(**result)
+    Song.objects.filter(pk=song_id).update(
+        processing_status=Status.READY,
+        processing_error="",
+        processing_retry_at=None,
+        updated_at=timezone.now(),
+        **result,
+    )
+    response_cache.invalidate_songs([song_id])
+
+
+def submit(pool, song):
+    """Start the decode + transcode job for a claimed song."""
+    rendition_dir = transcode.rendition_dir(song.audio.name)
+    return pool.submit(
+        audio.process, song.audio.path,
+        os.path.join(settings.MEDIA_ROOT, rendition_dir),
+        [tuple(r) for r in settings.AUDIO_RENDITIONS],
+        settings.AUDIO_HLS,
+    )
+
+
+def _rendition_names(song_audio, result):
+    # worker returns file names relative to the rendition directory
+    prefix = transcode.rendition_dir(song_audio)
+    for rendition in result.get("renditions") or []:
+        rendition["name"] = f"{prefix}/{rendition.pop('file')}"
+    return result
+
+
+def release_claim(song_id):
+    """Undo claim_next() for a song whose job never started."""
+    Song.objects.filter(pk=song_id, processing_status=Status.PROCESSING).update(
+        processing_status=Status.PENDING,
+        processing_attempts=F("processing_attempts") - 1,
+        processing_started_at=None,
+        updated_at=timezone.now(),
+    )
+
+
+def mark_failed(song_id, exc):
+    """Schedule a retry, or give up once SONG_PROCESSING_MAX_ATTEMPTS is reached."""
+    song = Song.objects.filter(pk=song_id).only("processing_attempts").first()
+    if song is None:  # deleted while processing
+        return
+    error = f"{type(exc).__name__}: {exc}"[:2000]
+    if song.processing_attempts >= _setting("MAX_ATTEMPTS", 3):
+        logger.warning("Song %s failed processing permanently: %s", song_id, error)
+        Song.objects.filter(pk=song_id).update(
+            processing_status=Status.FAILED, processing_error=error, processing_retry_at=None,
+            updated_at=timezone.now(),
+        )
+        response_cache.invalidate_songs([song_id])
+        return
+    delay = _setting("RETRY_DELAY_SECONDS", 30) * song.processing_attempts
+    logger.info("Song %s processing failed (attempt %s), retrying in %ss: %s",
+                song_id, song.processing_attempts, delay, error)
+    Song.objects.filter(pk=song_id).update(
+        processing_status=Status.PENDING,
+        processing_error=error,
+        processing_retry_at=timezone.now() + timedelta(seconds=delay),
+        updated_at=timezone.now(),
+    )
+
+
+def run_worker(concurrency=None, poll_interval=2.0, once=False):
+    """
+    Drain the queue with at most `concurrency` decodes in flight.
+    With once=True, return as soon as nothing is due instead of polling forever.
+    Returns the number of songs handled.
+
+    A child that dies (segfault, OOM kill) breaks the whole pool: every job
+    in flight fails with BrokenProcessPool and counts as a failed attempt
+    (retried, so a song that keeps crashing ends up failed), and the pool
+    is replaced.
+    """
+    concurrency = concurrency or _setting("CONCURRENCY", 2)
+    handled = 0
+    requeue_stale()
+
+    pool = ProcessPoolExecutor(max_workers=concurrency)
+    inflight = {}
+    try:
+        while True:
+            while len(inflight) < concurrency:
+                song = claim_next()
+                if song is None:
+                    break
+                known = uploads.known_analysis(song.blob)
+                if known is not None:  # same bytes already analysed for another song
+                    mark_ready(song.pk, known)
+                    handled += 1
+                    continue
+                try:
+                    future = submit(pool, song)
+                except BrokenProcessPool:
+                    # broke since the last wait(); this song never ran, the ones in flight are collected below
+                    release_claim(song.pk)
+                    pool = _replace_pool(pool, concurrency)
+                    continue
+                inflight[future] = (song.pk, song.blob_id, song.audio.name, pool)
+
+            if not inflight:
+                if once:
+                    return handled
+                close_old_connections()
+                time.sleep(poll_interval)
+                requeue_stale()
+                continue
+
+            done, _ = wait(inflight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                song_id, blob_id, audio_name, owner = inflight.pop(future)
+                handled += 1
+                try:
+                    result = future.result()
+                except BrokenProcessPool as exc:
+                    broken = broken or owner is pool  # not a pool that was replaced already
+                    mark_failed(song_id, exc)
+                except Exception as exc:
+                    mark_failed(song_id, exc)
+                else:
+                    errors = result.pop("transcode_errors", None)
+                    if errors:
+                        logger.warning("Song %s: some renditions failed: %s", song_id, "; ".join(errors))
+                    mark_ready(song_id, _rendition_names(audio_name, result), blob_id)
+            if broken:
+                pool = _replace_pool(pool, concurrency)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _replace_pool(pool, concurrency):
+    logger.warning("A processing worker died; starting a new pool")
+    pool.shutdown(wait=False, cancel_futures=True)
+    return ProcessPoolExecutor(max_workers=concurrency)
@@ -0,0 +1,122 @@
+"""
+Response cache for anonymous song reads.
+
+Anonymous GET /api/songs/ and /api/songs/{id}/ are the same for every
+visitor, so SongViewSet keeps their serialized data in Django's cache for
+SONG_CACHE_TIMEOUT seconds. The key covers the host and full query string
+(cursor, page_size, search), so every page is its own entry.
+
+Keys embed generation numbers instead of being deleted one by one (the
+cache API cannot enumerate keys): every song change bumps the list
+generation, which orphans every cached list page, plus that song's own
+generation for its detail entry. Orphaned entries just expire.
+The ETag is stored with the data, so a hit can still answer 304.
+
+Each process keeps its own hit/miss counters. The upload worker's status
+changes only reach the web processes through a shared cache backend
+(file, database, redis); with the default locmem cache they show up
+after the timeout.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified
+from rest_framework.response import Response
+
+from . import conditional
+
+LIST_GENERATION = "songcache:gen:list"
+
+
+def _song_generation(pk):
+    return f"songcache:gen:song:{pk}"
+
+
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0, "bypassed": 0, "invalidations": 0}
+
+
+def _count(name, n=1):
+    with _lock:
+        stats[name] += n
+
+
+def snapshot():
+    with _lock:
+        total = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_ratio": round(stats["hits"] / total, 3) if total else None,
+            "timeout_seconds": settings.SONG_CACHE_TIMEOUT,
+            "backend": settings.CACHES["default"]["BACKEND"],
+        }
+
+
+def cacheable(request):
+    return (
+        settings.SONG_CACHE_TIMEOUT > 0
+        and request.method == "GET"
+        and not request.user.is_authenticated
+    )
+
+
+def _key(request, generations):
+    digest = hashlib.sha1(
+        f"{request.get_host()}|{request.get_full_path()}|{request.accepted_renderer.format}".encode()
+    ).hexdigest()
+    return f"songcache:{'.'.join(str(g) for g in generations)}:{digest}"
+
+
+def _generations(keys):
+    found = cache.get_many(keys)
+    return [found.get(k, 0) for k in keys]
+
+
+def fetch(request, produce, song_pk=None):
+    """
+    Return produce() (a DRF Response) or a rebuilt copy of a cached one.
+    Only anonymous GETs are cached; `song_pk` marks a detail response.
+    """
+    if not cacheable(request):
+        _count("bypassed")
+        return produce()
+
+    gen_keys = [LIST_GENERATION] if song_pk is None else [_song_generation(song_pk)]
+    key = _key(request, _generations(gen_keys))
+    cached = cache.get(key)
+    if cached is not None:
+        _count("hits")
+        data, status, etag = cached
+        if etag and conditional.matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = Response(data, status=status)
+        if etag:
+            conditional.tag(request, response, etag)
+        response["X-Cache"] = "HIT"
+        return response
+
+    _count("misses")
+    response = produce()
+    if response.status_code == 200:
+        cache.set(key, (response.data, response.status_code, response.get("ETag")), settings.SONG_CACHE_TIMEOUT)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:  # not set yet, or evicted: start from a value no old entry can carry
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate_songs(song_ids=()):
+    """Drop cached list pages and the detail entries of `song_ids`."""
+    _bump(LIST_GENERATION)
+    for pk in song_ids:
+        _bump(_song_generation(pk))
+    _count("invalidations")
@@ -0,0 +1,168 @@
+"""
+Full-text song search.
+
+SQLite: an FTS5 table (api_song_fts, rowid = song id).
+Postgres: a tsvector column on api_song with a GIN index.
+Both are created by migration 0009 and kept in sync by the signals in
+api.signals. Other databases, or SQLite builds without FTS5, fall back
+to the old icontains search.
+
+Query syntax: plain words are prefix-matched ("deep hou" finds "Deep
+House"), and #tag restricts to that genre.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Song, User
+
+FTS_TABLE = "api_song_fts"
+# bm25 column weights: title, genre, owner, description
+FTS_WEIGHTS = (10.0, 5.0, 5.0, 1.0)
+
+_TOKEN_RE = re.compile(r"#?\w+")
+
+_available = {}
+
+
+def backend(using="default"):
+    """'fts5', 'postgres' or None when only the LIKE fallback is usable."""
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor == "postgresql":
+            _available[using] = "postgres"
+        elif connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names():
+            _available[using] = "fts5"
+        else:
+            _available[using] = None
+    return _available[using]
+
+
+def parse_query(q):
+    """'Deep hou #House' -> (['deep', 'hou'], ['house'])"""
+    tokens = _TOKEN_RE.findall(q.lower())
+    genres = [t[1:] for t in tokens if t.startswith("#")]
+    terms = [t for t in tokens if not t.startswith("#")]
+    return terms, genres
+
+
+def search_songs(qs, q, using="default"):
+    """
+    Filter `qs` to songs matching `q`. When there are words to match, each
+    row gets a `search_rank` annotation (lower = more relevant) that
+    SongCursorPagination orders by.
+    """
+    terms, genres = parse_query(q)
+    if genres:
+        qs = qs.filter(genre__in=genres)
+    if not terms:
+        return qs
+
+    table = Song._meta.db_table
+    kind = backend(using)
+    if kind == "fts5":
+        # exact token OR prefix: whole-word hits score twice and rank first
+        match = " AND ".join(f'("{t}" OR "{t}"*)' for t in terms)
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        return qs.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(search_rank=RawSQL(
+            f"SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+            [match], output_field=FloatField(),
+        ))
+    if kind == "postgres":
+        tsquery = " & ".join(f"{t}:*" for t in terms)
+        return qs.alias(search_hit=RawSQL(
+            f"{table}.search_vector @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField(),
+        )).filter(search_hit=True).annotate(search_rank=RawSQL(
+            f"-ts_rank_cd({table}.search_vector, to_tsquery('simple', %s))", [tsquery], output_field=FloatField(),
+        ))
+
+    for t in terms:
+        qs = qs.filter(
+            Q(title__icontains=t) | Q(genre__icontains=t)
+            | Q(owner__username__icontains=t) | Q(description__icontains=t)
+        )
+    return qs
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """?search= for SongViewSet, backed by the full-text index."""
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        q = (request.query_params.get(self.search_param) or "").strip()
+        if not q:
+            return queryset
+        return search_songs(queryset, q, using=queryset.db)
+
+
+# --- index maintenance -------------------------------------------------------
+
+_PG_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(s.title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(s.genre, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(u.username, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(s.description, '')), 'C')"
+)
+
+
+def index_songs(song_ids, using="default"):
+    """(Re)index the given songs from their current rows."""
+    kind = backend(using)
+    if not kind or not song_ids:
+        return
+    song_ids = list(song_ids)
+    marks = ", ".join(["%s"] * len(song_ids))
+    songs, users = Song._meta.db_table, User._meta.db_table
+    with connections[using].cursor() as cursor:
+        if kind == "fts5":
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})", song_ids)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, genre, owner, description) "
+                f"SELECT s.id, s.title, s.genre, u.username, s.description "
+                f"FROM {songs} s JOIN {users} u ON u.id = s.owner_id WHERE s.id IN ({marks})",
+                song_ids,
+            )
+        else:
+            cursor.execute(
+                f"UPDATE {songs} s SET search_vector = {_PG_VECTOR} "
+                f"FROM {users} u WHERE u.id = s.owner_id AND s.id IN ({marks})",
+                song_ids,
+            )
+
+
+def unindex_song(song_id, using="default"):
+    # postgres rows carry their own vector and disappear with the song
+    if backend(using) == "fts5":
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [song_id])
+
+
+def index_owner(user_id, using="default"):
+    """Owner renamed: refresh every song of theirs."""
+    index_songs(Song.objects.using(using).filter(owner_id=user_id).values_list("id", flat=True), using)
+
+
+def rebuild(using="default"):
+    """Rebuild the whole index in one statement; returns the number of indexed songs."""
+    kind = backend(using)
+    if not kind:
+        return 0
+    songs, users = Song._meta.db_table, User._meta.db_table
+    with connections[using].cursor() as cursor:
+        if kind == "fts5":
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, genre, owner, description) "
+                f"SELECT s.id, s.title, s.genre, u.username, s.description "
+                f"FROM {songs} s JOIN {users} u ON u.id = s.owner_id"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        else:
+            cursor.execute(f"UPDATE {songs} s SET search_vector = {_PG_VECTOR} FROM {users} u WHERE u.id = s.owner_id")
+    return Song.objects.using(using).count()
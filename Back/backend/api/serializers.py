@@ -1,8 +1,13 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
 from .models import Song
-import os
+from . import images, uploads
+from .utils import sign_audio_url
+from .metrics import TimedSerializerMixin
 
 User = get_user_model()
 
@@ -36,19 +41,21 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
     
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ("id", "username", "email", "role")
 
 
-class PublicUserSerializer(serializers.ModelSerializer):
+class PublicUserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     profile_picture = serializers.SerializerMethodField()
+    profile_picture_srcset = serializers.SerializerMethodField()
     is_following = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ("id", "username", "role", "profile_picture", "follower_count", "is_following")
+        fields = ("id", "username", "role", "profile_picture", "profile_picture_srcset",
+                  "follower_count", "following_count", "is_following")
 
     def get_profile_picture(self, obj):
         # return absolute URL or None
@@ -58,10 +65,20 @@ class PublicUserSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(url) if request else url
         return None
 
+    def get_profile_picture_srcset(self, obj):
+        # {"64w": url, ...}; the original stays in profile_picture
+        if not obj.profile_picture:
+            return {}
+        return images.srcset(obj.profile_picture_variants, obj.profile_picture.storage, self.context.get("request"))
+
     def get_is_following(self, obj):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return False
+        # annotated by UserSearchView / UserDetailView for the whole result set
+        annotated = getattr(obj, "is_following", None)
+        if annotated is not None:
+            return annotated
         return obj.followers.filter(pk=request.user.pk).exists()
 
 
@@ -70,33 +87,65 @@ class OwnerMiniSerializer(serializers.ModelSerializer):
         model = User
         fields = ("id", "username", "role")
 
-class SongSerializer(serializers.ModelSerializer):
+class SongSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     owner = OwnerMiniSerializer(read_only=True)
 
-    likes_count = serializers.SerializerMethodField()
     liked_by_me = serializers.SerializerMethodField()
+    cover_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Song
         fields = (
             "id", "owner", "title", "description",
-            "audio", "cover", "is_public",
+            "audio", "cover", "cover_srcset", "is_public",
             "duration_seconds", "plays",
             "likes_count", "liked_by_me",
             "waveform_data",
+            "renditions",
             "genre",
+            "processing_status",
             "created_at",
         )
-        read_only_fields = ("duration_seconds", "plays", "created_at", "owner", "likes_count", "liked_by_me", "waveform_data")
-
+        read_only_fields = ("duration_seconds", "plays", "created_at", "owner", "likes_count", "liked_by_me", "waveform_data", "renditions", "processing_status")
+
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # private audio is only reachable through a short-lived signed URL (api.views.serve_audio)
+        if not instance.is_public and data.get("audio"):
+            data["audio"] = sign_audio_url(data["audio"], instance.audio.name)
+        # `audio` is the original upload, for downloads; players use stream_url
+        data["renditions"] = [self._rendition(instance, r) for r in instance.renditions or []]
+        default = settings.AUDIO_DEFAULT_RENDITION
+        preferred = [r for r in data["renditions"] if (r["codec"], r["bitrate"]) == tuple(default)]
+        playable = preferred or [r for r in data["renditions"] if r["codec"] != "hls"]
+        data["stream_url"] = playable[0]["url"] if playable else data.get("audio")
+        return data
+
+    def _rendition(self, instance, rendition):
+        url = default_storage.url(rendition["name"])
+        request = self.context.get("request")
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        if not instance.is_public:
+            # signed for the original's name; serve_audio checks renditions against it
+            url = sign_audio_url(url, instance.audio.name)
+        return {"codec": rendition["codec"], "bitrate": rendition["bitrate"], "mime": rendition["mime"],
+                "size": rendition["size"], "url": url}
+
+    def get_cover_srcset(self, obj):
+        if not obj.cover:
+            return {}
+        return images.srcset(obj.cover_variants, obj.cover.storage, self.context.get("request"))
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-    
     def get_liked_by_me(self, obj):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return False
+        # SongViewSet.get_queryset annotates this for the whole page
+        annotated = getattr(obj, "liked_by_me", None)
+        if annotated is not None:
+            return annotated
         return obj.likes.filter(pk=request.user.pk).exists()
 
     def validate_audio(self, f):
@@ -104,8 +153,8 @@ class SongSerializer(serializers.ModelSerializer):
         max_mb = 50  # adjust if you want
         if f.size > max_mb * 1024 * 1024:
             raise serializers.ValidationError(f"Audio exceeds {max_mb} MB.")
-        ext = os.path.splitext(f.name)[1].lower()
-        if ext not in {".mp3", ".wav", ".m4a", ".aac", ".flac", ".ogg"}:
+        # judge the bytes, not the file name
+        if uploads.sniff_audio_format(uploads.file_head(f)) is None:
             raise serializers.ValidationError("Unsupported audio format.")
         return f
 
@@ -120,61 +169,45 @@ class SongSerializer(serializers.ModelSerializer):
         return g.lower()
 
     def create(self, validated_data):
+        # duration + waveform are filled in by the process_uploads worker,
+        # unless the same bytes were uploaded (and analysed) before
         request = self.context["request"]
-        song = Song.objects.create(owner=request.user, **validated_data)
-
-        try:
-            from mutagen import File as MutagenFile
-            mf = MutagenFile(song.audio.path)
-            if mf and mf.info and getattr(mf.info, "length", None):
-                song.duration_seconds = int(mf.info.length)
-                song.save(update_fields=["duration_seconds"])
-        except Exception:
-            pass
-
-        try:
-            waveform = self.generate_waveform(song.audio.path)
-            if waveform:
-                song.waveform_data = waveform
-                song.save(update_fields=["waveform_data"])
-        except Exception:
-            pass
-
-        return song
-
-    def generate_waveform(self, audio_path, num_bars=65):
-        try:
-            import numpy as np
-            from pydub import AudioSegment
-
-            audio = AudioSegment.from_file(audio_path)
-
-            samples = np.array(audio.get_array_of_samples())
-
-            if audio.channels == 2:
-                samples = samples.reshape((-1, 2))
-                samples = samples.mean(axis=1)
-
-            chunk_size = len(samples) // num_bars
-            waveform_data = []
-
-            for i in range(num_bars):
-                start = i * chunk_size
-                end = start + chunk_size
-                chunk = samples[start:end] if start < len(samples) else samples[-chunk_size:]
-
-                rms = np.sqrt(np.mean(chunk**2)) if len(chunk) > 0 else 0
-                waveform_data.append(float(rms))
-
-            if max(waveform_data) > 0:
-                max_val = max(waveform_data)
-                waveform_data = [min(0.3 + (val / max_val) * 0.7, 1.0) for val in waveform_data]
-            else:
-                waveform_data = [0.5] * num_bars
-
-            return waveform_data
-
-        except ImportError:
-            return [0.5 + np.random.random() * 0.5 for _ in range(num_bars)]
-        except Exception:
-            return None
+        audio = validated_data.pop("audio")
+        with transaction.atomic():
+            blob, _ = uploads.store_audio(audio)
+            validated_data.update(self._analysis_fields(blob))
+            return Song.objects.create(owner=request.user, audio=blob.file.name, blob=blob, **validated_data)
+
+    def update(self, instance, validated_data):
+        audio = validated_data.pop("audio", None)
+        if audio is None:
+            return super().update(instance, validated_data)
+        with transaction.atomic():
+            old_blob_id = instance.blob_id
+            blob, _ = uploads.store_audio(audio)
+            validated_data.update(audio=blob.file.name, blob=blob, **self._analysis_fields(blob))
+            song = super().update(instance, validated_data)
+            uploads.release(old_blob_id)
+            return song
+
+    @staticmethod
+    def _analysis_fields(blob):
+        known = uploads.known_analysis(blob)
+        if known is None:
+            return {"processing_status": Song.ProcessingStatus.PENDING, "processing_attempts": 0, "renditions": None}
+        return {**known, "processing_status": Song.ProcessingStatus.READY}
+
+
+class LikeOperationSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    action = serializers.ChoiceField(choices=("like", "unlike"))
+
+
+class BulkLikeSerializer(serializers.Serializer):
+    """POST /api/songs/likes/ body: {"operations": [{"id": 1, "action": "like"}, ...]}"""
+    operations = LikeOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, value):
+        if len(value) > settings.SONG_BATCH_MAX_IDS:
+            raise serializers.ValidationError(f"At most {settings.SONG_BATCH_MAX_IDS} operations per request.")
+        return value
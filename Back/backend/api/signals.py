@@ -1,17 +1,239 @@
-from django.db.models.signals import m2m_changed
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import User
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .models import User, Song
+from .counters import bump, reconcile_songs
+from . import auth, feed, images, response_cache, search, uploads
+
+logger = logging.getLogger(__name__)
+
+@receiver(m2m_changed, sender=User.following.through)
+def update_follower_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    # forward: instance follows/unfollows the users in pk_set
+    # reverse (target.followers.add(...)): instance gains/loses the followers in pk_set
+    mine, theirs = ("to_user_id", "from_user_id") if reverse else ("from_user_id", "to_user_id")
+
+    if action in {"pre_remove", "pre_clear"}:
+        # remove() reports the requested ids, not the rows that existed; look them up first
+        rows = sender.objects.filter(**{mine: instance.pk})
+        if action == "pre_remove":
+            rows = rows.filter(**{f"{theirs}__in": pk_set})
+        instance._follow_removed = set(rows.values_list(theirs, flat=True))
+        return
+
+    if action == "post_add":
+        others, delta = pk_set, 1  # add() only reports ids that were actually inserted
+    elif action in {"post_remove", "post_clear"}:
+        others, delta = instance.__dict__.pop("_follow_removed", set()), -1
+    else:
+        return
+    if not others:
+        return
+
+    # runs inside the m2m change's transaction: one UPDATE per side
+    own_field, other_field = ("follower_count", "following_count") if reverse else ("following_count", "follower_count")
+    bump(User.objects.filter(pk__in=others), other_field, delta)
+    bump(User.objects.filter(pk=instance.pk), own_field, delta * len(others))
+
+    if delta < 0:
+        # artists who just fell to the fan-out limit: timelines take over from the read-time merge
+        artists, lost = ([instance.pk], len(others)) if reverse else (list(others), 1)
+        limit = feed.fanout_limit()
+        shrunk = list(
+            User.objects.filter(pk__in=artists, follower_count__lte=limit, follower_count__gt=limit - lost)
+            .values_list("pk", flat=True)
+        )
+        if shrunk:
+            transaction.on_commit(lambda: feed.on_shrink(shrunk))
+
+
+@receiver(m2m_changed, sender=Song.likes.through)
+def update_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    # like/unlike write the through table directly and bump Song.likes_count themselves;
+    # this keeps the counter right for m2m edits made elsewhere (admin, shell)
+    if action == "pre_clear" and reverse:
+        # user.liked_songs.clear(): remember which songs lose a like
+        instance._cleared_song_ids = list(instance.liked_songs.values_list("pk", flat=True))
+        return
+    if action not in {"post_add", "post_remove", "post_clear"}:
+        return
+
+    if not reverse:
+        song_ids = [instance.pk]
+    elif action == "post_clear":
+        song_ids = getattr(instance, "_cleared_song_ids", [])
+    else:
+        song_ids = pk_set or []
+
+    reconcile_songs(Song.objects.filter(pk__in=song_ids))
+
+
+SEARCH_FIELDS = {"title", "genre", "description", "owner", "owner_id"}
+
+
+@receiver(post_save, sender=Song)
+def index_song(sender, instance, update_fields=None, using="default", **kwargs):
+    # queue/counter updates use update_fields or .update() and don't touch the index
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    search.index_songs([instance.pk], using)
+
+
+@receiver(post_delete, sender=Song)
+def unindex_song(sender, instance, using="default", **kwargs):
+    search.unindex_song(instance.pk, using)
+
+
+@receiver(post_delete, sender=Song)
+def release_audio_blob(sender, instance, **kwargs):
+    # the last song using a blob takes its file with it
+    uploads.release(instance.blob_id)
+
+
+@receiver(post_save, sender=User)
+def reindex_owner_songs(sender, instance, created, update_fields=None, using="default", **kwargs):
+    # logins save last_login only; a new user has no songs yet
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    search.index_owner(instance.pk, using)
+
 
 @receiver(m2m_changed, sender=User.following.through)
-def update_follower_counts(sender, instance, action, pk_set, **kwargs):
-    # instance = the follower doing the change; pk_set = ids of followed users
-    if action in {"post_add", "post_remove", "post_clear"}:
-        if action == "post_clear":
-            return
-        for target_id in pk_set:
-            try:
-                u = User.objects.get(pk=target_id)
-                u.follower_count = u.followers.count()
-                u.save(update_fields=["follower_count"])
-            except User.DoesNotExist:
-                pass
+def update_timelines(sender, instance, action, reverse, pk_set, **kwargs):
+    # forward: instance is the follower; reverse: instance is the artist
+    if action == "post_add" and pk_set:
+        followers, artists = (list(pk_set), [instance.pk]) if reverse else ([instance.pk], list(pk_set))
+        # the backfill is a read plus a bulk insert: keep it out of the follow's write transaction
+        transaction.on_commit(lambda: feed.on_follow(followers, artists))
+    elif action == "pre_remove" and pk_set:
+        followers, artists = (list(pk_set), [instance.pk]) if reverse else ([instance.pk], list(pk_set))
+        feed.on_unfollow(followers, artists)
+    elif action == "pre_clear":
+        if reverse:
+            followers = sender.objects.filter(to_user_id=instance.pk).values_list("from_user_id", flat=True)
+            feed.on_unfollow(list(followers), [instance.pk])
+        else:
+            feed.on_unfollow([instance.pk])
+
+
+@receiver(pre_save, sender=Song)
+def remember_visibility(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and "is_public" not in update_fields):
+        return
+    instance._was_public = (
+        Song.objects.filter(pk=instance.pk).values_list("is_public", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Song)
+def fan_out_song(sender, instance, created, update_fields=None, **kwargs):
+    was_public = instance.__dict__.pop("_was_public", None)
+    if not created and (update_fields is not None and "is_public" not in update_fields):
+        return
+    if instance.is_public and (created or was_public is False):
+        song_id = instance.pk
+        transaction.on_commit(lambda: feed.fan_out(song_id))
+    elif not instance.is_public and was_public:
+        feed.retract(instance.pk)
+
+
+def _invalidate_after_commit(song_ids):
+    # after commit, so a concurrent reader can't re-cache the old rows under the new generation
+    song_ids = list(song_ids)
+    transaction.on_commit(lambda: response_cache.invalidate_songs(song_ids))
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_delete, sender=Song)
+def invalidate_song_cache(sender, instance, **kwargs):
+    _invalidate_after_commit([instance.pk])
+
+
+@receiver(m2m_changed, sender=Song.likes.through)
+def invalidate_like_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in {"post_add", "post_remove", "post_clear"}:
+        return
+    if not reverse:
+        _invalidate_after_commit([instance.pk])
+    elif action == "post_clear":
+        _invalidate_after_commit(getattr(instance, "_cleared_song_ids", []))
+    else:
+        _invalidate_after_commit(pk_set or [])
+
+
+@receiver(post_save, sender=User)
+def invalidate_owner_cache(sender, instance, created, update_fields=None, **kwargs):
+    # songs embed the owner's username and role
+    if created or (update_fields is not None and not {"username", "role"}.intersection(update_fields)):
+        return
+    _invalidate_after_commit(Song.objects.filter(owner_id=instance.pk).values_list("pk", flat=True))
+
+
+# model -> (image field, its variants field); see api.images
+IMAGE_FIELDS = {
+    User: ("profile_picture", "profile_picture_variants"),
+    Song: ("cover", "cover_variants"),
+}
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Song)
+def detect_new_image(sender, instance, update_fields=None, **kwargs):
+    field, variants_field = IMAGE_FIELDS[sender]
+    if update_fields is not None and field not in update_fields:
+        return
+    image = getattr(instance, field)
+    if instance._state.adding:
+        changed = bool(image)
+    elif image and not image._committed:
+        changed = True
+    else:
+        # compare with the stored name: rows whose variants are missing (older
+        # uploads, failed builds) are left to `manage.py build_image_variants`
+        # instead of being retried on every save
+        stored = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+        changed = (image.name or "") != (stored or "")
+    if changed:
+        instance._image_changed = True
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Song)
+def build_image_variants(sender, instance, **kwargs):
+    if not instance.__dict__.pop("_image_changed", False):
+        return
+    field, variants_field = IMAGE_FIELDS[sender]
+    image = getattr(instance, field)
+    old = getattr(instance, variants_field) or {}
+    try:
+        variants = images.build(image, settings.IMAGE_VARIANT_WIDTHS, settings.IMAGE_VARIANT_QUALITY)
+    except Exception:
+        # the original is still served; `manage.py build_image_variants` picks up the null later
+        logger.exception("Could not build variants for %s %s", sender.__name__, instance.pk)
+        variants = None
+    sender.objects.filter(pk=instance.pk).update(**{variants_field: variants})
+    setattr(instance, variants_field, variants)
+    stale = set(old.values()) - set((variants or {}).values())
+    if stale:
+        storage = image.storage
+        transaction.on_commit(lambda: [storage.delete(name) for name in stale])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # a login only touches last_login, which authentication doesn't look at
+    if kwargs.get("update_fields") is not None and set(kwargs["update_fields"]) <= {"last_login"}:
+        return
+    auth.forget_user(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def remember_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        token = instance.token
+        auth.remember_blacklisted(token.jti, token.expires_at.timestamp())
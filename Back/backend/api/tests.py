@@ -1,3 +1,1459 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import audio, auth, charts, counters, feed, images, plays, processing, search, transcode, uploads, utils, views, waveform
+from .models import AudioBlob, ChartEntry, Song, SongTrend, TimelineEntry, User
+from .pagination import SongCursorPagination
+from .views import _visible_songs
+
+PAGE = SongCursorPagination.ordering
+
+
+@skipUnless(connection.vendor == "sqlite", "plans are checked against SQLite's EXPLAIN QUERY PLAN")
+class QueryPlanTests(TestCase):
+    """The hot list queries must be served by their indexes, without a sort step."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user("artist", password="x", role=User.Roles.ARTIST)
+        cls.listener = User.objects.create_user("listener", password="x", role=User.Roles.LISTENER)
+        Song.objects.bulk_create([
+            Song(owner=cls.artist, title=f"song {i}", audio=f"audio/{i}.mp3", genre="house", is_public=i % 3 != 0)
+            for i in range(30)
+        ])
+
+    def assertUsesIndex(self, qs, index):
+        plan = qs.explain()
+        self.assertIn(f"USING INDEX {index}", plan.replace("COVERING INDEX", "INDEX"))
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_anonymous_song_list(self):
+        request = RequestFactory().get("/api/songs/")
+        request.user = AnonymousUser()
+        self.assertUsesIndex(_visible_songs(request).order_by(*PAGE)[:21], "song_public_recent_idx")
+
+    def test_songs_by_owner(self):
+        qs = Song.objects.filter(owner=self.artist, is_public=True).order_by(*PAGE)[:21]
+        self.assertUsesIndex(qs, "song_owner_recent_idx")
+
+    def test_songs_by_genre(self):
+        qs = Song.objects.filter(genre__in=["house"]).order_by(*PAGE)[:21]
+        self.assertUsesIndex(qs, "song_genre_recent_idx")
+
+    def test_songs_by_owner_username(self):
+        request = RequestFactory().get("/api/songs/")
+        request.user = AnonymousUser()
+        qs = _visible_songs(request).filter(owner__username="artist").order_by(*PAGE)[:21]
+        self.assertUsesIndex(qs, "song_owner_recent_idx")
+
+    def test_songs_liked_by_user(self):
+        qs = Song.likes.through.objects.filter(user_id=self.listener.pk).values_list("song_id", flat=True)
+        self.assertUsesIndex(qs, "api_song_likes_user_song_idx")
+
+
+@override_settings(SONG_CACHE_TIMEOUT=0)
+class QueryBudgetTests(TestCase):
+    """List and profile endpoints cost the same number of queries for 1 row as for many."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.viewer = User.objects.create_user("viewer", role=User.Roles.LISTENER)
+        self.client.force_authenticate(self.viewer)
+
+    def assertConstantQueries(self, url, add_rows, check=None):
+        with CaptureQueriesContext(connection) as one:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        add_rows()
+        with self.assertNumQueries(len(one)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        if check:
+            check(response.json())
+
+    def make_artists(self, start, count, followed):
+        artists = [
+            User.objects.create_user(f"artist{i:02d}", role=User.Roles.ARTIST)
+            for i in range(start, start + count)
+        ]
+        if followed:
+            self.viewer.following.add(*artists)
+        return artists
+
+    def make_songs(self, owner, start, count, liked):
+        songs = Song.objects.bulk_create([
+            Song(owner=owner, title=f"song {i}", audio=f"audio/{i}.mp3") for i in range(start, start + count)
+        ])
+        if liked:
+            for song in songs:
+                song.likes.add(self.viewer)
+        return songs
+
+    def test_user_search(self):
+        self.make_artists(0, 1, followed=True)
+
+        def check(rows):
+            self.assertEqual([r["is_following"] for r in rows], [True] * 11 + [False] * 9)
+
+        def add_rows():
+            self.make_artists(1, 10, followed=True)
+            self.make_artists(11, 15, followed=False)
+
+        self.assertConstantQueries("/api/users/search/?q=artist", add_rows, check)
+
+    def test_user_detail(self):
+        artist = self.make_artists(0, 1, followed=True)[0]
+
+        def add_rows():
+            for follower in self.make_artists(1, 20, followed=False):
+                follower.following.add(artist)
+
+        def check(data):
+            self.assertTrue(data["is_following"])
+            self.assertEqual(data["follower_count"], 21)
+
+        self.assertConstantQueries(f"/api/users/{artist.username}/", add_rows, check)
+
+    def test_song_list_likes(self):
+        artist = self.make_artists(0, 1, followed=False)[0]
+        self.make_songs(artist, 0, 1, liked=True)
+
+        def add_rows():
+            self.make_songs(artist, 1, 10, liked=True)
+            self.make_songs(artist, 11, 9, liked=False)
+
+        def check(data):
+            rows = data["results"]
+            self.assertEqual(len(rows), 20)
+            liked = {r["title"] for r in rows if r["liked_by_me"]}
+            self.assertEqual(liked, {f"song {i}" for i in range(11)})
+            self.assertEqual(
+                {r["title"]: r["likes_count"] for r in rows},
+                {f"song {i}": int(i < 11) for i in range(20)},
+            )
+
+        self.assertConstantQueries("/api/songs/?page_size=20", add_rows, check)
+
+    def test_anonymous_song_list(self):
+        self.client.force_authenticate(None)
+        artist = self.make_artists(0, 1, followed=False)[0]
+        self.make_songs(artist, 0, 1, liked=False)
+        self.assertConstantQueries("/api/songs/", lambda: self.make_songs(artist, 1, 30, liked=False))
+
+
+@override_settings(SONG_CACHE_TIMEOUT=0)
+class BatchEndpointTests(TestCase):
+    """GET /api/songs/batch/ and POST /api/songs/likes/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+        cls.listener = User.objects.create_user("listener", role=User.Roles.LISTENER)
+        cls.songs = Song.objects.bulk_create([
+            Song(owner=cls.artist, title=f"song {i}", audio=f"audio/{i}.mp3") for i in range(100)
+        ])
+        cls.hidden = Song.objects.create(owner=cls.artist, title="hidden", audio="audio/h.mp3", is_public=False)
+        cls.own_private = Song.objects.create(owner=cls.listener, title="mine", audio="audio/m.mp3", is_public=False)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.listener)
+
+    def batch(self, ids):
+        return self.client.get("/api/songs/batch/", {"ids": ",".join(str(pk) for pk in ids)})
+
+    def bulk(self, operations):
+        return self.client.post("/api/songs/likes/", {"operations": operations}, format="json")
+
+    def test_batch_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as one:
+            self.assertEqual(len(self.batch([self.songs[0].pk]).json()["results"]), 1)
+        with self.assertNumQueries(len(one)):
+            response = self.batch([song.pk for song in self.songs])
+        self.assertEqual(len(response.json()["results"]), 100)
+
+    def test_batch_order_and_missing(self):
+        ids = [self.songs[2].pk, 999999, self.hidden.pk, self.songs[0].pk, self.own_private.pk, 888888]
+        data = self.batch(ids).json()
+        self.assertEqual([r["id"] for r in data["results"]], [self.songs[2].pk, self.songs[0].pk, self.own_private.pk])
+        self.assertEqual(data["missing"], [999999, self.hidden.pk, 888888])
+
+        self.client.force_authenticate(None)
+        data = self.batch([self.own_private.pk, self.songs[1].pk]).json()
+        self.assertEqual([r["id"] for r in data["results"]], [self.songs[1].pk])
+        self.assertEqual(data["missing"], [self.own_private.pk])
+
+    def test_batch_rejects_too_many_ids(self):
+        with self.settings(SONG_BATCH_MAX_IDS=3):
+            self.assertEqual(self.batch([s.pk for s in self.songs[:4]]).status_code, 400)
+
+    def test_bulk_likes_query_count_is_constant(self):
+        def operations(songs):
+            half = len(songs) // 2
+            return (
+                [{"id": s.pk, "action": "like"} for s in songs[:half]]
+                + [{"id": s.pk, "action": "unlike"} for s in songs[half:]]
+            )
+
+        Song.likes.through.objects.bulk_create(
+            [Song.likes.through(song_id=s.pk, user_id=self.listener.pk) for s in self.songs]
+        )
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.bulk(operations(self.songs[:2])).status_code, 200)
+        with self.assertNumQueries(len(few)):
+            self.assertEqual(self.bulk(operations(self.songs[2:])).status_code, 200)
+
+    def test_bulk_likes_counts(self):
+        a, b, c = self.songs[:3]
+        b.likes.add(self.artist)
+        c.likes.add(self.listener, self.artist)
+
+        response = self.bulk([
+            {"id": a.pk, "action": "like"},
+            {"id": b.pk, "action": "like"},
+            {"id": c.pk, "action": "unlike"},
+            {"id": a.pk, "action": "unlike"},
+            {"id": a.pk, "action": "like"},  # the last operation on a song wins
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {r["id"]: (r["liked_by_me"], r["likes_count"]) for r in response.json()["results"]},
+            {a.pk: (True, 1), b.pk: (True, 2), c.pk: (False, 1)},
+        )
+        self.assertEqual(
+            dict(Song.objects.filter(pk__in=[a.pk, b.pk, c.pk]).values_list("pk", "likes_count")),
+            {a.pk: 1, b.pk: 2, c.pk: 1},
+        )
+        self.assertEqual(set(self.listener.liked_songs.values_list("pk", flat=True)), {a.pk, b.pk})
+
+    def test_bulk_likes_all_or_nothing(self):
+        a, b = self.songs[:2]
+        b.likes.add(self.listener)
+        response = self.bulk([
+            {"id": a.pk, "action": "like"},
+            {"id": b.pk, "action": "unlike"},
+            {"id": self.own_private.pk, "action": "like"},
+            {"id": self.hidden.pk, "action": "like"},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()["errors"]), {str(self.own_private.pk), str(self.hidden.pk)})
+        self.assertEqual(set(self.listener.liked_songs.values_list("pk", flat=True)), {b.pk})
+        self.assertEqual(
+            dict(Song.objects.filter(pk__in=[a.pk, b.pk]).values_list("pk", "likes_count")),
+            {a.pk: 0, b.pk: 1},
+        )
+
+
+def fake_process(audio_path, *args):
+    """Stands in for api.audio.process in the pool; dies like a segfaulting decoder on "crash" files."""
+    if "crash" in audio_path:
+        os._exit(1)
+    return {"duration_seconds": 1, "waveform_data": [0.5], "renditions": []}
+
+
+@override_settings(SONG_PROCESSING_RETRY_DELAY_SECONDS=0, SONG_PROCESSING_MAX_ATTEMPTS=2)
+class ProcessingWorkerTests(TestCase):
+    """run_worker keeps going when a pool child dies."""
+
+    def setUp(self):
+        artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+        Song.objects.bulk_create([
+            Song(owner=artist, title=name, audio=f"audio/{name}.mp3") for name in ("ok1", "crash", "ok2")
+        ])
+
+    def states(self):
+        return {
+            title: (status, attempts)
+            for title, status, attempts in Song.objects.values_list("title", "processing_status", "processing_attempts")
+        }
+
+    @mock.patch("api.audio.process", fake_process)
+    def test_crashed_child_is_retried_then_failed(self):
+        with self.assertLogs("api.processing", "WARNING") as logs:
+            handled = processing.run_worker(concurrency=1, poll_interval=0.05, once=True)
+        self.assertIn("starting a new pool", "\n".join(logs.output))
+        self.assertEqual(handled, 4)  # ok1, ok2 and two attempts at crash
+        self.assertEqual(self.states(), {
+            "ok1": (Song.ProcessingStatus.READY, 1),
+            "ok2": (Song.ProcessingStatus.READY, 1),
+            "crash": (Song.ProcessingStatus.FAILED, 2),
+        })
+        self.assertIn("BrokenProcessPool", Song.objects.get(title="crash").processing_error)
+
+    @mock.patch("api.audio.process", fake_process)
+    def test_song_claimed_into_a_broken_pool_is_released(self):
+        Song.objects.filter(title="crash").delete()
+        real_submit = processing.submit
+        calls = []
+
+        def submit(pool, song):
+            calls.append(song.title)
+            if len(calls) == 1:
+                raise BrokenProcessPool("child died")
+            return real_submit(pool, song)
+
+        with mock.patch.object(processing, "submit", submit), self.assertLogs("api.processing", "WARNING"):
+            processing.run_worker(concurrency=1, poll_interval=0.05, once=True)
+        self.assertEqual(self.states(), {
+            "ok1": (Song.ProcessingStatus.READY, 1),
+            "ok2": (Song.ProcessingStatus.READY, 1),
+        })
+        self.assertEqual(len(calls), 3)
+
+
+class PlayListenerTests(TestCase):
+    """Anonymous play dedup can't be dodged by forging X-Forwarded-For."""
+
+    def key(self, forwarded=None, remote="10.0.0.1"):
+        extra = {"HTTP_X_FORWARDED_FOR": forwarded} if forwarded is not None else {}
+        request = RequestFactory().post("/", REMOTE_ADDR=remote, **extra)
+        request.user = AnonymousUser()
+        return plays.listener_key(request)
+
+    def test_forwarded_header_ignored_without_trusted_proxies(self):
+        self.assertEqual(self.key("1.1.1.1"), "a10.0.0.1")
+        self.assertEqual(self.key("2.2.2.2"), self.key("3.3.3.3"))
+
+    @override_settings(PLAY_TRUSTED_PROXIES=1)
+    def test_address_seen_by_the_trusted_proxy(self):
+        # the client wrote "1.1.1.1"; the proxy appended the address it saw
+        self.assertEqual(self.key("1.1.1.1, 203.0.113.7"), "a203.0.113.7")
+        self.assertEqual(self.key("9.9.9.9, 203.0.113.7"), "a203.0.113.7")
+        self.assertEqual(self.key(""), "a10.0.0.1")
+
+    def test_forged_headers_are_deduplicated(self):
+        artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+        song = Song.objects.create(owner=artist, title="t", audio="audio/dedup.mp3")
+        client = APIClient()
+        counted = [
+            client.post(f"/api/songs/{song.pk}/play/", HTTP_X_FORWARDED_FOR=f"198.51.100.{i}").json()["counted"]
+            for i in range(3)
+        ]
+        self.assertEqual(counted, [True, False, False])
+
+
+def png(width, height, color="red"):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+@override_settings(IMAGE_VARIANT_WIDTHS=(64, 256, 1024))
+class ImageVariantTests(TestCase):
+    """WebP variants of covers (api.images, api.signals)."""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=media))
+        self.artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+
+    def song_with_cover(self, content, name="cover.png"):
+        song = Song(owner=self.artist, title="t", audio="audio/t.mp3")
+        song.cover.save(name, ContentFile(content), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            song.save()
+        return song
+
+    def test_names_and_no_upscaling(self):
+        content = png(300, 200)
+        song = self.song_with_cover(content)
+        digest = hashlib.sha256(content).hexdigest()[:10]
+        stem = os.path.splitext(song.cover.name)[0]
+        # 1024 is wider than the original, so it is skipped
+        self.assertEqual(song.cover_variants, {"64": f"{stem}.{digest}.64.webp", "256": f"{stem}.{digest}.256.webp"})
+        with Image.open(song.cover.storage.path(song.cover_variants["64"])) as img:
+            self.assertEqual((img.format, img.size), ("WEBP", (64, 43)))
+        self.assertEqual(Song.objects.get(pk=song.pk).cover_variants, song.cover_variants)
+
+    def test_replaced_cover_deletes_stale_variants(self):
+        song = self.song_with_cover(png(300, 300, "red"))
+        old = list(song.cover_variants.values())
+        song.cover.save("other.png", ContentFile(png(300, 300, "blue")), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            song.save()
+        self.assertEqual(len(song.cover_variants), 2)
+        self.assertFalse(set(old) & set(song.cover_variants.values()))
+        storage = song.cover.storage
+        self.assertFalse(any(storage.exists(name) for name in old))
+        self.assertTrue(all(storage.exists(name) for name in song.cover_variants.values()))
+
+    def test_cleared_cover_deletes_variants(self):
+        song = self.song_with_cover(png(300, 300))
+        old = list(song.cover_variants.values())
+        song.cover = None
+        with self.captureOnCommitCallbacks(execute=True):
+            song.save()
+        self.assertEqual(Song.objects.get(pk=song.pk).cover_variants, {})
+        storage = Song._meta.get_field("cover").storage
+        self.assertFalse(any(storage.exists(name) for name in old))
+
+    def test_failed_build_is_not_retried_on_save(self):
+        with mock.patch.object(images, "build", side_effect=OSError("truncated")), \
+                self.assertLogs("api.signals", "ERROR"):
+            song = self.song_with_cover(png(300, 300))
+        self.assertIsNone(Song.objects.get(pk=song.pk).cover_variants)
+        with mock.patch.object(images, "build") as build:
+            song.title = "renamed"
+            song.save()
+            Song.objects.get(pk=song.pk).save()
+        build.assert_not_called()
+
+
+class RefreshBlacklistTests(TestCase):
+    """A token blacklisted by another process (a cache that never heard of it) is still refused."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("listener", role=User.Roles.LISTENER)
+        self.refresh = RefreshToken.for_user(self.user)
+
+    def blacklist_elsewhere(self):
+        # bulk_create skips post_save, like a blacklist written by another worker
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=OutstandingToken.objects.get(jti=self.refresh["jti"]))])
+
+    def test_miss_is_not_cached(self):
+        self.assertFalse(auth.is_blacklisted(self.refresh["jti"], self.refresh["exp"]))
+        self.blacklist_elsewhere()
+        self.assertTrue(auth.is_blacklisted(self.refresh["jti"], self.refresh["exp"]))
+
+    def test_token_rotated_elsewhere_cannot_be_replayed(self):
+        self.assertFalse(auth.is_blacklisted(self.refresh["jti"], self.refresh["exp"]))  # this process saw it live
+        self.blacklist_elsewhere()  # another worker rotated it
+        response = APIClient().post("/api/refresh/", {"refresh": str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(CHARTS_SIZE=2, CHARTS_HALF_LIFE_HOURS=10, CHARTS_LIKE_WEIGHT=5)
+class ChartTests(TestCase):
+    """Trend scores and materialized charts (api.charts)."""
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now().replace(microsecond=0)
+        self.artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+
+    def song(self, title, hours_ago=0, **fields):
+        song = Song.objects.create(owner=self.artist, title=title, audio=f"audio/{title}.mp3", **fields)
+        Song.objects.filter(pk=song.pk).update(created_at=self.now - timedelta(hours=hours_ago))
+        return song
+
+    def build(self, hours_later=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            return charts.build(now=self.now + timedelta(hours=hours_later))
+
+    def chart(self, name=""):
+        return list(ChartEntry.objects.filter(chart=name).order_by("rank").values_list("song__title", "score"))
+
+    def test_decay_and_incremental_accumulation(self):
+        song = self.song("a", hours_ago=10, plays=8, likes_count=2)
+        self.build()
+        # first seen: the whole history, dated at upload, one half-life ago
+        self.assertAlmostEqual(self.chart()[0][1], (8 + 5 * 2) * 0.5)
+
+        Song.objects.filter(pk=song.pk).update(plays=12, likes_count=1)  # +4 plays, -1 like, 20h in
+        self.assertEqual(self.build(hours_later=20)["trends_written"], 1)
+        expected_20 = 18 * 0.5 ** 3 + 4 - 5
+        self.assertAlmostEqual(self.chart()[0][1], expected_20)
+
+        # nothing new: decays without rewriting the trend row
+        self.assertEqual(self.build(hours_later=25)["trends_written"], 0)
+        self.assertAlmostEqual(self.chart()[0][1], expected_20 * 0.5 ** 0.5)
+
+    def test_unlikes_floor_the_score_at_zero(self):
+        song = self.song("a", likes_count=1)
+        self.build()
+        Song.objects.filter(pk=song.pk).update(likes_count=0)
+        self.build(hours_later=50)
+        self.assertEqual(self.chart(), [])  # only positive scores chart
+        self.assertEqual(SongTrend.objects.get(pk=song.pk).score, 0)
+
+    def test_charts_are_truncated_per_genre(self):
+        for title, plays, genre in [("h1", 30, "house"), ("h2", 20, "#House"), ("h3", 10, "house"),
+                                    ("t1", 25, "techno"), ("none", 40, "")]:
+            self.song(title, plays=plays, genre=genre)
+        self.song("private", plays=1000, genre="house", is_public=False)
+        self.build()
+        self.assertEqual([t for t, _ in self.chart()], ["none", "h1"])
+        self.assertEqual([t for t, _ in self.chart("house")], ["h1", "h2"])
+        self.assertEqual([t for t, _ in self.chart("techno")], ["t1"])
+        self.assertEqual(set(ChartEntry.objects.values_list("chart", flat=True)), {"", "house", "techno"})
+
+    @override_settings(CHARTS_SIZE=5)
+    def test_endpoint_drops_songs_hidden_or_deleted_since_the_build(self):
+        songs = [self.song(f"s{i}", plays=10 - i, genre="house") for i in range(4)]
+        self.build()
+        client = APIClient()
+        data = client.get("/api/charts/", {"genre": "#House"}).json()
+        self.assertEqual(data["genre"], "house")
+        self.assertEqual([r["song"]["title"] for r in data["results"]], ["s0", "s1", "s2", "s3"])
+
+        Song.objects.filter(pk=songs[1].pk).update(is_public=False)
+        songs[2].delete()
+        data = client.get("/api/charts/", {"genre": "house"}).json()
+        self.assertEqual([(r["rank"], r["song"]["title"]) for r in data["results"]], [(1, "s0"), (2, "s3")])
+        self.assertEqual(client.get("/api/charts/", {"genre": "jazz"}).json()["results"], [])
+
+
+@skipUnless(charts.np is not None, "compares the NumPy path with the pure-Python one")
+class ChartParityTests(TestCase):
+    def test_numpy_and_python_agree(self):
+        rng = random.Random(7)
+        n = 5000
+        scores = [rng.random() * 100 for _ in range(n)]
+        elapsed = [rng.random() * 1e6 for _ in range(n)]
+        plays_ = [rng.randint(0, 50) for _ in range(n)]
+        likes = [rng.randint(-30, 5) for _ in range(n)]
+        ids = list(range(n))
+        groups = [rng.randint(-1, 30) for _ in range(n)]
+        # ties, to check the tie-break on id
+        scores[10:20] = [50.0] * 10
+        elapsed[10:20] = plays_[10:20] = likes[10:20] = [0] * 10
+
+        fast = charts.decay(scores, elapsed, plays_, likes, 3600.0, 5).tolist()
+        fast_rank = charts.rank(fast, ids, groups, 25)
+        with mock.patch.object(charts, "np", None):
+            slow = charts.decay(scores, elapsed, plays_, likes, 3600.0, 5)
+            slow_rank = charts.rank(slow, ids, groups, 25)
+
+        for a, b in zip(fast, slow):
+            self.assertAlmostEqual(a, b, places=9)
+        self.assertIn(0.0, slow)  # some were floored
+        self.assertEqual(fast_rank, slow_rank)
+        self.assertTrue(all(len(v) == 25 for v in fast_rank.values()))
+
+
+@override_settings(SONG_CACHE_TIMEOUT=0)
+class CursorPaginationTests(TestCase):
+    """/api/songs/ keyset pages: (created_at DESC, id), opaque cursors."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+        cls.other = User.objects.create_user("other", role=User.Roles.ARTIST)
+        songs = Song.objects.bulk_create([
+            Song(owner=cls.artist if i % 2 else cls.other, title=f"song {i}", audio=f"audio/{i}.mp3")
+            for i in range(25)
+        ])
+        # ties: groups of five share a created_at, so only the id keeps the order stable
+        base = timezone.now()
+        for i, song in enumerate(songs):
+            Song.objects.filter(pk=song.pk).update(created_at=base - timedelta(minutes=i // 5))
+        cls.expected = list(Song.objects.order_by("-created_at", "id").values_list("pk", flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            data = self.client.get(url).json()
+            pages.append(data)
+            ids.extend(r["id"] for r in data["results"])
+            url = data["next"]
+        return ids, pages
+
+    def test_pages_cover_every_song_once_in_order(self):
+        ids, pages = self.walk("/api/songs/?page_size=4")
+        self.assertEqual(ids, self.expected)
+        self.assertEqual([len(p["results"]) for p in pages], [4] * 6 + [1])
+        self.assertIsNone(pages[0]["previous"])
+        self.assertIsNone(pages[-1]["next"])
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get("/api/songs/?page_size=4").json()
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual([r["id"] for r in back["results"]], [r["id"] for r in first["results"]])
+
+    def test_page_size_is_capped(self):
+        # max_page_size is read from SONG_MAX_PAGE_SIZE at import
+        with mock.patch.object(SongCursorPagination, "max_page_size", 10):
+            data = self.client.get("/api/songs/?page_size=1000").json()
+        self.assertEqual(len(data["results"]), 10)
+        self.assertEqual(len(self.client.get("/api/songs/").json()["results"]), 20)
+
+    def test_new_uploads_do_not_shift_later_pages(self):
+        first = self.client.get("/api/songs/?page_size=10").json()
+        Song.objects.create(owner=self.artist, title="fresh", audio="audio/fresh.mp3")
+        second = self.client.get(first["next"]).json()
+        self.assertEqual([r["id"] for r in second["results"]], self.expected[10:20])
+
+    def test_owner_filter_pages_through_one_artist(self):
+        ids, _ = self.walk("/api/songs/?owner=artist&page_size=4")
+        mine = set(Song.objects.filter(owner=self.artist).values_list("pk", flat=True))
+        self.assertEqual(ids, [pk for pk in self.expected if pk in mine])
+        self.assertEqual(self.client.get("/api/songs/?owner=nobody").json()["results"], [])
+
+
+@skipUnless(waveform.np is not None, "numpy is not installed")
+class WaveformTests(SimpleTestCase):
+    """The streaming decoder end to end, on a real file."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def write_wav(self, seconds=30, rate=44100):
+        # stereo 16-bit: silent first half, then a 440 Hz sine at half scale
+        np = waveform.np
+        n = seconds * rate
+        t = np.arange(n) / rate
+        mono = np.where(t < seconds / 2, 0.0, 0.5 * np.sin(2 * np.pi * 440 * t))
+        pcm = np.repeat((mono * 32767).astype("<i2"), 2)
+        path = os.path.join(self.dir, "tone.wav")
+        with wave.open(path, "wb") as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(pcm.tobytes())
+        return path
+
+    def fake_ffmpeg(self, body):
+        path = os.path.join(self.dir, "ffmpeg")
+        with open(path, "w") as f:
+            f.write(f"#!{sys.executable}\nimport sys, time\n{body}\n")
+        os.chmod(path, 0o755)
+        return mock.patch.object(waveform, "_ffmpeg_binary", return_value=path)
+
+    def test_wav_bars_and_pyramid(self):
+        path = self.write_wav()
+        acc = waveform.accumulate(path)
+        self.assertEqual(acc.total_samples, 30 * 44100)
+        self.assertLess(len(acc.count), 2 * waveform.MAX_BUCKETS)  # merged, not grown
+        self.assertGreater(acc.bucket_samples, waveform.MIN_BUCKET_SAMPLES)
+
+        result = audio.analyze(path)
+        bars = result["waveform_data"]
+        self.assertEqual(len(bars), 65)
+        self.assertEqual(bars[:32], [0.3] * 32)
+        self.assertEqual(bars[33:], [1.0] * 32)
+
+        peaks = result["waveform_peaks"]
+        self.assertEqual(waveform.pyramid_levels(peaks), list(waveform.PYRAMID_LEVELS))
+        for level, n in enumerate(waveform.PYRAMID_LEVELS):
+            pairs = waveform.pyramid_level(peaks, level)
+            self.assertEqual(len(pairs), 2 * n)
+            self.assertEqual(set(pairs[: n - 2]), {128})  # silence, less the bucket at the edge
+            loud = pairs[n + 2:]
+            self.assertTrue(all(60 <= lo <= 66 for lo in loud[0::2]))
+            self.assertTrue(all(189 <= hi <= 195 for hi in loud[1::2]))
+
+    def test_ffmpeg_chatter_on_stderr_does_not_stall(self):
+        # more than a pipe buffer of warnings before any audio
+        body = (
+            "sys.stderr.write('warning\\n' * 100000); sys.stderr.flush()\n"
+            "sys.stdout.buffer.write(b'\\0' * 4 * 1000)"
+        )
+        with self.fake_ffmpeg(body):
+            blocks = list(waveform._ffmpeg_blocks("in.mp3", 256))
+        self.assertEqual(sum(len(b) for b in blocks), 1000)
+
+    def test_ffmpeg_error_is_reported(self):
+        with self.fake_ffmpeg("sys.stderr.write('Invalid data found'); sys.exit(1)"):
+            with self.assertRaisesMessage(RuntimeError, "Invalid data found"):
+                list(waveform._ffmpeg_blocks("in.mp3", 256))
+
+    def test_stuck_ffmpeg_is_killed(self):
+        with self.fake_ffmpeg("time.sleep(60)"), mock.patch.object(waveform, "DECODE_TIMEOUT", 0.2):
+            with self.assertRaisesMessage(RuntimeError, "timed out"):
+                list(waveform._ffmpeg_blocks("in.mp3", 256))
+
+
+class WaveformEndpointTests(TestCase):
+    """GET /api/songs/{id}/waveform/: one query, and always revalidated."""
+
+    # two levels: 2 and 4 (min, max) pairs
+    PEAKS = waveform.PYRAMID_MAGIC + struct.pack("<B2I", 2, 2, 4) + bytes(range(12))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+        cls.public = Song.objects.create(owner=cls.artist, title="out", audio="audio/o.mp3", waveform_peaks=cls.PEAKS)
+        cls.private = Song.objects.create(
+            owner=cls.artist, title="draft", audio="audio/d.mp3", is_public=False, waveform_peaks=cls.PEAKS
+        )
+
+    def get(self, song, client=None, **kwargs):
+        return (client or self.client).get(f"/api/songs/{song.pk}/waveform/", {"level": 1}, **kwargs)
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.get(self.public)
+        self.assertEqual(response.content, bytes(range(4, 12)))
+        self.assertEqual(response["X-Waveform-Buckets"], "4")
+
+    def test_revalidated_not_cached_for_a_month(self):
+        response = self.get(self.public)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        again = self.get(self.public, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], response["ETag"])
+
+    def test_private_song_is_never_public(self):
+        owner = APIClient()
+        owner.force_authenticate(self.artist)
+        response = self.get(self.private, owner)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("public", response["Cache-Control"])
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        # anyone else holding the tag still gets nothing
+        self.assertEqual(self.get(self.private, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 404)
+
+
+class RangeRequestTests(SimpleTestCase):
+    """utils.serve_audio_with_range: 206, 200, 304 and 416 by RFC 9110."""
+
+    DATA = bytes(range(100))
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = self.write("a.mp3", self.DATA)
+        self.factory = RequestFactory()
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def serve(self, path=None, **headers):
+        response = utils.serve_audio_with_range(self.factory.get("/media/a.mp3", **headers), path or self.path)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def assertPartial(self, header, start, end):
+        response, body = self.serve(HTTP_RANGE=header)
+        self.assertEqual(response.status_code, 206, header)
+        self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/100")
+        self.assertEqual(response["Content-Length"], str(end - start + 1))
+        self.assertEqual(body, self.DATA[start: end + 1])
+
+    def assertWhole(self, response, body):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.DATA)
+        self.assertNotIn("Content-Range", response)
+
+    def test_ranges(self):
+        self.assertPartial("bytes=10-19", 10, 19)
+        self.assertPartial("bytes=90-", 90, 99)  # open end
+        self.assertPartial("bytes=-5", 95, 99)  # suffix
+        self.assertPartial("bytes=-500", 0, 99)  # suffix longer than the file
+        self.assertPartial("bytes=95-500", 95, 99)  # end clamped
+        self.assertPartial("bytes=7-7", 7, 7)
+
+    def test_invalid_or_unsupported_range_sends_everything(self):
+        for header in ("bytes=5-2", "bytes=-", "items=0-5", "bytes=0-1,5-6", "bytes=a-b"):
+            with self.subTest(header):
+                self.assertWhole(*self.serve(HTTP_RANGE=header))
+
+    def test_unsatisfiable_range(self):
+        for header in ("bytes=100-", "bytes=200-300", "bytes=-0"):
+            with self.subTest(header):
+                response, _ = self.serve(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response["Content-Range"], "bytes */100")
+
+    def test_suffix_of_an_empty_file(self):
+        response, _ = self.serve(self.write("empty.mp3", b""), HTTP_RANGE="bytes=-5")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */0")
+
+    def test_if_range(self):
+        first, _ = self.serve()
+        response, body = self.serve(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=first["ETag"])
+        self.assertEqual((response.status_code, body), (206, self.DATA[:10]))
+        response, body = self.serve(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 206)
+        # the file changed since: the whole new version, not a piece of it
+        self.assertWhole(*self.serve(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"'))
+        self.assertWhole(*self.serve(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE="Mon, 01 Jan 2001 00:00:00 GMT"))
+
+    def test_not_modified(self):
+        first, _ = self.serve()
+        response, body = self.serve(HTTP_IF_NONE_MATCH=first["ETag"], HTTP_RANGE="bytes=0-9")
+        self.assertEqual((response.status_code, body), (304, b""))
+        self.assertEqual(response["ETag"], first["ETag"])
+        self.assertEqual(self.serve(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])[0].status_code, 304)
+
+
+class ServeAudioTests(TestCase):
+    """/media/audio/...: who gets a stored file, and how it is delivered."""
+
+    PUBLIC = "audio/blobs/aa/open.mp3"
+    PRIVATE = "audio/blobs/bb/draft.mp3"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+        cls.other = User.objects.create_user("other", role=User.Roles.ARTIST)
+        Song.objects.create(owner=cls.artist, title="open", audio=cls.PUBLIC)
+        Song.objects.create(owner=cls.artist, title="draft", audio=cls.PRIVATE, is_public=False)
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.rendition = transcode.rendition_dir(self.PRIVATE) + "/aac_128.m4a"
+        self.playlist = transcode.rendition_dir(self.PRIVATE) + "/hls/index.m3u8"
+        for name, data in (
+            (self.PUBLIC, b"open"), (self.PRIVATE, b"draft"), (self.rendition, b"m4a"),
+            (self.playlist, b"#EXTM3U\nseg0.ts\n"),
+        ):
+            os.makedirs(os.path.dirname(os.path.join(media, name)), exist_ok=True)
+            with open(os.path.join(media, name), "wb") as f:
+                f.write(data)
+
+    def get(self, name, user=None, **params):
+        headers = {}
+        if user is not None:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {RefreshToken.for_user(user).access_token}"
+        response = self.client.get(f"/media/{name}", params, **headers)
+        if response.streaming:
+            response.body = b"".join(response.streaming_content)
+            response.close()
+        return response
+
+    def signed(self, name, expires=None):
+        expires = expires or int(time.time()) + 600
+        return {"exp": expires, "sig": utils.audio_signature(name, expires)}
+
+    def test_public(self):
+        response = self.get(self.PUBLIC)
+        self.assertEqual((response.status_code, response.body), (200, b"open"))
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+
+    def test_private_is_hidden(self):
+        self.assertEqual(self.get(self.PRIVATE).status_code, 404)
+        self.assertEqual(self.get(self.PRIVATE, self.other).status_code, 404)
+        self.assertEqual(self.get(self.PRIVATE, **self.signed(self.PUBLIC)).status_code, 404)
+
+    def test_owner_token(self):
+        response = self.get(self.PRIVATE, self.artist)
+        self.assertEqual((response.status_code, response.body), (200, b"draft"))
+        self.assertEqual(response["Cache-Control"], "private, max-age=3600")
+
+    def test_signed_url(self):
+        url = utils.sign_audio_url(f"/media/{self.PRIVATE}", self.PRIVATE)
+        response = self.client.get(url)
+        self.assertEqual(b"".join(response.streaming_content), b"draft")
+        response.close()
+        self.assertRegex(response["Cache-Control"], r"^public, max-age=\d+$")
+
+    def test_expired_signature(self):
+        self.assertEqual(self.get(self.PRIVATE, **self.signed(self.PRIVATE, int(time.time()) - 1)).status_code, 404)
+        self.assertEqual(self.get(self.PRIVATE, exp=int(time.time()) + 600, sig="forged").status_code, 404)
+
+    def test_shared_blob_is_open_if_any_song_is_public(self):
+        Song.objects.create(owner=self.other, title="same file", audio=self.PRIVATE)
+        self.assertEqual(self.get(self.PRIVATE).status_code, 200)
+
+    def test_renditions_follow_their_source(self):
+        self.assertEqual(transcode.rendition_source(self.rendition), self.PRIVATE)
+        self.assertEqual(self.get(self.rendition).status_code, 404)
+        self.assertEqual(self.get(self.rendition, self.other).status_code, 404)
+        self.assertEqual(self.get(self.rendition, self.artist).body, b"m4a")
+        # the source's signature opens its renditions, and the playlist passes it on to segments
+        self.assertEqual(self.get(self.rendition, **self.signed(self.PRIVATE)).body, b"m4a")
+        playlist = self.get(self.playlist, **self.signed(self.PRIVATE))
+        self.assertRegex(playlist.content.decode(), r"\nseg0\.ts\?exp=\d+&sig=")
+
+    def test_parent_segments_are_refused(self):
+        request = RequestFactory().get("/")
+        for name in ("audio/../settings.py", f"{transcode.RENDITIONS_PREFIX}blobs/bb/draft.mp3/../../../../db.sqlite3"):
+            with self.subTest(name), self.assertNumQueries(0), self.assertRaises(Http404):
+                views.serve_audio(request, name)
+
+    def test_missing_file(self):
+        os.remove(os.path.join(settings.MEDIA_ROOT, self.PUBLIC))
+        self.assertEqual(self.get(self.PUBLIC).status_code, 404)
+
+    def test_offloaded_delivery(self):
+        with override_settings(AUDIO_DELIVERY="x-accel-redirect", AUDIO_ACCEL_REDIRECT_LOCATION="/protected/"):
+            response = self.get(self.PRIVATE, self.artist)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected/{self.PRIVATE}")
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["Cache-Control"], "private, max-age=3600")
+
+        with override_settings(AUDIO_DELIVERY="x-sendfile"):
+            response = self.get(self.PUBLIC)
+        self.assertEqual(response["X-Sendfile"], os.path.join(settings.MEDIA_ROOT, self.PUBLIC))
+        self.assertEqual(response["Content-Type"], "audio/mpeg")
+
+
+@override_settings(SONG_CACHE_TIMEOUT=0)
+class SearchTests(TestCase):
+    """?search= on /api/songs/: FTS5 ranking, index upkeep and the LIKE fallback."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user("nightdrive", role=User.Roles.ARTIST)
+        cls.in_title = Song.objects.create(owner=cls.artist, title="Deep House Sunrise", genre="house", audio="audio/1.mp3")
+        cls.in_text = Song.objects.create(
+            owner=cls.artist, title="Untitled", genre="techno", audio="audio/2.mp3",
+            description="a deep cut from the house sessions",
+        )
+        cls.other = Song.objects.create(owner=cls.artist, title="Ambient Rain", genre="ambient", audio="audio/3.mp3")
+
+    def search(self, q):
+        response = self.client.get("/api/songs/", {"search": q})
+        self.assertEqual(response.status_code, 200)
+        return [s["id"] for s in response.json()["results"]]
+
+    def test_backend_is_fts5(self):
+        self.assertEqual(search.backend(), "fts5")
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search("sunr"), [self.in_title.pk])
+        self.assertEqual(self.search("hou sunr"), [self.in_title.pk])  # every word must match
+        self.assertEqual(self.search("amb"), [self.other.pk])
+        self.assertEqual(self.search("zzz"), [])
+
+    def test_title_outranks_description(self):
+        self.assertEqual(self.search("deep house"), [self.in_title.pk, self.in_text.pk])
+
+    def test_genre_tag(self):
+        self.assertEqual(self.search("deep #techno"), [self.in_text.pk])
+        self.assertEqual(self.search("#house"), [self.in_title.pk])
+
+    def test_owner_name(self):
+        self.assertEqual(sorted(self.search("nightdr")), sorted([self.in_title.pk, self.in_text.pk, self.other.pk]))
+
+    def test_index_follows_saves_and_deletes(self):
+        self.other.title = "Forest Dub"
+        self.other.save()
+        self.assertEqual(self.search("fore"), [self.other.pk])
+        self.assertEqual(self.search("rain"), [])
+        self.other.delete()
+        self.assertEqual(self.search("fore"), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {search.FTS_TABLE} WHERE rowid = %s", [self.other.pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_counter_updates_skip_the_index(self):
+        with mock.patch.object(search, "index_songs") as index:
+            self.other.plays = 5
+            self.other.save(update_fields=["plays"])
+        index.assert_not_called()
+
+    def test_index_follows_owner_rename(self):
+        self.artist.username = "daybreak"
+        self.artist.save()
+        self.assertEqual(len(self.search("daybr")), 3)
+        self.assertEqual(self.search("nightdr"), [])
+
+    def test_like_fallback(self):
+        with mock.patch.dict(search._available, {"default": None}):
+            self.assertEqual(self.search("sunrise"), [self.in_title.pk])
+            self.assertEqual(sorted(self.search("deep house")), sorted([self.in_title.pk, self.in_text.pk]))
+            self.assertEqual(self.search("deep #techno"), [self.in_text.pk])
+            self.assertEqual(len(self.search("nightdrive")), 3)
+
+
+class CounterSignalTests(TestCase):
+    """m2m edits keep follower/following and like counters exact; reconcile_counts repairs drift."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.a, cls.b, cls.c = (User.objects.create_user(name, role=User.Roles.ARTIST) for name in "abc")
+        cls.songs = [Song.objects.create(owner=cls.a, title=f"s{i}", audio=f"audio/{i}.mp3") for i in range(3)]
+
+    def follows(self):
+        return {
+            u.username: (u.follower_count, u.following_count)
+            for u in User.objects.filter(pk__in=[self.a.pk, self.b.pk, self.c.pk])
+        }
+
+    def likes(self):
+        return [s.likes_count for s in Song.objects.filter(pk__in=[s.pk for s in self.songs]).order_by("pk")]
+
+    def test_follow_add_remove_clear(self):
+        self.a.following.add(self.b, self.c)
+        self.a.following.add(self.b)  # already there: no double count
+        self.assertEqual(self.follows(), {"a": (0, 2), "b": (1, 0), "c": (1, 0)})
+        self.a.following.remove(self.b, self.b)
+        self.a.following.remove(self.b)  # not there any more
+        self.assertEqual(self.follows(), {"a": (0, 1), "b": (0, 0), "c": (1, 0)})
+        self.b.following.add(self.c)
+        self.a.following.clear()
+        self.assertEqual(self.follows(), {"a": (0, 0), "b": (0, 1), "c": (1, 0)})
+
+    def test_follow_reverse_side(self):
+        self.c.followers.add(self.a, self.b)
+        self.assertEqual(self.follows(), {"a": (0, 1), "b": (0, 1), "c": (2, 0)})
+        self.c.followers.remove(self.a)
+        self.assertEqual(self.follows(), {"a": (0, 0), "b": (0, 1), "c": (1, 0)})
+        self.a.following.add(self.b)
+        self.c.followers.clear()
+        self.assertEqual(self.follows(), {"a": (0, 1), "b": (1, 0), "c": (0, 0)})
+
+    def test_like_add_remove_clear(self):
+        s0, s1, s2 = self.songs
+        s0.likes.add(self.a, self.b)
+        s0.likes.add(self.b)
+        s1.likes.add(self.c)
+        self.assertEqual(self.likes(), [2, 1, 0])
+        s0.likes.remove(self.a)
+        self.assertEqual(self.likes(), [1, 1, 0])
+        s0.likes.clear()
+        self.assertEqual(self.likes(), [0, 1, 0])
+
+    def test_like_reverse_side(self):
+        s0, s1, s2 = self.songs
+        self.b.liked_songs.add(s0, s1, s2)
+        self.c.liked_songs.add(s1)
+        self.assertEqual(self.likes(), [1, 2, 1])
+        self.b.liked_songs.remove(s2)
+        self.assertEqual(self.likes(), [1, 2, 0])
+        self.b.liked_songs.clear()
+        self.assertEqual(self.likes(), [0, 1, 0])
+
+    def test_reconcile_counts_fixes_drift(self):
+        self.a.following.add(self.b)
+        self.songs[0].likes.add(self.b, self.c)
+        User.objects.filter(pk=self.b.pk).update(follower_count=7, following_count=3)
+        Song.objects.filter(pk=self.songs[0].pk).update(likes_count=0)
+        Song.objects.filter(pk=self.songs[1].pk).update(likes_count=4)
+        call_command("reconcile_counts", chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(self.follows(), {"a": (0, 1), "b": (1, 0), "c": (0, 0)})
+        self.assertEqual(self.likes(), [2, 0, 0])
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=2)
+class FeedTests(TestCase):
+    """Fan-out for small artists, read-time merge for big ones, and artists crossing the limit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = User.objects.create_user("small", role=User.Roles.ARTIST)
+        cls.big = User.objects.create_user("big", role=User.Roles.ARTIST)
+        cls.fans = [User.objects.create_user(f"fan{i}") for i in range(3)]
+        cls.small.followers.add(*cls.fans[:2])
+        cls.big.followers.add(*cls.fans)
+
+    def upload(self, owner, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Song.objects.create(owner=owner, title=title, audio=f"audio/{title}.mp3")
+
+    def feed(self, user, page_size=20):
+        client = APIClient()
+        client.force_authenticate(user)
+        ids, url = [], f"/api/feed/?page_size={page_size}"
+        while url:
+            data = client.get(url).json()
+            ids += [s["id"] for s in data["results"]]
+            url = data["next"]
+        return ids
+
+    def timeline(self, user):
+        return set(TimelineEntry.objects.filter(user=user).values_list("song_id", flat=True))
+
+    def test_small_artist_is_pushed(self):
+        song = self.upload(self.small, "push")
+        self.assertEqual(set(TimelineEntry.objects.filter(song=song).values_list("user_id", flat=True)),
+                         {self.fans[0].pk, self.fans[1].pk})
+        self.assertEqual(self.feed(self.fans[0]), [song.pk])
+        self.assertEqual(self.feed(self.fans[2]), [])
+
+    def test_big_artist_is_merged_on_read(self):
+        a = self.upload(self.small, "a")
+        b = self.upload(self.big, "b")
+        c = self.upload(self.small, "c")
+        self.assertFalse(TimelineEntry.objects.filter(song=b).exists())
+        self.assertEqual(self.feed(self.fans[0]), [c.pk, b.pk, a.pk])
+        self.assertEqual(self.feed(self.fans[0], page_size=1), [c.pk, b.pk, a.pk])
+        self.assertEqual(self.feed(self.fans[2]), [b.pk])
+
+    def test_private_songs_stay_out(self):
+        song = self.upload(self.small, "draft")
+        song.is_public = False
+        song.save()
+        hidden = Song.objects.create(owner=self.big, title="hidden", audio="audio/h.mp3", is_public=False)
+        self.assertEqual(self.feed(self.fans[0]), [])
+        self.assertFalse(TimelineEntry.objects.filter(song__in=[song, hidden]).exists())
+
+    def test_dropping_to_the_limit_backfills(self):
+        merged = self.upload(self.big, "while big")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fans[2].following.remove(self.big)
+        self.assertEqual(User.objects.get(pk=self.big.pk).follower_count, 2)
+        for fan in self.fans[:2]:
+            self.assertIn(merged.pk, self.timeline(fan))
+            self.assertEqual(self.feed(fan), [merged.pk])
+        self.assertEqual(self.feed(self.fans[2]), [])
+
+    def test_dropping_below_the_limit_from_the_artist_side(self):
+        merged = self.upload(self.big, "while big")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.big.followers.remove(self.fans[1], self.fans[2])
+        self.assertEqual(self.timeline(self.fans[0]), {merged.pk})
+        self.assertEqual(self.feed(self.fans[0]), [merged.pk])
+
+    def test_staying_above_the_limit_backfills_nothing(self):
+        self.big.followers.add(self.small)
+        self.upload(self.big, "while big")
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(feed, "on_shrink") as shrink:
+            self.small.following.remove(self.big)
+        shrink.assert_not_called()
+
+    def test_growing_past_the_limit(self):
+        pushed = self.upload(self.small, "pushed")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.small.followers.add(self.fans[2])
+        merged = self.upload(self.small, "merged")
+        self.assertFalse(TimelineEntry.objects.filter(song=merged).exists())
+        # the old entries and the live read overlap: each song once
+        self.assertEqual(self.feed(self.fans[0]), [merged.pk, pushed.pk])
+        self.assertEqual(self.feed(self.fans[2]), [merged.pk, pushed.pk])
+
+
+@override_settings(SONG_CACHE_TIMEOUT=60)
+class ResponseCacheTests(TestCase):
+    """Anonymous song reads are cached until a change commits; signed-in reads never are."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+        cls.listener = User.objects.create_user("listener")
+        cls.song = Song.objects.create(owner=cls.artist, title="first", audio="audio/1.mp3")
+        cls.other = Song.objects.create(owner=cls.artist, title="second", audio="audio/2.mp3")
+
+    def setUp(self):
+        cache.clear()
+
+    def list(self, client=None):
+        return (client or self.client).get("/api/songs/")
+
+    def detail(self):
+        return self.client.get(f"/api/songs/{self.song.pk}/")
+
+    def assertBumped(self, change):
+        """Both entries are HITs before `change`, and no longer after it commits; returns the fresh (list, detail)."""
+        for read in (self.list, self.detail):
+            read()
+            self.assertEqual(read()["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        fresh = self.list(), self.detail()
+        self.assertEqual(fresh[0]["X-Cache"], "MISS")
+        self.assertNotEqual(fresh[1].get("X-Cache"), "HIT")
+        return [r.json() for r in fresh]
+
+    def test_save(self):
+        def rename():
+            self.song.title = "renamed"
+            self.song.save()
+        page, detail = self.assertBumped(rename)
+        self.assertIn("renamed", [s["title"] for s in page["results"]])
+        self.assertEqual(detail["title"], "renamed")
+
+    def test_delete(self):
+        page, _ = self.assertBumped(self.song.delete)
+        self.assertEqual([s["id"] for s in page["results"]], [self.other.pk])
+        self.assertEqual(self.detail().status_code, 404)
+
+    def test_like_through_the_api(self):
+        client = APIClient()
+        client.force_authenticate(self.listener)
+        page, detail = self.assertBumped(lambda: client.post(f"/api/songs/{self.song.pk}/like/"))
+        self.assertEqual(detail["likes_count"], 1)
+
+    def test_like_through_the_m2m(self):
+        _, detail = self.assertBumped(lambda: self.song.likes.add(self.listener))
+        self.assertEqual(detail["likes_count"], 1)
+
+    def test_owner_rename(self):
+        def rename():
+            self.artist.username = "renamed"
+            self.artist.save()
+        page, detail = self.assertBumped(rename)
+        self.assertEqual({s["owner"]["username"] for s in page["results"]}, {"renamed"})
+        self.assertEqual(detail["owner"]["username"], "renamed")
+
+    def test_signed_in_reads_are_not_cached(self):
+        client = APIClient()
+        client.force_authenticate(self.listener)
+        self.assertNotIn("X-Cache", self.list(client))
+        self.assertNotIn("X-Cache", self.list(client))
+        self.assertEqual(self.list()["X-Cache"], "MISS")  # nothing was stored for the anonymous key either
+
+    def test_stale_until_commit(self):
+        self.list()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.song.title = "uncommitted"
+            self.song.save()
+        # a reader racing the write still gets the old page, and can't re-cache the new one early
+        response = self.list()
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertNotIn("uncommitted", [s["title"] for s in response.json()["results"]])
+        for callback in callbacks:
+            callback()
+        response = self.list()
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIn("uncommitted", [s["title"] for s in response.json()["results"]])
+
+
+@override_settings(SONG_CACHE_TIMEOUT=0)
+class ConditionalGetTests(TestCase):
+    """ETag/304 on the song list, batch and charts (api.conditional)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+        cls.ann = User.objects.create_user("ann")
+        cls.bob = User.objects.create_user("bob")
+        cls.song = Song.objects.create(owner=cls.artist, title="one", audio="audio/1.mp3", plays=3)
+        cls.older = Song.objects.create(owner=cls.artist, title="two", audio="audio/2.mp3", plays=1)
+        Song.objects.filter(pk=cls.older.pk).update(created_at=timezone.now() - timedelta(days=1))
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assertRevalidates(self, url, client=None):
+        """200 with an ETag, then 304 for it; returns the tag."""
+        client = client or self.client
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+        again = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], etag)
+        self.assertIn("no-cache", again["Cache-Control"])
+        return etag
+
+    def assertChanged(self, url, etag, client=None):
+        response = (client or self.client).get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        return response["ETag"]
+
+    def test_list_like_and_edit(self):
+        etag = self.assertRevalidates("/api/songs/")
+        counters.add_like(self.song.pk, self.ann.pk)  # counter UPDATE, updated_at untouched
+        etag = self.assertChanged("/api/songs/", etag)
+        self.song.title = "edited"
+        self.song.save()
+        self.assertChanged("/api/songs/", etag)
+
+    def test_list_next_link(self):
+        url = "/api/songs/?page_size=2"
+        etag = self.assertRevalidates(url)
+        # same two rows on the page, but now there is a page after it
+        third = Song.objects.create(owner=self.artist, title="three", audio="audio/3.mp3")
+        Song.objects.filter(pk=third.pk).update(created_at=timezone.now() - timedelta(days=2))
+        self.assertChanged(url, etag)
+        self.assertIsNotNone(self.client.get(url).json()["next"])
+
+    def test_liked_by_me_per_user(self):
+        counters.add_like(self.song.pk, self.bob.pk)
+        ann, bob = self.client_for(self.ann), self.client_for(self.bob)
+        ann_tag = self.assertRevalidates("/api/songs/", ann)
+        bob_tag = self.assertRevalidates("/api/songs/", bob)
+        self.assertNotEqual(ann_tag, bob_tag)
+        # one user's tag is no good for the other's page
+        self.assertEqual(bob.get("/api/songs/", HTTP_IF_NONE_MATCH=ann_tag).status_code, 200)
+
+        # likes_count stays 1, but ann's liked_by_me flips
+        counters.remove_like(self.song.pk, self.bob.pk)
+        counters.add_like(self.song.pk, self.ann.pk)
+        self.assertEqual(Song.objects.get(pk=self.song.pk).likes_count, 1)
+        self.assertChanged("/api/songs/", ann_tag, ann)
+        self.assertChanged("/api/songs/", bob_tag, bob)
+
+    def test_batch(self):
+        url = f"/api/songs/batch/?ids={self.song.pk},{self.older.pk},999999"
+        etag = self.assertRevalidates(url)
+        Song.objects.filter(pk=self.older.pk).update(plays=2)
+        etag = self.assertChanged(url, etag)
+        counters.add_like(self.song.pk, self.ann.pk)
+        self.assertChanged(url, etag)
+
+    def test_charts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            charts.build()
+        etag = self.assertRevalidates("/api/charts/")
+        Song.objects.filter(pk=self.older.pk).update(plays=50)
+        with self.captureOnCommitCallbacks(execute=True):
+            charts.build()
+        etag = self.assertChanged("/api/charts/", etag)
+        self.song.title = "edited"
+        self.song.save()
+        self.assertChanged("/api/charts/", etag)
+
+
+@override_settings(SONG_CACHE_TIMEOUT=0)
+class ServerTimingTests(TestCase):
+    """Server-Timing (api.metrics) only reaches staff, unless PERF_SERVER_TIMING is on."""
+
+    def get(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.get("/api/songs/")
+
+    def test_hidden_from_visitors(self):
+        self.assertNotIn("Server-Timing", self.get())
+        self.assertNotIn("Server-Timing", self.get(User.objects.create_user("listener")))
+
+    def test_staff(self):
+        response = self.get(User.objects.create_user("ops", is_staff=True))
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries"')
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_setting(self):
+        self.assertIn("total;dur=", self.get()["Server-Timing"])
+
+
+class AudioBlobTests(TestCase):
+    """Content-addressed uploads (api.uploads): sharing, swapping and releasing blobs."""
+
+    MP3 = b"ID3" + bytes(range(256)) * 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user("artist", role=User.Roles.ARTIST)
+        cls.other = User.objects.create_user("other", role=User.Roles.ARTIST)
+
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, user, data=MP3, title="song"):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/songs/", {"title": title, "audio": SimpleUploadedFile("a.mp3", data)})
+        self.assertEqual(response.status_code, 202, response.content)
+        return Song.objects.select_related("blob").get(pk=response.json()["id"])
+
+    def path(self, name):
+        return os.path.join(self.media, name)
+
+    def add_rendition(self, blob):
+        rendition = self.path(transcode.rendition_dir(blob.file.name) + "/aac_128.m4a")
+        os.makedirs(os.path.dirname(rendition))
+        with open(rendition, "wb") as f:
+            f.write(b"m4a")
+        return os.path.dirname(rendition)
+
+    def delete(self, song):
+        with self.captureOnCommitCallbacks(execute=True):
+            song.delete()
+
+    def test_identical_uploads_share_one_blob(self):
+        a = self.upload(self.artist)
+        b = self.upload(self.other)
+        self.assertEqual(AudioBlob.objects.count(), 1)
+        self.assertEqual((a.blob_id, a.audio.name), (b.blob_id, b.audio.name))
+        self.assertEqual(AudioBlob.objects.get().ref_count, 2)
+        self.assertEqual(a.blob.sha256, hashlib.sha256(self.MP3).hexdigest())
+        self.assertTrue(a.audio.name.startswith("audio/blobs/"))
+        self.assertNotEqual(self.upload(self.artist, self.MP3 + b"x").blob_id, a.blob_id)
+
+    def test_last_release_deletes_file_and_renditions(self):
+        a = self.upload(self.artist)
+        b = self.upload(self.other)
+        renditions = self.add_rendition(a.blob)
+        self.delete(a)
+        self.assertEqual(AudioBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(self.path(b.audio.name)))
+        self.delete(b)
+        self.assertFalse(AudioBlob.objects.exists())
+        self.assertFalse(os.path.exists(self.path(b.audio.name)))
+        self.assertFalse(os.path.exists(renditions))
+
+    def test_files_outlive_a_release_when_the_bytes_come_back(self):
+        song = self.upload(self.artist)
+        name = song.audio.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            song.delete()
+            # uploaded again before the release committed: same name, file reused
+            Song.objects.create(owner=self.other, title="again", audio=name,
+                                blob=uploads.store_audio(SimpleUploadedFile("b.mp3", self.MP3))[0])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(AudioBlob.objects.get().file.name, name)
+        self.assertTrue(os.path.exists(self.path(name)))
+
+    def test_replacing_the_audio_swaps_blobs(self):
+        song = self.upload(self.artist)
+        kept = self.upload(self.other, title="same bytes")
+        old = song.blob
+        client = APIClient()
+        client.force_authenticate(self.artist)
+
+        def replace(data):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.patch(f"/api/songs/{song.pk}/", {"audio": SimpleUploadedFile("b.mp3", data)})
+            self.assertEqual(response.status_code, 200, response.content)
+            return Song.objects.select_related("blob").get(pk=song.pk)
+
+        song = replace(self.MP3 + b"new")
+        self.assertNotEqual(song.blob_id, old.pk)
+        self.assertEqual(song.audio.name, song.blob.file.name)
+        self.assertEqual(AudioBlob.objects.get(pk=old.pk).ref_count, 1)  # still used by `kept`
+        self.assertTrue(os.path.exists(self.path(kept.audio.name)))
+
+        first = song.blob
+        song = replace(self.MP3 + b"newer")
+        self.assertFalse(AudioBlob.objects.filter(pk=first.pk).exists())
+        self.assertFalse(os.path.exists(self.path(first.file.name)))
+
+    def test_known_analysis_is_reused(self):
+        first = self.upload(self.artist)
+        self.assertEqual(first.processing_status, Song.ProcessingStatus.PENDING)
+        self.assertIsNone(uploads.known_analysis(first.blob))
+        analysis = {"duration_seconds": 61, "waveform_data": [0.5, 1.0], "waveform_peaks": b"LWF1",
+                    "renditions": [{"name": "x", "codec": "aac", "bitrate": 128, "mime": "audio/mp4", "size": 3}]}
+        processing.mark_ready(first.pk, analysis, first.blob_id)
+
+        second = self.upload(self.other)
+        self.assertEqual(second.processing_status, Song.ProcessingStatus.READY)
+        self.assertEqual(
+            (second.duration_seconds, second.waveform_data, bytes(second.waveform_peaks), second.renditions),
+            (61, [0.5, 1.0], b"LWF1", analysis["renditions"]),
+        )
+        # a finished job with nothing to show still counts as analysed
+        AudioBlob.objects.filter(pk=first.blob_id).update(renditions=[], duration_seconds=None)
+        self.assertEqual(self.upload(self.artist).processing_status, Song.ProcessingStatus.READY)
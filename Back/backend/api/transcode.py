@@ -0,0 +1,106 @@
+"""
+Compressed streaming renditions of an upload.
+
+Runs inside the upload-processing pool (api.audio.process), so it stays free
+of Django imports. Every encode is one ffmpeg run pinned to a single thread
+reading the original from disk, which keeps SONG_PROCESSING_CONCURRENCY an
+actual bound on CPU use.
+
+Renditions of audio/<path> live under audio/renditions/<path>/, next to
+each other and shared by every song using the same stored file:
+
+    opus_128.opus, aac_128.m4a, ...   one file per (codec, kbps)
+    hls/index.m3u8                    master playlist (AUDIO_HLS)
+    hls/128.m3u8, hls/128_000.ts ...  one AAC variant per bitrate
+"""
+import os
+import subprocess
+
+from .waveform import _ffmpeg_binary
+
+RENDITIONS_PREFIX = "audio/renditions/"
+
+# codec: (extension, ffmpeg muxer, mime type, encoder args)
+CODECS = {
+    "opus": (".opus", "opus", 'audio/ogg; codecs="opus"', ["-c:a", "libopus", "-vbr", "on"]),
+    "aac": (".m4a", "ipod", 'audio/mp4; codecs="mp4a.40.2"', ["-c:a", "aac", "-movflags", "+faststart"]),
+}
+HLS_MIME = "application/vnd.apple.mpegurl"
+HLS_SEGMENT_SECONDS = 6
+# a 50 MB lossless upload encodes in well under a minute; anything longer is stuck
+ENCODE_TIMEOUT = 600
+
+
+def rendition_dir(audio_name):
+    """Storage directory for the renditions of the stored file `audio_name`."""
+    return RENDITIONS_PREFIX + audio_name.removeprefix("audio/")
+
+
+def rendition_source(name):
+    """The stored audio file a name under rendition_dir() belongs to, or None."""
+    if not name.startswith(RENDITIONS_PREFIX):
+        return None
+    rel = name[len(RENDITIONS_PREFIX):]
+    rel = rel.split("/hls/", 1)[0] if "/hls/" in rel else rel.rpartition("/")[0]
+    return f"audio/{rel}" if rel else None
+
+
+def _ffmpeg(*args):
+    cmd = [_ffmpeg_binary(), "-v", "error", "-nostdin", "-y", *args]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=ENCODE_TIMEOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.decode(errors='replace').strip()[:500]}")
+
+
+def encode(source_path, out_dir, codec, kbps):
+    ext, muxer, mime, codec_args = CODECS[codec]
+    filename = f"{codec}_{kbps}{ext}"
+    final = os.path.join(out_dir, filename)
+    partial = os.path.join(out_dir, f".{filename}.part")
+    _ffmpeg(
+        "-i", source_path, "-vn", "-map_metadata", "-1", "-threads", "1",
+        *codec_args, "-b:a", f"{kbps}k", "-f", muxer, partial,
+    )
+    os.replace(partial, final)  # readers never see a half-written file
+    return {"codec": codec, "bitrate": kbps, "file": filename, "mime": mime, "size": os.path.getsize(final)}
+
+
+def encode_hls(source_path, out_dir, bitrates):
+    """AAC HLS variants at `bitrates` plus a master playlist listing them."""
+    hls_dir = os.path.join(out_dir, "hls")
+    os.makedirs(hls_dir, exist_ok=True)
+    master = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for kbps in bitrates:
+        _ffmpeg(
+            "-i", source_path, "-vn", "-map_metadata", "-1", "-threads", "1",
+            "-c:a", "aac", "-b:a", f"{kbps}k",
+            "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(hls_dir, f"{kbps}_%03d.ts"),
+            os.path.join(hls_dir, f"{kbps}.m3u8"),
+        )
+        master += [f'#EXT-X-STREAM-INF:BANDWIDTH={kbps * 1000},CODECS="mp4a.40.2"', f"{kbps}.m3u8"]
+    with open(os.path.join(hls_dir, "index.m3u8"), "w") as f:
+        f.write("\n".join(master) + "\n")
+    return {"codec": "hls", "bitrate": None, "file": "hls/index.m3u8", "mime": HLS_MIME, "size": None}
+
+
+def transcode(source_path, out_dir, renditions, hls=False):
+    """
+    Encode each (codec, kbps) of `renditions` from source_path into out_dir.
+    Returns (made, errors): one failed encode doesn't stop the others, and
+    the original stays playable whatever fails.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    made, errors = [], []
+    for codec, kbps in renditions:
+        try:
+            made.append(encode(source_path, out_dir, codec, kbps))
+        except Exception as exc:
+            errors.append(f"{codec}_{kbps}: {type(exc).__name__}: {exc}")
+    if hls:
+        bitrates = sorted({kbps for codec, kbps in renditions if codec == "aac"}) or [128]
+        try:
+            made.append(encode_hls(source_path, out_dir, bitrates))
+        except Exception as exc:
+            errors.append(f"hls: {type(exc).__name__}: {exc}")
+    return made, errors
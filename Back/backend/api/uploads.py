@@ -0,0 +1,152 @@
+"""
+Content-addressed audio storage.
+
+HashingUploadHandler (settings.FILE_UPLOAD_HANDLERS) hashes every upload
+while Django streams it to a temporary file, and keeps its first bytes so
+the real format can be sniffed from magic numbers instead of trusting the
+file name.
+
+store_audio() puts the bytes at audio/blobs/ab/cd/<sha256>.<ext> unless a
+blob with that hash already exists. Songs hold a counted reference
+(AudioBlob.ref_count); release() drops it, and the last release deletes the
+blob, its file and its renditions.
+"""
+import hashlib
+import logging
+import shutil
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import transcode
+from .models import AudioBlob, blob_upload_to
+
+logger = logging.getLogger(__name__)
+
+HEAD_BYTES = 64
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """TemporaryFileUploadHandler that also computes SHA-256 and keeps the head of the file."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._sha256 = hashlib.sha256()
+        self._head = b""
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha256.update(raw_data)
+        if len(self._head) < HEAD_BYTES:
+            self._head += raw_data[: HEAD_BYTES - len(self._head)]
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self._sha256.hexdigest()
+        uploaded.head = self._head
+        return uploaded
+
+
+def sniff_audio_format(head):
+    """Container/codec from the first bytes: 'mp3', 'wav', 'flac', 'ogg', 'm4a', 'aac' or None."""
+    if head.startswith(b"ID3"):
+        return "mp3"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head.startswith(b"fLaC"):
+        return "flac"
+    if head.startswith(b"OggS"):
+        return "ogg"
+    if head[4:8] == b"ftyp":
+        return "m4a"
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # MPEG frame sync; layer bits 00 mean ADTS AAC
+        return "aac" if head[1] & 0x06 == 0 else "mp3"
+    return None
+
+
+def file_head(f):
+    head = getattr(f, "head", None)
+    if head is None:
+        f.seek(0)
+        head = f.read(HEAD_BYTES)
+        f.seek(0)
+    return head
+
+
+def file_sha256(f):
+    digest = getattr(f, "sha256", None)
+    if digest is None:  # not from HashingUploadHandler (tests, shell, commands)
+        h = hashlib.sha256()
+        f.seek(0)
+        for chunk in f.chunks():
+            h.update(chunk)
+        f.seek(0)
+        digest = h.hexdigest()
+    return digest
+
+
+def store_audio(f):
+    """
+    Blob for the uploaded file `f`, with one more reference taken.
+    Returns (blob, reused); call inside the transaction that creates the song.
+    """
+    digest = file_sha256(f)
+    while True:
+        blob = AudioBlob.objects.filter(sha256=digest).first()
+        reused = blob is not None
+        if blob is None:
+            fmt = sniff_audio_format(file_head(f)) or "bin"
+            blob = AudioBlob(sha256=digest, format=fmt, size=f.size)
+            name = blob_upload_to(blob, f"{digest}.{fmt}")
+            if blob.file.storage.exists(name):
+                # same hash, same bytes: left over from a rolled-back upload or a racing one
+                blob.file.name = name
+            else:
+                blob.file.save(name, f, save=False)
+            try:
+                with transaction.atomic():
+                    blob.save()
+            except IntegrityError:
+                # a concurrent upload of the same bytes won; go again and share its blob
+                continue
+        # 0 rows: the last reference was released in between and the blob is gone
+        if AudioBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1):
+            return blob, reused
+
+
+def release(blob_id):
+    """Drop one reference; the last one deletes the blob row and, after commit, its files."""
+    if blob_id is None:
+        return
+    AudioBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F("ref_count") - 1)
+    orphan = AudioBlob.objects.filter(pk=blob_id, ref_count=0).first()
+    if orphan is None:
+        return
+    digest, name, storage = orphan.sha256, orphan.file.name, orphan.file.storage
+    orphan.delete()
+
+    def delete_files():
+        # the same bytes may have been uploaded again since; store_audio then
+        # reused the file that is still on disk, so it must stay
+        if AudioBlob.objects.filter(sha256=digest).exists():
+            return
+        storage.delete(name)
+        shutil.rmtree(storage.path(transcode.rendition_dir(name)), ignore_errors=True)
+
+    transaction.on_commit(delete_files)
+    logger.info("Deleted unreferenced audio blob %s", name)
+
+
+def known_analysis(blob):
+    """Stored analysis and renditions of an already processed blob, as Song field values, or None."""
+    # renditions is written by every finished job (even as []); duration may stay unknown
+    if blob is None or blob.renditions is None:
+        return None
+    return {
+        "duration_seconds": blob.duration_seconds,
+        "waveform_data": blob.waveform_data,
+        "waveform_peaks": blob.waveform_peaks,
+        "renditions": blob.renditions,
+    }
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import RegisterView, MeView, LogoutView, UserSearchView, FollowView, UserDetailView, SongViewSet
+from .views import RegisterView, MeView, LogoutView, UserSearchView, FollowView, UserDetailView, SongViewSet, PlayStatsView, FeedView, SongCacheStatsView, ChartsView
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -17,5 +17,10 @@ urlpatterns = [
     path("users/<str:username>/follow/", FollowView.as_view(), name="user_follow"),
     path("users/<str:username>/", UserDetailView.as_view(), name="user_detail"),
 
+    path("feed/", FeedView.as_view(), name="feed"),
+    path("charts/", ChartsView.as_view(), name="charts"),
+    path("plays/stats/", PlayStatsView.as_view(), name="play_stats"),
+    path("cache/stats/", SongCacheStatsView.as_view(), name="song_cache_stats"),
+
     path("", include(router.urls)),
 ]
\ No newline at end of file
@@ -1,41 +1,213 @@
+import mimetypes
 import os
 import re
-from django.http import HttpResponse, HttpResponseNotModified, HttpResponseBadRequest
-from django.utils.http import http_date
-from wsgiref.util import FileWrapper
+import time
+from urllib.parse import quote
+from django.conf import settings
+from django.core.signing import Signer
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, parse_http_date_safe
+
+# bytes handed to the server per read; bounds memory per stream
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# mimetypes misses or varies on these across platforms
+AUDIO_CONTENT_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def audio_content_type(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    return AUDIO_CONTENT_TYPES.get(ext) or mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+
+def file_validators(stat):
+    """(ETag, Last-Modified timestamp) for a stat result; changes whenever the file does."""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"', int(stat.st_mtime)
+
+
+def parse_range(header, size):
+    """
+    Single byte range -> (start, end) inclusive, clamped to the file.
+    None means "no usable range, send everything" (absent, malformed, e.g.
+    bytes=5-2, or multi-range); raises ValueError when the range is valid
+    but can't be satisfied (RFC 9110 14.1.1).
+    """
+    m = RANGE_RE.match(header.replace(" ", ""))
+    if not m or m.group(1) == m.group(2) == "":
+        return None
+    first, last = m.groups()
+    if first == "":
+        # suffix range: last N bytes
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None  # invalid, so ignored rather than unsatisfiable
+    if start >= size:
+        raise ValueError("range outside file")
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get("HTTP_IF_RANGE", "").strip()
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+class RangeFile:
+    """
+    File object capped at `length` bytes from the current position.
+
+    read() stops at the end of the range, which is what runserver and any
+    plain iteration see. fileno() + the fd offset let servers with a
+    sendfile-capable wsgi.file_wrapper (gunicorn) push the range zero-copy,
+    bounded by the Content-Length we set.
+    """
+
+    def __init__(self, f, length):
+        self._f = f
+        self._remaining = length
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b""
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def close(self):
+        self._f.close()
 
 
 def serve_audio_with_range(request, file_path):
-    if not os.path.exists(file_path):
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
         return HttpResponseBadRequest("File not found")
 
-    file_size = os.path.getsize(file_path)
-    range_header = request.META.get('HTTP_RANGE', '').strip()
-    range_match = re.match(r'bytes=(\d+)-(\d*)', range_header)
+    size = stat.st_size
+    etag, last_modified = file_validators(stat)
 
-    if range_match:
-        start = int(range_match.group(1))
-        end = int(range_match.group(2)) if range_match.group(2) else file_size - 1
+    # If-None-Match / If-Modified-Since -> 304 before touching the file
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        conditional["ETag"] = etag
+        conditional["Last-Modified"] = http_date(last_modified)
+        return conditional
 
-        if start >= file_size or end >= file_size:
-            return HttpResponseBadRequest("Requested range not satisfiable")
+    byte_range = None
+    range_header = request.META.get("HTTP_RANGE", "").strip()
+    if range_header and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            response["Accept-Ranges"] = "bytes"
+            return response
 
+    f = open(file_path, "rb")
+    if byte_range:
+        start, end = byte_range
         length = end - start + 1
+        f.seek(start)
+        response = FileResponse(RangeFile(f, length), status=206, content_type=audio_content_type(file_path))
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        length = size
+        response = FileResponse(RangeFile(f, length), content_type=audio_content_type(file_path))
+
+    response.block_size = STREAM_BLOCK_SIZE
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "public, max-age=3600"
+    return response
+
+
+# --- signed audio URLs -------------------------------------------------------
+
+_audio_signer = Signer(salt="api.audio")
+
+
+def audio_signature(name, expires):
+    return _audio_signer.signature(f"{name}:{expires}")
+
+
+def sign_audio_url(url, name, ttl=None):
+    """
+    Append ?exp=&sig= granting access to the stored file `name` until exp.
+
+    exp is rounded up to a TTL window so everyone fetching the same song in
+    that window gets the same URL, which keeps it cacheable at the edge.
+    """
+    ttl = ttl or settings.AUDIO_SIGNED_URL_TTL
+    expires = (int(time.time()) // ttl + 2) * ttl
+    return f"{url}?exp={expires}&sig={audio_signature(name, expires)}"
+
+
+def check_audio_signature(request, name):
+    """Seconds the signed URL stays valid for, or None if missing/invalid/expired."""
+    try:
+        expires = int(request.GET.get("exp", ""))
+    except ValueError:
+        return None
+    remaining = expires - int(time.time())
+    if remaining <= 0:
+        return None
+    if not constant_time_compare(request.GET.get("sig", ""), audio_signature(name, expires)):
+        return None
+    return remaining
+
+
+def signed_playlist_response(request, file_path):
+    """
+    An HLS playlist whose entries carry the request's exp/sig, so the player's
+    relative fetches of variants and segments stay authorised.
+    """
+    query = f"exp={quote(request.GET['exp'])}&sig={quote(request.GET['sig'])}"
+    with open(file_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    body = "\n".join(line if not line or line.startswith("#") else f"{line}?{query}" for line in lines)
+    return HttpResponse(body + "\n", content_type=AUDIO_CONTENT_TYPES[".m3u8"])
 
-        with open(file_path, 'rb') as f:
-            f.seek(start)
-            data = f.read(length)
 
-        response = HttpResponse(data, status=206, content_type='audio/mpeg')
-        response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
-        response['Accept-Ranges'] = 'bytes'
-        response['Content-Length'] = str(length)
+def offload_audio_response(name, file_path):
+    """
+    Empty response telling the front proxy to send the file itself
+    (AUDIO_DELIVERY = "x-accel-redirect" for nginx, "x-sendfile" for Apache/lighttpd).
+    The proxy then handles Range, conditional requests and sendfile.
+    """
+    response = HttpResponse(content_type=audio_content_type(file_path))
+    if settings.AUDIO_DELIVERY == "x-accel-redirect":
+        location = settings.AUDIO_ACCEL_REDIRECT_LOCATION.rstrip("/")
+        response["X-Accel-Redirect"] = f"{location}/{quote(name)}"
     else:
-        with open(file_path, 'rb') as f:
-            wrapper = FileWrapper(f)
-            response = HttpResponse(wrapper, content_type='audio/mpeg')
-            response['Content-Length'] = str(file_size)
-            response['Accept-Ranges'] = 'bytes'
-
-    response['Cache-Control'] = 'public, max-age=3600'
-    return response
\ No newline at end of file
+        response["X-Sendfile"] = file_path
+    return response
@@ -4,18 +4,28 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
-from .serializers import RegisterSerializer, UserSerializer, PublicUserSerializer, SongSerializer
+from .serializers import RegisterSerializer, UserSerializer, PublicUserSerializer, SongSerializer, BulkLikeSerializer
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from django.shortcuts import get_object_or_404
 from .models import Song
 from .permissions import IsOwnerOrReadOnly
+from .pagination import SongCursorPagination
+from .search import FullTextSearchFilter
+from .db import ReplicaReadMixin
+from .auth import CachedBlacklistRefreshToken, CachedJWTAuthentication
 from django.utils.text import slugify
-from django.db.models import Q
-from django.http import Http404
+from django.db.models import Q, Exists, OuterRef, Value
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
 from django.conf import settings
 import re
 import os
-from .utils import serve_audio_with_range
+import base64
+import hashlib
+from . import charts, conditional, counters, feed, plays, response_cache, transcode, waveform
+from .utils import serve_audio_with_range, check_audio_signature, offload_audio_response, signed_playlist_response
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.urls import replace_query_param
 
 User = get_user_model()
 
@@ -40,7 +50,8 @@ class MeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        return Response(UserSerializer(request.user).data)
+        etag = conditional.user_etag(request, request.user.updated_at)
+        return conditional.respond(request, etag, lambda: Response(UserSerializer(request.user).data))
     
 
 class LogoutView(APIView):
@@ -51,13 +62,23 @@ class LogoutView(APIView):
         if not token_str:
             return Response({"detail": "Refresh token required."}, status=400)
         try:
-            RefreshToken(token_str).blacklist()
+            CachedBlacklistRefreshToken(token_str).blacklist()
         except Exception:
             return Response({"detail": "Invalid refresh token."}, status=400)
         return Response(status=205)
     
 
-class UserSearchView(ListAPIView):
+def _annotate_is_following(qs, request):
+    """One Exists() subquery instead of a followers lookup per serialized user."""
+    if not request.user.is_authenticated:
+        return qs.annotate(is_following=Value(False))
+    follows = User.following.through.objects.filter(
+        from_user_id=request.user.pk, to_user_id=OuterRef("pk")
+    )
+    return qs.annotate(is_following=Exists(follows))
+
+
+class UserSearchView(ReplicaReadMixin, ListAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = PublicUserSerializer
 
@@ -67,13 +88,20 @@ class UserSearchView(ListAPIView):
         
         if len(q) < 2:
             return User.objects.none()
-        
-        qs = User.objects.filter(username__icontains=q)
-        
+
+        # prefix match as an index range on username_lower; lexical order puts an exact match first
+        prefix = q.lower()
+        qs = User.objects.filter(
+            username_lower__gte=prefix,
+            username_lower__lt=prefix + "\U0010ffff",
+            username_lower__startswith=prefix,  # recheck for non-binary collations
+        )
+
         if role in ("ARTIST", "LISTENER"):
             qs = qs.filter(role=role)
 
-        return qs.order_by("username")[:20]
+        qs = qs.only("id", "username", "role", "profile_picture", "profile_picture_variants", "follower_count", "following_count")
+        return _annotate_is_following(qs, self.request).order_by("username_lower")[:20]
 
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
@@ -90,12 +118,13 @@ class FollowView(APIView):
         if target == request.user:
             return Response({"detail": "You cannot follow yourself."}, status=400)
         request.user.following.add(target)
-        # follower_count is updated via signal
+        # counters are bumped atomically by the m2m signal; read the stored value back
+        target.refresh_from_db(fields=["follower_count"])
         return Response(
             {
                 "username": target.username,
                 "is_following": True,
-                "follower_count": target.followers.count(),
+                "follower_count": target.follower_count,
             },
             status=200,
         )
@@ -106,22 +135,127 @@ class FollowView(APIView):
         if target == request.user:
             return Response({"detail": "You cannot unfollow yourself."}, status=400)
         request.user.following.remove(target)
+        target.refresh_from_db(fields=["follower_count"])
         return Response(
             {
                 "username": target.username,
                 "is_following": False,
-                "follower_count": target.followers.count(),
+                "follower_count": target.follower_count,
             },
             status=200,
         )
     
 
-class UserDetailView(RetrieveAPIView):
+class PlayStatsView(APIView):
+    """Play buffer counters of this worker process (flush timing, batch size, dedup hits)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(plays.buffer.snapshot())
+
+
+class FeedView(ReplicaReadMixin, APIView):
+    """
+    /api/feed/?cursor=<opaque>&page_size=N
+
+    Newest public songs from the artists you follow (api.feed), in the same
+    {next, previous, results} shape as the song list.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("page_size", settings.SONG_PAGE_SIZE))
+        except ValueError:
+            limit = settings.SONG_PAGE_SIZE
+        limit = max(1, min(limit, settings.SONG_MAX_PAGE_SIZE))
+
+        cursor = request.query_params.get("cursor")
+        try:
+            position = feed.decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response({"detail": "Invalid cursor."}, status=status.HTTP_404_NOT_FOUND)
+
+        ids, next_position = feed.page_song_ids(request.user, limit, position)
+        songs = _visible_songs(request).filter(is_public=True).in_bulk(ids)
+        results = [songs[pk] for pk in ids if pk in songs]
+
+        next_url = None
+        if next_position:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), "cursor", feed.encode_cursor(*next_position)
+            )
+        return Response({
+            "next": next_url,
+            "previous": None,
+            "results": SongSerializer(results, many=True, context={"request": request}).data,
+        })
+
+
+class ChartsView(ReplicaReadMixin, APIView):
+    """
+    /api/charts/?genre=house&limit=N
+
+    Trending public songs overall, or within one genre, as materialized by
+    api.charts.build(): {"genre", "built_at", "results": [{"rank", "score", "song"}]}.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        genre = charts.normalize_genre(request.query_params.get("genre"))
+        try:
+            limit = int(request.query_params.get("limit", settings.CHARTS_SIZE))
+        except ValueError:
+            limit = settings.CHARTS_SIZE
+        limit = max(1, min(limit, settings.CHARTS_SIZE))
+
+        built_at, entries = charts.chart(genre)
+        entries = entries[:limit]
+        # songs made private or deleted since the build drop out
+        visible = _visible_songs(request).filter(is_public=True, pk__in=[pk for pk, _ in entries])
+        songs = {song.pk: song for song in visible}
+        ranked = [(songs[pk], score) for pk, score in entries if pk in songs]
+
+        def render():
+            data = SongSerializer([song for song, _ in ranked], many=True, context={"request": request}).data
+            return Response({
+                "genre": genre or None,
+                "built_at": built_at,
+                "results": [
+                    {"rank": n, "score": round(score, 3), "song": song}
+                    for n, ((_, score), song) in enumerate(zip(ranked, data), 1)
+                ],
+            })
+        etag = conditional.song_list_etag(request, [song for song, _ in ranked], built_at, [score for _, score in ranked])
+        return conditional.respond(request, etag, render)
+
+
+class SongCacheStatsView(APIView):
+    """Song response cache hit/miss counters of this worker process."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.snapshot())
+
+
+class UserDetailView(ReplicaReadMixin, RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = PublicUserSerializer
     lookup_field = "username"
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return _annotate_is_following(super().get_queryset(), self.request)
+
+    def retrieve(self, request, *args, **kwargs):
+        row = (
+            self.get_queryset().filter(username=kwargs["username"])
+            .values_list("updated_at", "follower_count", "following_count", "is_following")
+            .first()
+        )
+        etag = conditional.user_etag(request, *row) if row else None
+        return conditional.respond(request, etag, lambda: super(UserDetailView, self).retrieve(request, *args, **kwargs))
+
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
         ctx["request"] = self.request
@@ -133,30 +267,51 @@ def _norm_genre_param(s: str) -> str:
         s = s[1:]
     return s 
 
-class SongViewSet(viewsets.ModelViewSet):
+def _visible_songs(request):
+    """Songs `request.user` may see, annotated and trimmed for SongSerializer."""
+    user = request.user if request.user.is_authenticated else None
+    qs = Song.objects.all()
+    if user:
+        qs = qs.filter(Q(is_public=True) | Q(owner=user))
+        liked = Song.likes.through.objects.filter(song_id=OuterRef("pk"), user_id=user.pk)
+        qs = qs.annotate(liked_by_me=Exists(liked))
+    else:
+        qs = qs.filter(is_public=True).annotate(liked_by_me=Value(False))
+
+    # the waveform pyramid is only read by the waveform action
+    return qs.select_related("owner").defer("waveform_peaks")
+
+
+class SongViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     /api/songs/           (GET list, POST create)
     /api/songs/{id}/      (GET retrieve, PUT/PATCH owner-only, DELETE owner-only)
+    /api/songs/batch/     (GET ?ids=1,2,3)
+    /api/songs/?owner=<username>  one artist's songs (the profile page)
+    /api/songs/likes/     (POST bulk like/unlike)
 
     Public: list returns public songs + your own private ones if logged-in.
+    List is cursor-paginated: ?cursor=<opaque>&page_size=N
     """
     serializer_class = SongSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
     parser_classes = (JSONParser, MultiPartParser, FormParser)
+    pagination_class = SongCursorPagination
 
-    filter_backends = [filters.SearchFilter]
-    search_fields = ["title", "genre", "owner__username", "description"]
+    # ?search=deep hou #house, relevance-ranked (api.search)
+    filter_backends = [FullTextSearchFilter]
 
 
     def get_queryset(self):
-        user = self.request.user if self.request.user.is_authenticated else None
-        qs = Song.objects.all()
-        if user:
-            qs = qs.filter(Q(is_public=True) | Q(owner=user))
-        else:
-            qs = qs.filter(is_public=True)
-
-        return qs.select_related("owner")
+        qs = _visible_songs(self.request)
+        owner = self.request.query_params.get("owner")
+        if owner and self.action == "list":
+            # unique username -> owner_id, then song_owner_recent_idx pages it without a sort
+            qs = qs.filter(owner__username=owner)
+        elif self.action == "waveform":
+            # the one action that reads the pyramid: load it with the row, not in a second query
+            qs = qs.defer(None)
+        return qs
 
 
     def get_serializer_context(self):
@@ -164,6 +319,31 @@ class SongViewSet(viewsets.ModelViewSet):
         ctx["request"] = self.request
         return ctx
 
+    def list(self, request, *args, **kwargs):
+        # anonymous pages come from api.response_cache when possible; ETags (api.conditional) skip serializing
+        def produce():
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            # versioned from the page rows themselves: no query over the whole collection
+            etag = conditional.song_list_etag(
+                request, page, self.paginator.get_next_link(), self.paginator.get_previous_link()
+            )
+            return conditional.respond(
+                request, etag, lambda: self.get_paginated_response(self.get_serializer(page, many=True).data)
+            )
+        return response_cache.fetch(request, produce)
+
+    def retrieve(self, request, *args, **kwargs):
+        def produce():
+            etag = conditional.song_etag(request, self.get_queryset(), kwargs.get("pk"))
+            return conditional.respond(request, etag, lambda: super(SongViewSet, self).retrieve(request, *args, **kwargs))
+        return response_cache.fetch(request, produce, song_pk=kwargs.get("pk"))
+
+    def create(self, request, *args, **kwargs):
+        # audio analysis is queued (api.processing); clients poll processing_status
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
     def perform_create(self, serializer):
         serializer.save()  # owner set in serializer.create()
 
@@ -172,9 +352,12 @@ class SongViewSet(viewsets.ModelViewSet):
         song = self.get_object()
         if song.owner_id == request.user.id:
             return Response({"detail": "You cannot like your own song."}, status=status.HTTP_400_BAD_REQUEST)
-        song.likes.add(request.user)
+        # write the through row directly so the counter moves only when a like was really added
+        if counters.add_like(song.pk, request.user.pk):
+            response_cache.invalidate_songs([song.pk])
+        song.refresh_from_db(fields=["likes_count"])
         data = {
-            "likes_count": song.likes.count(),
+            "likes_count": song.likes_count,
             "liked_by_me": True,
         }
         return Response(data, status=status.HTTP_200_OK)
@@ -182,18 +365,178 @@ class SongViewSet(viewsets.ModelViewSet):
     @decorators.action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
     def unlike(self, request, pk=None):
         song = self.get_object()
-        song.likes.remove(request.user)
+        if counters.remove_like(song.pk, request.user.pk):
+            response_cache.invalidate_songs([song.pk])
+        song.refresh_from_db(fields=["likes_count"])
         data = {
-            "likes_count": song.likes.count(),
+            "likes_count": song.likes_count,
             "liked_by_me": False,
         }
         return Response(data, status=status.HTTP_200_OK)
 
+    @decorators.action(detail=False, methods=["get"])
+    def batch(self, request):
+        """
+        /api/songs/batch/?ids=3,1,2
+
+        The visible songs among `ids` (at most SONG_BATCH_MAX_IDS), in that
+        order, from one query. Unknown or hidden ids are listed in "missing".
+        """
+        try:
+            ids = [int(x) for x in request.query_params.get("ids", "").split(",") if x.strip()]
+        except ValueError:
+            return Response({"detail": "ids must be a comma-separated list of song ids."}, status=status.HTTP_400_BAD_REQUEST)
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return Response({"detail": "ids is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.SONG_BATCH_MAX_IDS:
+            return Response({"detail": f"At most {settings.SONG_BATCH_MAX_IDS} ids per request."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        def produce():
+            songs = {song.pk: song for song in self.get_queryset().filter(pk__in=ids)}
+            found = [songs[pk] for pk in ids if pk in songs]
+            missing = [pk for pk in ids if pk not in songs]
+            return conditional.respond(
+                request,
+                conditional.song_list_etag(request, found, missing),
+                lambda: Response({"results": self.get_serializer(found, many=True).data, "missing": missing}),
+            )
+        return response_cache.fetch(request, produce)
+
+    @decorators.action(detail=False, methods=["post"], url_path="likes", permission_classes=[permissions.IsAuthenticated])
+    def bulk_likes(self, request):
+        """
+        /api/songs/likes/  {"operations": [{"id": 1, "action": "like"}, {"id": 2, "action": "unlike"}]}
+
+        All operations are applied in one transaction (api.counters.apply_likes);
+        the last one on a song wins. If any song can't be (un)liked nothing is
+        applied and the errors come back per id.
+        """
+        serializer = BulkLikeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        wanted = {op["id"]: op["action"] for op in serializer.validated_data["operations"]}
+
+        owners = dict(self.get_queryset().filter(pk__in=wanted).values_list("pk", "owner_id"))
+        errors = {}
+        for pk, action in wanted.items():
+            if pk not in owners:
+                errors[str(pk)] = "Not found."
+            elif action == "like" and owners[pk] == request.user.pk:
+                errors[str(pk)] = "You cannot like your own song."
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        changed = counters.apply_likes(
+            request.user.pk,
+            like_ids=[pk for pk, action in wanted.items() if action == "like"],
+            unlike_ids=[pk for pk, action in wanted.items() if action == "unlike"],
+        )
+        if changed:
+            response_cache.invalidate_songs(changed)
+        counts = dict(Song.objects.filter(pk__in=wanted).values_list("pk", "likes_count"))
+        return Response({"results": [
+            {"id": pk, "liked_by_me": action == "like", "likes_count": counts[pk]}
+            for pk, action in wanted.items()
+        ]}, status=status.HTTP_200_OK)
+
+
+    @decorators.action(detail=True, methods=["post"], permission_classes=[permissions.AllowAny])
+    def play(self, request, pk=None):
+        # buffered + deduplicated per listener, see api.plays
+        song = self.get_object()
+        counted = plays.buffer.record(song.pk, plays.listener_key(request))
+        return Response({"counted": counted}, status=status.HTTP_202_ACCEPTED)
+
+    @decorators.action(detail=True, methods=["get"])
+    def waveform(self, request, pk=None):
+        """
+        /api/songs/{id}/waveform/?level=0..2[&encoding=base64]
+
+        One level of the min/max pyramid: interleaved (min, max) uint8 pairs,
+        0 = -1.0, 255 = +1.0. Raw bytes by default, JSON + base64 on request.
+        """
+        song = self.get_object()
+        if not song.waveform_peaks:
+            return Response({"detail": "Waveform not available yet."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            level = int(request.query_params.get("level", 0))
+            levels = waveform.pyramid_levels(song.waveform_peaks)
+            data = waveform.pyramid_level(song.waveform_peaks, level)
+        except (ValueError, IndexError):
+            return Response({"detail": "Invalid level."}, status=status.HTTP_400_BAD_REQUEST)
+
+        as_base64 = request.query_params.get("encoding") == "base64"
+        etag = '"%s%s"' % (hashlib.md5(data).hexdigest(), "-b64" if as_base64 else "")
+        # revalidated every time (api.conditional.tag): the song can go private
+        # or be re-processed, and a 304 costs no more than the permission check
+        if conditional.matches(request, etag):
+            return conditional.tag(request, HttpResponseNotModified(), etag)
+        if as_base64:
+            response = JsonResponse({
+                "level": level,
+                "buckets": levels[level],
+                "levels": levels,
+                "data": base64.b64encode(data).decode("ascii"),
+            })
+        else:
+            response = HttpResponse(data, content_type="application/octet-stream")
+            response["X-Waveform-Buckets"] = str(levels[level])
+        return conditional.tag(request, response, etag)
+
+
+def _jwt_user(request):
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return result[0] if result else None
+
+
+def serve_audio(request, name):
+    """
+    /media/audio/...: content-addressed blobs (audio/blobs/..), legacy
+    per-owner paths (audio/{owner_id}/..) and their streaming renditions
+    (audio/renditions/.., api.transcode), which follow the access rules of
+    the file they were made from.
+
+    A blob can back several songs. It is open if any of them is public.
+    Otherwise it needs either a signed URL (what SongSerializer hands the
+    owner) or the bearer token of one of the owners; anything else 404s so
+    private uploads can't be probed. Delivery follows settings.AUDIO_DELIVERY.
+    """
+    if ".." in name.split("/"):
+        raise Http404("Audio file not found")
+    source = transcode.rendition_source(name) or name
+    songs = list(Song.objects.filter(audio=source).values_list("is_public", "owner_id"))
+    if not songs:
+        raise Http404("Audio file not found")
 
-def serve_audio(request, owner_id, filename):
-    file_path = os.path.join(settings.MEDIA_ROOT, 'audio', str(owner_id), filename)
+    cache_control = "public, max-age=3600"
+    signed = False
+    if not any(is_public for is_public, _ in songs):
+        remaining = check_audio_signature(request, source)
+        if remaining is not None:
+            # the URL itself is the credential, so shared caches may keep it until it expires
+            cache_control = f"public, max-age={remaining}"
+            signed = True
+        else:
+            user = _jwt_user(request)
+            if user is None or user.pk not in {owner_id for _, owner_id in songs}:
+                raise Http404("Audio file not found")
+            cache_control = "private, max-age=3600"
 
+    file_path = os.path.join(settings.MEDIA_ROOT, name)
     if not os.path.exists(file_path):
         raise Http404("Audio file not found")
 
-    return serve_audio_with_range(request, file_path)
+    if signed and name.endswith(".m3u8"):
+        response = signed_playlist_response(request, file_path)
+    elif settings.AUDIO_DELIVERY in ("x-accel-redirect", "x-sendfile"):
+        response = offload_audio_response(name, file_path)
+    else:
+        response = serve_audio_with_range(request, file_path)
+    if response.status_code in (200, 206, 304):
+        response["Cache-Control"] = cache_control
+    return response
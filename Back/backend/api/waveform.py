@@ -0,0 +1,273 @@
+"""
+Streaming waveform extraction.
+
+Audio is decoded in fixed-size blocks (stdlib `wave` for PCM WAV, an
+ffmpeg pipe for everything else) and each block is reduced with
+vectorized NumPy into a bounded set of buckets holding sum-of-squares,
+sample count, min and max. When the bucket list fills up, neighbouring
+buckets are merged pairwise, so memory stays constant no matter how long
+the track is. Bars are rendered from the buckets at the end.
+
+Besides the small bar summary the song list carries, a min/max pyramid
+(PYRAMID_LEVELS buckets per level, one uint8 per min and per max) is
+packed into a compact binary blob for zoomable scrubbers.
+
+No Django imports: this runs inside upload-processing worker processes.
+"""
+import struct
+import subprocess
+import tempfile
+import threading
+import wave
+
+try:
+    import numpy as np
+except ImportError:  # optional; the pyramid readers below only need struct
+    np = None
+
+# samples per decoded block (mono float32 -> 256 KiB per block)
+BLOCK_FRAMES = 65536
+# sample rate ffmpeg resamples to; plenty for a visual envelope
+DECODE_RATE = 22050
+# buckets kept before pairwise merging; must be well above the finest level rendered
+MAX_BUCKETS = 8192
+# initial bucket width in samples
+MIN_BUCKET_SAMPLES = 64
+# buckets per pyramid level, coarse to fine
+PYRAMID_LEVELS = (64, 512, 4096)
+PYRAMID_MAGIC = b"LWF1"
+# seconds an ffmpeg decode may run before it is killed (cf. transcode.ENCODE_TIMEOUT)
+DECODE_TIMEOUT = 600
+
+
+class WaveformAccumulator:
+    """Constant-memory reducer of a mono float stream into sumsq/count/min/max buckets."""
+
+    def __init__(self, max_buckets=MAX_BUCKETS, bucket_samples=MIN_BUCKET_SAMPLES):
+        self.max_buckets = max_buckets
+        self.bucket_samples = bucket_samples
+        self.sumsq = np.zeros(0, dtype=np.float64)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.min = np.zeros(0, dtype=np.float32)
+        self.max = np.zeros(0, dtype=np.float32)
+        self._tail = np.zeros(0, dtype=np.float32)
+
+    @property
+    def total_samples(self):
+        return int(self.count.sum()) + len(self._tail)
+
+    def feed(self, block):
+        """Add a block of mono samples in [-1, 1]."""
+        x = np.concatenate((self._tail, np.asarray(block, dtype=np.float32)))
+        n = len(x) // self.bucket_samples
+        self._tail = x[n * self.bucket_samples:]
+        if n:
+            self._append(x[: n * self.bucket_samples].reshape(n, self.bucket_samples))
+
+    def finish(self):
+        """Flush the partial bucket left over from the last block."""
+        if len(self._tail):
+            self._append(self._tail.reshape(1, -1))
+            self._tail = np.zeros(0, dtype=np.float32)
+        return self
+
+    def _append(self, frames):
+        sumsq = np.einsum("ij,ij->i", frames, frames, dtype=np.float64)
+        self.sumsq = np.concatenate((self.sumsq, sumsq))
+        self.count = np.concatenate((self.count, np.full(len(frames), frames.shape[1], dtype=np.int64)))
+        self.min = np.concatenate((self.min, frames.min(axis=1)))
+        self.max = np.concatenate((self.max, frames.max(axis=1)))
+        while len(self.count) >= 2 * self.max_buckets:
+            self._merge_pairs()
+
+    def _merge_pairs(self):
+        # an odd trailing bucket stays as is; counts keep rendering exact
+        even = len(self.count) - len(self.count) % 2
+        starts = np.arange(0, even, 2)
+        if even < len(self.count):
+            starts = np.append(starts, even)
+        self.sumsq = np.add.reduceat(self.sumsq, starts)
+        self.count = np.add.reduceat(self.count, starts)
+        self.min = np.minimum.reduceat(self.min, starts)
+        self.max = np.maximum.reduceat(self.max, starts)
+        self.bucket_samples *= 2
+
+    def _bar_index(self, num_bars):
+        # bucket -> bar by the sample position the bucket starts at
+        total = int(self.count.sum())
+        start = np.cumsum(self.count) - self.count
+        return np.minimum(start * num_bars // max(total, 1), num_bars - 1)
+
+    @staticmethod
+    def _fill_gaps(values, present):
+        # bars no bucket landed in (very short tracks) copy the previous bar
+        if present.all() or not present.any():
+            return values
+        idx = np.where(present, np.arange(len(values)), 0)
+        idx = np.maximum.accumulate(idx)
+        first = np.argmax(present)
+        idx[:first] = first
+        return values[idx]
+
+    def rms(self, num_bars):
+        """Per-bar RMS, float64 array of length num_bars."""
+        bars = self._bar_index(num_bars)
+        sumsq = np.bincount(bars, weights=self.sumsq, minlength=num_bars)
+        count = np.bincount(bars, weights=self.count, minlength=num_bars)
+        out = np.sqrt(sumsq / np.maximum(count, 1))
+        return self._fill_gaps(out, count > 0)
+
+    def min_max(self, num_bars):
+        """Per-bar (min, max) float32 arrays of length num_bars."""
+        bars = self._bar_index(num_bars)
+        lo = np.zeros(num_bars, dtype=np.float32)
+        hi = np.zeros(num_bars, dtype=np.float32)
+        present = np.bincount(bars, minlength=num_bars) > 0
+        if present.any():
+            starts = np.flatnonzero(np.diff(bars, prepend=-1))
+            lo[bars[starts]] = np.minimum.reduceat(self.min, starts)
+            hi[bars[starts]] = np.maximum.reduceat(self.max, starts)
+        return self._fill_gaps(lo, present), self._fill_gaps(hi, present)
+
+
+def _wav_blocks(audio_path, block_frames):
+    with wave.open(audio_path, "rb") as w:
+        width, channels = w.getsampwidth(), w.getnchannels()
+        if width not in (1, 2, 4):
+            raise wave.Error(f"unsupported sample width {width}")
+        dtype, scale, offset = {1: (np.uint8, 128.0, 128.0), 2: ("<i2", 32768.0, 0.0), 4: ("<i4", 2147483648.0, 0.0)}[width]
+        while True:
+            raw = w.readframes(block_frames)
+            if not raw:
+                return
+            pcm = np.frombuffer(raw, dtype=dtype)
+            # downmix with strided adds; much faster than reshape(-1, ch).mean(axis=1)
+            x = pcm[0::channels].astype(np.float32)
+            for c in range(1, channels):
+                x += pcm[c::channels]
+            x -= offset * channels
+            x *= 1.0 / (scale * channels)
+            yield x
+
+
+def _ffmpeg_binary():
+    try:
+        from pydub import AudioSegment
+        return AudioSegment.converter
+    except ImportError:
+        return "ffmpeg"
+
+
+def _ffmpeg_blocks(audio_path, block_frames):
+    cmd = [
+        _ffmpeg_binary(), "-v", "error", "-nostdin", "-i", audio_path,
+        "-f", "f32le", "-ac", "1", "-ar", str(DECODE_RATE), "-",
+    ]
+    block_bytes = block_frames * 4
+    # stderr goes to a file: a pipe nobody reads fills up and stalls ffmpeg
+    # while we sit blocked on stdout
+    with tempfile.TemporaryFile() as errors:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors)
+        # a stuck decoder is killed, which closes stdout and ends the read loop
+        deadline = threading.Timer(DECODE_TIMEOUT, proc.kill)
+        deadline.daemon = True
+        deadline.start()
+        try:
+            pending = b""
+            while True:
+                chunk = proc.stdout.read(block_bytes)
+                if not chunk:
+                    break
+                chunk = pending + chunk
+                usable = len(chunk) - len(chunk) % 4
+                pending = chunk[usable:]
+                yield np.frombuffer(chunk[:usable], dtype="<f4")
+            if proc.wait() != 0:
+                if not deadline.is_alive():
+                    raise RuntimeError(f"ffmpeg timed out after {DECODE_TIMEOUT}s")
+                errors.seek(0)
+                message = errors.read(4096).decode(errors="replace").strip()[:500]
+                raise RuntimeError(f"ffmpeg failed: {message}")
+        finally:
+            deadline.cancel()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+
+
+def iter_blocks(audio_path, block_frames=BLOCK_FRAMES):
+    """Yield mono float32 blocks of at most block_frames samples."""
+    with open(audio_path, "rb") as f:
+        head = f.read(12)
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        try:
+            yield from _wav_blocks(audio_path, block_frames)
+            return
+        except wave.Error:
+            pass  # e.g. float or extensible WAV: let ffmpeg handle it
+    yield from _ffmpeg_blocks(audio_path, block_frames)
+
+
+def accumulate(audio_path, block_frames=BLOCK_FRAMES):
+    acc = WaveformAccumulator()
+    for block in iter_blocks(audio_path, block_frames):
+        acc.feed(block)
+    return acc.finish()
+
+
+def bars_from_rms(rms):
+    """Scale RMS bars to the 0.3..1.0 range the players draw (3 decimals keeps list payloads small)."""
+    peak = float(rms.max()) if len(rms) else 0.0
+    if peak <= 0:
+        return [0.5] * len(rms)
+    return np.round(np.minimum(0.3 + (rms / peak) * 0.7, 1.0), 3).tolist()
+
+
+def _quantize(values):
+    # [-1, 1] -> 0..255, 128 ~ silence
+    return np.clip(np.rint((values + 1.0) * 127.5), 0, 255).astype(np.uint8)
+
+
+def encode_pyramid(acc, levels=PYRAMID_LEVELS):
+    """
+    Layout: magic, uint8 level count, uint32 bucket count per level,
+    then each level as interleaved (min, max) uint8 pairs.
+    """
+    parts = [PYRAMID_MAGIC, struct.pack(f"<B{len(levels)}I", len(levels), *levels)]
+    for n in levels:
+        lo, hi = acc.min_max(n)
+        pairs = np.empty(2 * n, dtype=np.uint8)
+        pairs[0::2] = _quantize(lo)
+        pairs[1::2] = _quantize(hi)
+        parts.append(pairs.tobytes())
+    return b"".join(parts)
+
+
+def pyramid_levels(blob):
+    """Bucket counts stored in a pyramid blob."""
+    blob = bytes(blob)
+    if blob[:4] != PYRAMID_MAGIC:
+        raise ValueError("not a waveform pyramid")
+    (n,) = struct.unpack_from("<B", blob, 4)
+    return list(struct.unpack_from(f"<{n}I", blob, 5))
+
+
+def pyramid_level(blob, level):
+    """Raw (min, max) uint8 pairs of one level (0 = coarsest)."""
+    blob = bytes(blob)
+    levels = pyramid_levels(blob)
+    if not 0 <= level < len(levels):
+        raise IndexError(level)
+    offset = 5 + 4 * len(levels) + 2 * sum(levels[:level])
+    return blob[offset: offset + 2 * levels[level]]
+
+
+def analyze_waveform(audio_path, num_bars=65):
+    """One decode pass -> (bar summary, pyramid blob)."""
+    acc = accumulate(audio_path)
+    return bars_from_rms(acc.rms(num_bars)), encode_pyramid(acc)
+
+
+def generate_waveform(audio_path, num_bars=65):
+    return bars_from_rms(accumulate(audio_path).rms(num_bars))
@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its timings cover the whole stack (api.metrics)
+    'api.metrics.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -58,7 +60,7 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.auth.CachedJWTAuthentication",
     ),
     # For a simple start: allow public endpoints by default.
     # Lock down specific views with IsAuthenticated (we will for /me and /logout).
@@ -70,14 +72,91 @@ REST_FRAMEWORK = {
     ],
 }
 
+# /api/songs/ cursor pagination (see api.pagination.SongCursorPagination)
+SONG_PAGE_SIZE = 20
+SONG_MAX_PAGE_SIZE = 100
+
+# most songs one /api/songs/batch/ or /api/songs/likes/ request may name
+SONG_BATCH_MAX_IDS = 100
+
+# Upload post-processing queue (api.processing, `manage.py process_uploads`)
+SONG_PROCESSING_CONCURRENCY = 2
+SONG_PROCESSING_MAX_ATTEMPTS = 3
+SONG_PROCESSING_RETRY_DELAY_SECONDS = 30
+SONG_PROCESSING_LEASE_SECONDS = 600
+
+# Audio delivery (api.views.serve_audio), after the public-or-owner check:
+#   "django"           stream from the app (api.utils.serve_audio_with_range)
+#   "x-accel-redirect" nginx serves it from an internal location mapped to MEDIA_ROOT
+#   "x-sendfile"       Apache / lighttpd mod_xsendfile
+AUDIO_DELIVERY = "django"
+AUDIO_ACCEL_REDIRECT_LOCATION = "/protected-media/"
+# lifetime window of the signed URLs handed out for private songs
+AUDIO_SIGNED_URL_TTL = 3600
+
+# Streaming renditions encoded by upload processing (api.transcode), as (codec, kbps)
+# with codec "opus" (Ogg Opus) or "aac" (M4A). Players get AUDIO_DEFAULT_RENDITION as
+# stream_url and can pick another from `renditions`; the original upload stays the
+# `audio` download. AUDIO_HLS also cuts the AAC bitrates into HLS segments.
+AUDIO_RENDITIONS = [("opus", 64), ("opus", 128), ("opus", 256), ("aac", 128)]
+AUDIO_DEFAULT_RENDITION = ("aac", 128)
+AUDIO_HLS = False
+
+# WebP variants of covers and profile pictures (api.images), made on upload and exposed
+# as *_srcset maps; `manage.py build_image_variants` fills them in for older images
+IMAGE_VARIANT_WIDTHS = (64, 256, 1024)
+IMAGE_VARIANT_QUALITY = 80
+
+# Trending charts (api.charts, `manage.py build_charts`): plays and likes (a like counts
+# CHARTS_LIKE_WEIGHT plays) halve in weight every CHARTS_HALF_LIFE_HOURS; the top
+# CHARTS_SIZE public songs overall and per genre are stored and served by /api/charts/
+CHARTS_SIZE = 50
+CHARTS_HALF_LIFE_HOURS = 48
+CHARTS_LIKE_WEIGHT = 5
+CHARTS_CACHE_TIMEOUT = 60
+
+# Play counting (api.plays): buffered per process, flushed in bulk F() updates
+PLAY_FLUSH_INTERVAL_SECONDS = 5
+PLAY_FLUSH_BATCH_SIZE = 500
+# one counted play per listener and song within this window
+PLAY_DEDUP_WINDOW_SECONDS = 300
+# reverse proxies in front of the app that append to X-Forwarded-For; anonymous
+# listeners are told apart by REMOTE_ADDR when 0, since clients can forge the header
+PLAY_TRUSTED_PROXIES = 0
+
+# Anonymous song list/detail response cache (api.response_cache), in seconds; 0 disables.
+# Uses the default cache: configure a shared backend when running several processes.
+SONG_CACHE_TIMEOUT = 60
+
+# Request instrumentation (api.metrics): Server-Timing, slow request log, /metrics
+PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION', '1') == '1'
+PERF_SLOW_REQUEST_MS = 500
+# Server-Timing on every response; off, only staff users get it
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', '0') == '1'
+# who may scrape /metrics besides staff users
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Following feed (api.feed): artists with more followers than this are merged
+# in at read time instead of being copied into every follower's timeline
+FEED_FANOUT_MAX_FOLLOWERS = 5000
+# songs copied into a timeline when you follow someone
+FEED_BACKFILL_SONGS = 50
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=90),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=30),
     "ROTATE_REFRESH_TOKENS": True,          # refresh returns a NEW refresh token
     "BLACKLIST_AFTER_ROTATION": True,        # old refresh is blacklisted
     "AUTH_HEADER_TYPES": ("Bearer",),
+    # same as the stock one, with the blacklist lookup cached (api.auth)
+    "TOKEN_REFRESH_SERIALIZER": "api.auth.TokenRefreshSerializer",
 }
 
+# How long api.auth.CachedJWTAuthentication keeps a user in the default cache, in seconds.
+# Saves invalidate it in the saving process only: other processes see deactivations and
+# password changes after this long unless CACHES is a shared backend. 0 disables.
+AUTH_USER_CACHE_TIMEOUT = 60
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://localhost:5173",
@@ -90,6 +169,9 @@ AUTH_USER_MODEL = "api.User"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# hash uploads while they stream to disk so identical audio is stored once (api.uploads)
+FILE_UPLOAD_HANDLERS = ["api.uploads.HashingUploadHandler"]
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -117,9 +199,40 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # keep connections between requests; checked before reuse
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # take the write lock up front so busy_timeout applies (see api.db)
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Optional read replica for GET requests (api.db.ReplicaRouter). For SQLite this
+# can be the same file opened read-only: DB_REPLICA_NAME=file:/path/db.sqlite3?mode=ro
+DATABASE_REPLICAS = []
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': DATABASES['default']['ENGINE'],
+        'NAME': os.environ['DB_REPLICA_NAME'],
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['api.db.ReplicaRouter']
+
+# Applied to every new SQLite connection (api.db.configure_sqlite)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # durable at checkpoints; safe with WAL
+    'busy_timeout': 20000,    # ms a writer waits for the lock
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,     # KiB
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
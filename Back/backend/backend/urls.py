@@ -19,14 +19,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include, re_path
 from api.views import serve_audio
+from api.metrics import metrics_view
 
 urlpatterns = [
+    # audio always goes through the visibility check; see settings.AUDIO_DELIVERY
+    re_path(r'^media/(?P<name>audio/.+)$', serve_audio),
     path('admin/', admin.site.urls),
     path("api/", include("api.urls")),
+    path("metrics", metrics_view),
 ]
 
 if settings.DEBUG:
-    urlpatterns = [
-        re_path(r'^media/audio/(?P<owner_id>\d+)/(?P<filename>.+)$', serve_audio),
-    ] + urlpatterns
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -77,7 +77,7 @@ export default function AudioPlayer() {
           id: s.id,
           title: s.title,
           artist: s.owner?.username ?? "Unknown",
-          url: s.audio,
+          url: s.stream_url ?? s.audio,
           cover: s.cover,
           waveform_data: s.waveform_data,
         }));
@@ -322,6 +322,12 @@ export default function AudioPlayer() {
     }
   }, [isPlaying]);
 
+  // report a play when a track starts; repeats are deduplicated by the server
+  useEffect(() => {
+    if (!isPlaying || !currentTrack?.id) return;
+    songService.recordPlay(currentTrack.id).catch(() => {});
+  }, [isPlaying, currentTrack?.id]);
+
   const togglePlayPause = () => {
     if (!audioRef.current) return;
 
@@ -2,13 +2,14 @@
 
 import { useEffect, useState } from "react";
 import { useSearchParams, useRouter } from "next/navigation";
-import { userService, songService } from "@/app/services/api";
+import { userService, songService, toSrcSet, type SrcSetMap } from "@/app/services/api";
 
 type Row = {
   id: number;
   username: string;
   role: string;
   profile_picture: string | null;
+  profile_picture_srcset?: SrcSetMap;
   follower_count: number;
   is_following: boolean;
 };
@@ -18,6 +19,7 @@ type SongRow = {
   title: string;
   audio: string;
   cover: string | null;
+  cover_srcset?: SrcSetMap;
   owner: { id: number; username: string; role: string } | null;
   genre?: string | null;
 };
@@ -49,7 +51,7 @@ export default function SearchResultsPage() {
   const [songs, setSongs] = useState<SongRow[]>([]);
 
   function normalizeForSongs(q: string) {
-    return q.trim().replace(/^#/, "");
+    return q.trim();
   }
 
   const type = (searchParams.get("type") || "artists").toLowerCase() as
@@ -162,6 +164,8 @@ export default function SearchResultsPage() {
                     // eslint-disable-next-line @next/next/no-img-element
                     <img
                       src={u.profile_picture}
+                      srcSet={toSrcSet(u.profile_picture_srcset)}
+                      sizes="64px"
                       alt={`${u.username} avatar`}
                       className="w-full h-full object-cover"
                     />
@@ -233,6 +237,8 @@ export default function SearchResultsPage() {
                 // eslint-disable-next-line @next/next/no-img-element
                 <img
                   src={s.cover}
+                  srcSet={toSrcSet(s.cover_srcset)}
+                  sizes="64px"
                   alt={`${s.title} cover`}
                   className="w-full h-full object-cover"
                 />
@@ -2,7 +2,7 @@
 
 import { use, useEffect, useRef, useState } from "react";
 import { useParams, useRouter } from "next/navigation";
-import { userService, songService } from "@/app/services/api";
+import { userService, songService, toSrcSet, type SrcSetMap } from "@/app/services/api";
 import Link from "next/link";
 
 type UserDTO = {
@@ -10,6 +10,7 @@ type UserDTO = {
   username: string;
   role: string;
   profile_picture: string | null;
+  profile_picture_srcset?: SrcSetMap;
   follower_count: number;
   is_following: boolean;
 };
@@ -19,6 +20,7 @@ type SongItem = {
   title: string;
   audio: string;
   cover: string | null;
+  cover_srcset?: SrcSetMap;
   description?: string;
   is_public: boolean;
   likes_count: number;
@@ -28,12 +30,33 @@ type SongItem = {
   genre?: string | null;
 };
 
+const SONGS_PAGE_SIZE = 50;
+
+function toSongItem(s: any): SongItem {
+  return {
+    id: s.id,
+    title: s.title,
+    audio: s.stream_url ?? s.audio,
+    cover: s.cover,
+    cover_srcset: s.cover_srcset,
+    description: s.description,
+    is_public: s.is_public,
+    likes_count: s.likes_count,
+    liked_by_me: s.liked_by_me,
+    owner: s.owner,
+    waveform_data: s.waveform_data,
+    genre: s.genre || null,
+  };
+}
+
 export default function UserProfile() {
   const { username } = useParams<{ username: string }>();
   const router = useRouter();
   const [theme, setTheme] = useState<"light" | "dark">("light");
   const [user, setUser] = useState<UserDTO | null>(null);
   const [songs, setSongs] = useState<SongItem[]>([]);
+  const [songsCursor, setSongsCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [err, setErr] = useState<string | null>(null);
   const [saving, setSaving] = useState(false);
@@ -100,6 +123,23 @@ export default function UserProfile() {
     currentUser.username === user.username
   );
 
+  async function loadMoreSongs() {
+    if (!username || !songsCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const page = await songService.listUserSongsPage(username, {
+        cursor: songsCursor,
+        pageSize: SONGS_PAGE_SIZE,
+      });
+      setSongs((prev) => [...prev, ...page.results.map(toSongItem)]);
+      setSongsCursor(page.next);
+    } catch (e: any) {
+      setErr(e.message || "Failed to load more tracks");
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   useEffect(() => {
     async function load() {
       if (!username) return;
@@ -110,23 +150,10 @@ export default function UserProfile() {
         const u = await userService.getUser(username);
         setUser(u);
 
-        const all = await songService.listSongs();
-        const mine = all.filter((s: any) => s.owner?.username === username);
-        setSongs(
-          mine.map((s: any) => ({
-            id: s.id,
-            title: s.title,
-            audio: s.audio,
-            cover: s.cover,
-            description: s.description,
-            is_public: s.is_public,
-            likes_count: s.likes_count,
-            liked_by_me: s.liked_by_me,
-            owner: s.owner,
-            waveform_data: s.waveform_data,
-            genre: s.genre || null,
-          }))
-        );
+        // 2) first page of their songs; more on demand
+        const page = await songService.listUserSongsPage(username, { pageSize: SONGS_PAGE_SIZE });
+        setSongs(page.results.map(toSongItem));
+        setSongsCursor(page.next);
       } catch (e: any) {
         setErr(e.message || "Failed to load profile");
       } finally {
@@ -399,6 +426,8 @@ export default function UserProfile() {
               <img
                 className="border-2 w-70 h-70 shadow-[0_0_10px_rgba(0,0,0,0.5)] object-cover"
                 src={user.profile_picture}
+                srcSet={toSrcSet(user.profile_picture_srcset)}
+                sizes="280px"
                 alt={`${user.username} avatar`}
               />
             ) : (
@@ -451,6 +480,8 @@ export default function UserProfile() {
                           <img
                             className="w-full h-full object-cover"
                             src={song.cover}
+                            srcSet={toSrcSet(song.cover_srcset)}
+                            sizes="128px"
                             alt={`${song.title} cover`}
                           />
                         ) : (
@@ -622,6 +653,16 @@ export default function UserProfile() {
                     </div>
                   ))}
                 </div>
+                {songsCursor && (
+                  <button
+                    type="button"
+                    onClick={loadMoreSongs}
+                    disabled={loadingMore}
+                    className={`mt-6 px-4 py-2 rounded ${isDark ? 'bg-gray-800 text-white' : 'bg-gray-200 text-black'}`}
+                  >
+                    {loadingMore ? "Loading..." : "Load more"}
+                  </button>
+                )}
               </div>
             </div>
           </div>
@@ -927,6 +968,18 @@ export default function UserProfile() {
                 )}
               </div>
             ))}
+            {songsCursor && (
+              <div className="px-10 py-3">
+                <button
+                  type="button"
+                  onClick={loadMoreSongs}
+                  disabled={loadingMore}
+                  className={`px-4 py-2 rounded ${isDark ? 'bg-gray-800 text-white' : 'bg-gray-200 text-black'}`}
+                >
+                  {loadingMore ? "Loading..." : "Load more"}
+                </button>
+              </div>
+            )}
           </div>
         </div>
         )}
@@ -232,16 +232,13 @@ export const userService = {
   if (!res.ok) throw new Error(await res.text());
   return res.json() as Promise<{
     id: number; username: string; role: string;
-    profile_picture: string | null; follower_count: number; is_following: boolean;
+    profile_picture: string | null; profile_picture_srcset?: SrcSetMap;
+    follower_count: number; is_following: boolean;
   }>;
 },
 
 };
 
-function stripHash(s: string) {
-  return s.startsWith("#") ? s.slice(1) : s;
-}
-
 export type SongDTO = {
   id: number;
   owner: { id: number; username: string; role: string } | null;
@@ -249,18 +246,90 @@ export type SongDTO = {
   description: string;
   audio: string;
   cover: string | null;
+  cover_srcset?: SrcSetMap;
   is_public: boolean;
   duration_seconds: number | null;
   plays: number;
   created_at: string;
   genre?: string | null;
+  processing_status?: "pending" | "processing" | "ready" | "failed";
+  // compressed copies for playback; `audio` is the original upload (downloads)
+  renditions?: Rendition[];
+  stream_url?: string;
+};
+
+// {"64w": url, "256w": url, ...}: resized WebP copies of a cover or profile picture
+export type SrcSetMap = Record<string, string>;
+
+export function toSrcSet(map?: SrcSetMap | null): string | undefined {
+  if (!map) return undefined;
+  const entries = Object.entries(map).map(([width, url]) => `${url} ${width}`);
+  return entries.length ? entries.join(", ") : undefined;
+}
+
+export type Rendition = {
+  codec: "opus" | "aac" | "hls";
+  bitrate: number | null;
+  mime: string;
+  size: number | null;
+  url: string;
+};
+
+export type SongPage = {
+  next: string | null;
+  previous: string | null;
+  results: SongDTO[];
 };
 
+// /songs/ is cursor-paginated; `next`/`previous` are absolute URLs, we only keep the cursor token
+function cursorFrom(url: string | null): string | null {
+  if (!url) return null;
+  return new URL(url).searchParams.get("cursor");
+}
+
 export const songService = {
-  async listSongs(): Promise<SongDTO[]> {
-    const res = await fetchWithAuth(`/songs/`, { method: "GET" });
+  async listSongsPage(opts?: {
+    cursor?: string | null;
+    pageSize?: number;
+    search?: string;
+    owner?: string;
+  }): Promise<SongPage> {
+    const params = new URLSearchParams();
+    if (opts?.cursor) params.set("cursor", opts.cursor);
+    if (opts?.pageSize) params.set("page_size", String(opts.pageSize));
+    if (opts?.search) params.set("search", opts.search);
+    if (opts?.owner) params.set("owner", opts.owner);
+    const qs = params.toString();
+    const res = await fetchWithAuth(`/songs/${qs ? `?${qs}` : ""}`, { method: "GET" });
     if (!res.ok) throw new Error(await res.text());
-    return res.json();
+    const data = await res.json();
+    return { next: cursorFrom(data.next), previous: cursorFrom(data.previous), results: data.results };
+  },
+
+  // newest public songs from followed artists, same cursor paging as /songs/
+  async getFeedPage(opts?: { cursor?: string | null; pageSize?: number }): Promise<SongPage> {
+    const params = new URLSearchParams();
+    if (opts?.cursor) params.set("cursor", opts.cursor);
+    if (opts?.pageSize) params.set("page_size", String(opts.pageSize));
+    const qs = params.toString();
+    const res = await fetchWithAuth(`/feed/${qs ? `?${qs}` : ""}`, { method: "GET" });
+    if (!res.ok) throw new Error(await res.text());
+    const data = await res.json();
+    return { next: cursorFrom(data.next), previous: null, results: data.results };
+  },
+
+  // first page only (player queue)
+  async listSongs(opts?: { pageSize?: number }): Promise<SongDTO[]> {
+    const page = await this.listSongsPage({ pageSize: opts?.pageSize });
+    return page.results;
+  },
+
+  // one artist's songs, newest first; the cursor pages through just theirs
+  async listUserSongsPage(
+    username: string,
+    opts?: { cursor?: string | null; pageSize?: number }
+  ): Promise<SongPage> {
+    return this.listSongsPage({ ...opts, owner: username });
   },
 
   async uploadSong(params: {
@@ -302,6 +371,20 @@ export const songService = {
     if (!res.ok) throw new Error(await res.text());
   },
 
+  // min/max pyramid level (0 = 64, 1 = 512, 2 = 4096 buckets) as interleaved uint8 pairs
+  async getWaveform(id: number, level = 0): Promise<Uint8Array> {
+    const res = await fetchWithAuth(`/songs/${id}/waveform/?level=${level}`, { method: "GET" });
+    if (!res.ok) throw new Error(await res.text());
+    return new Uint8Array(await res.arrayBuffer());
+  },
+
+  // counted server-side at most once per listener per window
+  async recordPlay(id: number): Promise<{ counted: boolean }> {
+    const res = await fetchWithAuth(`/songs/${id}/play/`, { method: "POST" });
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
   async likeSong(id: number): Promise<{ likes_count: number; liked_by_me: boolean }> {
     const res = await fetchWithAuth(`/songs/${id}/like/`, { method: "POST" });
     if (!res.ok) throw new Error(await res.text());
@@ -314,17 +397,48 @@ export const songService = {
     return res.json();
   },
 
+  // many songs by id in one request (player queue, liked list); order follows `ids`
+  async getSongsBatch(ids: number[]): Promise<{ results: SongDTO[]; missing: number[] }> {
+    if (!ids.length) return { results: [], missing: [] };
+    const res = await fetchWithAuth(`/songs/batch/?ids=${ids.join(",")}`, { method: "GET" });
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
+  // like/unlike several songs at once; applied together or not at all
+  async bulkLike(
+    operations: { id: number; action: "like" | "unlike" }[]
+  ): Promise<{ results: { id: number; likes_count: number; liked_by_me: boolean }[] }> {
+    const res = await fetchWithAuth(`/songs/likes/`, {
+      method: "POST",
+      body: JSON.stringify({ operations }),
+    });
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
+  // trending songs overall, or within one genre ("house" or "#house")
+  async getCharts(opts?: { genre?: string; limit?: number }): Promise<{
+    genre: string | null;
+    built_at: string | null;
+    results: { rank: number; score: number; song: SongDTO }[];
+  }> {
+    const params = new URLSearchParams();
+    if (opts?.genre) params.set("genre", opts.genre);
+    if (opts?.limit) params.set("limit", String(opts.limit));
+    const qs = params.toString();
+    const res = await fetchWithAuth(`/charts/${qs ? `?${qs}` : ""}`, { method: "GET" });
+    if (!res.ok) throw new Error(await res.text());
+    return res.json();
+  },
+
   async searchSongsMulti(q: string, opts?: { limit?: number }) {
     const query = (q || "").trim();
     if (!query) return [];
 
-    // If the user typed a hashtag, remove it so 'genre' icontains works.
-    const normalized = stripHash(query);
-
-    const res = await fetchWithAuth(`/songs/?search=${encodeURIComponent(normalized)}`, { method: "GET" });
-    if (!res.ok) throw new Error(await res.text());
-    const data = await res.json();
-    return opts?.limit ? data.slice(0, opts.limit) : data;
+    // "#house" is kept: the server treats it as a genre filter
+    const page = await this.listSongsPage({ search: query, pageSize: opts?.limit });
+    return page.results;
   },
 };
 
@@ -3,7 +3,7 @@
 import { useEffect, useMemo, useState } from "react";
 import { useParams, useRouter } from "next/navigation";
 import Link from "next/link";
-import { fetchWithAuth, songService } from "@/app/services/api";
+import { fetchWithAuth, songService, toSrcSet, type SrcSetMap } from "@/app/services/api";
 
 type OwnerMini = { id: number; username: string; role: string } | null;
 
@@ -12,7 +12,9 @@ type SongDetailDTO = {
   title: string;
   description: string;
   audio: string;
+  stream_url?: string;
   cover: string | null;
+  cover_srcset?: SrcSetMap;
   is_public: boolean;
   duration_seconds: number | null;
   plays: number;
@@ -110,7 +112,7 @@ export default function SongDetail() {
         id: song.id,
         title: song.title,
         artist: song.owner?.username ?? "Unknown",
-        url: song.audio,
+        url: song.stream_url ?? song.audio,
         cover: song.cover,
         waveform_data: song.waveform_data ?? undefined,
       },
@@ -226,6 +228,8 @@ export default function SongDetail() {
                   // eslint-disable-next-line @next/next/no-img-element
                   <img
                     src={song.cover}
+                    srcSet={toSrcSet(song.cover_srcset)}
+                    sizes="240px"
                     alt={`${song.title} cover`}
                     className="w-full h-full object-cover"
                   />